@@ -10,13 +10,21 @@ __all__ = [
     'fried_parameter_to_seeing',
     'FiniteAtmosphericLayer',
     'InfiniteAtmosphericLayer',
+    'get_extrusion_matrix_cache',
+    'StoredAtmosphericLayer',
+    'write_phase_screen_archive',
+    'read_phase_screen_archive',
+    'make_phase_screen_archive',
     'ModalAdaptiveOpticsLayer',
     'make_standard_atmospheric_layers',
-    'make_las_campanas_atmospheric_layers'
+    'make_las_campanas_atmospheric_layers',
+    'run_monte_carlo'
 ]
 
 from .atmospheric_model import *
 from .finite_atmospheric_layer import *
 from .infinite_atmospheric_layer import *
 from .modal_adaptive_optics_layer import *
+from .stored_atmospheric_layer import *
 from .standard_atmosphere import *
+from .monte_carlo import *
@@ -1,11 +1,84 @@
 from __future__ import division
 
 from ..optics import OpticalElement
+from ..optics.optical_element import PointwiseTransmission
 from ..field import Field
 from ..propagation import FresnelPropagator
+from ..config import Configuration
 
 import numpy as np
+import numexpr as ne
 from scipy.special import gamma, kv
+import concurrent.futures
+import os
+import threading
+
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+def _get_thread_pool(num_threads):
+    '''Get a thread pool with a certain number of threads.
+
+    Thread pools are created once and shared between all users in this process.
+
+    Parameters
+    ----------
+    num_threads : integer
+        The number of threads in the pool.
+
+    Returns
+    -------
+    ThreadPoolExecutor
+        The thread pool.
+    '''
+    with _thread_pools_lock:
+        if num_threads not in _thread_pools:
+            _thread_pools[num_threads] = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads)
+
+        return _thread_pools[num_threads]
+
+def _reset_thread_pools():
+    '''Forget all thread pools after this process was forked.
+
+    A forked child inherits the thread pools of its parent, but not their worker
+    threads, so any work submitted to them would never be done. The lock is
+    replaced as well, as it might have been held by another thread during the fork.
+    '''
+    global _thread_pools_lock
+
+    _thread_pools.clear()
+    _thread_pools_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_thread_pools)
+
+def _split_seed(seed, num_seeds):
+    '''Split a seed into a number of independent seeds.
+
+    Parameters
+    ----------
+    seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+        The seed to split. If this is None, all returned seeds will be None, so that
+        each of them pulls fresh, unpredictable entropy from the OS.
+    num_seeds : integer
+        The number of seeds to make.
+
+    Returns
+    -------
+    list
+        The independent seeds. These are SeedSequences, unless `seed` is None.
+    '''
+    if seed is None:
+        return [None] * num_seeds
+
+    if isinstance(seed, (np.random.Generator, np.random.BitGenerator)):
+        # Derive the entropy from the current state of the generator, which also advances it.
+        seed = np.random.default_rng(seed).integers(2**32, size=4)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    return seed.spawn(num_seeds)
 
 class AtmosphericLayer(OpticalElement):
     '''A single infinitely-thin atmospheric layer.
@@ -150,6 +223,15 @@ class AtmosphericLayer(OpticalElement):
         wf.electric_field *= np.exp(-1j * self.phase_for(wf.wavelength))
         return wf
 
+    def _get_pointwise_transmission(self, wavefront, backward=False):
+        # Derived classes that change the propagation are not pointwise in general.
+        if type(self).forward is not AtmosphericLayer.forward or type(self).backward is not AtmosphericLayer.backward:
+            return None
+
+        sign = -1 if backward else 1
+
+        return PointwiseTransmission(exponent_factor=sign * 1j, exponent=self.phase_for(wavefront.wavelength))
+
 class MultiLayerAtmosphere(OpticalElement):
     '''A multi-layer atmospheric model.
 
@@ -166,8 +248,13 @@ class MultiLayerAtmosphere(OpticalElement):
     scintillation : bool
         If True, then the distance between two phase screens is propagated using
         a :class:`FresnelPropagator`. Otherwise, no propagator will be used.
+    num_threads : integer or None
+        The number of threads used for evolving the layers and computing their
+        phase screens. Layers are independent, so they can be processed concurrently.
+        A value of -1 uses all available cores. If this is None, the choice will be
+        determined by the configuration file.
     '''
-    def __init__(self, layers, scintillation=False, scintilation=None):
+    def __init__(self, layers, scintillation=False, scintilation=None, num_threads=None):
         # Retain backwards compatibility.
         if scintilation is not None:
             import warnings
@@ -180,6 +267,11 @@ class MultiLayerAtmosphere(OpticalElement):
         self._t = 0
         self._dirty = True
 
+        # Get the value from the configuration file if left at default.
+        if num_threads is None:
+            num_threads = Configuration().atmosphere.multi_layer.num_threads
+        self.num_threads = num_threads
+
         self.calculate_propagators()
 
     def calculate_propagators(self):
@@ -209,6 +301,30 @@ class MultiLayerAtmosphere(OpticalElement):
 
         self._dirty = False
 
+    def _map_layers(self, func):
+        '''Apply a function to each layer, using multiple threads if requested.
+
+        Parameters
+        ----------
+        func : function
+            The function to apply. It takes the layer as its only argument.
+
+        Returns
+        -------
+        iterator
+            The results of the function for each layer, in the order of the layers.
+        '''
+        num_threads = self.num_threads
+        if num_threads < 0:
+            num_threads = os.cpu_count()
+
+        num_threads = min(num_threads, len(self.layers))
+
+        if num_threads <= 1:
+            return map(func, self.layers)
+
+        return _get_thread_pool(num_threads).map(func, self.layers)
+
     def reset(self):
         for l in self.layers:
             l.reset()
@@ -240,9 +356,16 @@ class MultiLayerAtmosphere(OpticalElement):
         if self.scintillation:
             raise ValueError('Cannot get the unwrapped phase for an atmosphere with scintillation.')
 
-        unwrapped_phases = [layer.phase_for(wavelength) for layer in self.layers]
+        phase = None
 
-        return Field(np.sum(unwrapped_phases, axis=0), unwrapped_phases[-1].grid)
+        # Accumulate the phase screens in place, as soon as they become available.
+        for layer_phase in self._map_layers(lambda layer: layer.phase_for(wavelength)):
+            if phase is None:
+                phase = Field(np.array(layer_phase, copy=True), layer_phase.grid)
+            else:
+                phase += layer_phase
+
+        return phase
 
     @property
     def scintillation(self):
@@ -263,8 +386,10 @@ class MultiLayerAtmosphere(OpticalElement):
         t : scalar
             The time to which to evolve the atmospheric layers.
         '''
-        for l in self.layers:
-            l.evolve_until(t)
+        # Exhaust the iterator to evolve all layers, and raise any exceptions.
+        for _ in self._map_layers(lambda layer: layer.evolve_until(t)):
+            pass
+
         self._t = t
 
     @property
@@ -300,10 +425,70 @@ class MultiLayerAtmosphere(OpticalElement):
     def t(self, t):
         self.evolve_until(t)
 
+    def _can_fuse_layers(self):
+        '''Whether the propagation can be done by applying the total phase at once.
+
+        This is possible when there is no scintillation and all layers only
+        apply their own phase screen to the wavefront.
+
+        Returns
+        -------
+        boolean
+            Whether a fused propagation can be used.
+        '''
+        if self.scintillation:
+            return False
+
+        for layer in self.layers:
+            if type(layer).forward is not AtmosphericLayer.forward or type(layer).backward is not AtmosphericLayer.backward:
+                return False
+
+        return True
+
+    def _apply_total_phase(self, wavefront, sign):
+        '''Apply the summed phase screens of all layers to a wavefront.
+
+        Parameters
+        ----------
+        wavefront : Wavefront
+            The wavefront to apply the phase to.
+        sign : scalar
+            The sign of the phase: 1 for forward and -1 for backward propagation.
+
+        Returns
+        -------
+        Wavefront
+            The wavefront with the total phase applied.
+        '''
+        phase = self.phase_for(wavefront.wavelength)
+
+        wf = wavefront.copy()
+        electric_field = wf.electric_field
+
+        variables = {'alpha': sign * 1j, 'phase': phase, 'E': electric_field}
+
+        if electric_field.ndim == 1:
+            ne.evaluate('E * exp(alpha * phase)', local_dict=variables, out=electric_field, casting='same_kind')
+        else:
+            electric_field *= ne.evaluate('exp(alpha * phase)', local_dict=variables)
+
+        return wf
+
+    def _get_pointwise_transmission(self, wavefront, backward=False):
+        if not self._can_fuse_layers():
+            return None
+
+        sign = -1 if backward else 1
+
+        return PointwiseTransmission(exponent_factor=sign * 1j, exponent=self.phase_for(wavefront.wavelength))
+
     def forward(self, wavefront):
         if self._dirty:
             self.calculate_propagators()
 
+        if self._can_fuse_layers():
+            return self._apply_total_phase(wavefront, 1)
+
         wf = wavefront.copy()
         for el in self.elements:
             wf = el.forward(wf)
@@ -313,6 +498,9 @@ class MultiLayerAtmosphere(OpticalElement):
         if self._dirty:
             self.calculate_propagators()
 
+        if self._can_fuse_layers():
+            return self._apply_total_phase(wavefront, -1)
+
         wf = wavefront.copy()
         for el in reversed(self.elements):
             wf = el.backward(wf)
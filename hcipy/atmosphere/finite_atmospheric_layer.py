@@ -39,14 +39,29 @@ class FiniteAtmosphericLayer(AtmosphericLayer):
         be passed to a numpy.SeedSequency to derive the initial BitGenerator state.
         If a BitGenerator or Generator are passed, these will be wrapped and used
         instead. Default: None.
+    roll_integer_pixels : boolean
+        Whether to move the high-frequency part of the phase screen by whole pixels
+        by rolling it, and to use Fourier shifts only for the sub-pixel remainder.
+        When the layer moves by a whole number of pixels per time step, this avoids
+        an FFT for each time step. The default is False.
+    use_imaginary_part : boolean
+        Whether to use the imaginary part of the complex spectral noise as an
+        additional independent realization. When this is True, every other call to
+        `reset(make_independent_realization=True)` switches to the imaginary part of
+        the current noise, rather than drawing a new one. This halves the number of
+        random draws for Monte-Carlo-style computations, at the cost of a different
+        sequence of realizations for the same seed. The default is False.
     '''
-    def __init__(self, input_grid, Cn_squared=None, L0=np.inf, velocity=0, height=0, oversampling=2, seed=None):
+    def __init__(self, input_grid, Cn_squared=None, L0=np.inf, velocity=0, height=0, oversampling=2, seed=None, roll_integer_pixels=False, use_imaginary_part=False):
         self._noise = None
         self._achromatic_screen = None
 
         AtmosphericLayer.__init__(self, input_grid, Cn_squared, L0, velocity, height)
 
         self.oversampling = oversampling
+        self.roll_integer_pixels = roll_integer_pixels
+        self.use_imaginary_part = use_imaginary_part
+        self._is_imaginary_part = False
         self.center = np.zeros(2)
 
         self._original_rng = np.random.default_rng(seed)
@@ -69,19 +84,29 @@ class FiniteAtmosphericLayer(AtmosphericLayer):
             The default is False.
         '''
         if make_independent_realization:
-            # Reset the original random generator to the current one. This
-            # will essentially reset the randomness.
-            self._original_rng = copy.copy(self.rng)
+            if self.use_imaginary_part and not self._is_imaginary_part:
+                # Switch to the imaginary part of the current noise. This requires
+                # the same random numbers as the current noise.
+                self._is_imaginary_part = True
+                self.rng = copy.deepcopy(self._original_rng)
+            else:
+                # Reset the original random generator to the current one. This
+                # will essentially reset the randomness.
+                self._original_rng = copy.deepcopy(self.rng)
+                self._is_imaginary_part = False
         else:
             # Make a copy of the original random generator. This copy will be
             # used as the source for all randomness.
-            self.rng = copy.copy(self._original_rng)
+            self.rng = copy.deepcopy(self._original_rng)
 
         self.psd = power_spectral_density_von_karman(fried_parameter_from_Cn_squared(self.Cn_squared, 1), self.L0)
 
         self.noise_factory = SpectralNoiseFactoryMultiscale(self.psd, self.input_grid, self.oversampling)
         self._noise = self.noise_factory.make_random(self.rng)
 
+        if self._is_imaginary_part:
+            self._noise = self._noise.complementary()
+
         self._achromatic_screen = None
 
     @property
@@ -102,7 +127,7 @@ class FiniteAtmosphericLayer(AtmosphericLayer):
         This property is not intended to be used by the user.
         '''
         if self._achromatic_screen is None:
-            self._achromatic_screen = self.noise.shifted(self.center)()
+            self._achromatic_screen = self.noise.evaluate_shifted(self.center, self.roll_integer_pixels)
 
         return self._achromatic_screen
 
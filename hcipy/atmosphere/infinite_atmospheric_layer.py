@@ -1,8 +1,10 @@
 from __future__ import division
 
 from .atmospheric_model import AtmosphericLayer, phase_covariance_von_karman, fried_parameter_from_Cn_squared
-from ..field import Field, RegularCoords, UnstructuredCoords, CartesianGrid
+from ..field import Field, RegularCoords, CartesianGrid
 from .finite_atmospheric_layer import FiniteAtmosphericLayer
+from ..config import Configuration
+from ..cache import LRUCache
 
 import numpy as np
 from scipy import linalg
@@ -10,6 +12,131 @@ from scipy.ndimage import affine_transform
 
 import warnings
 import copy
+import os
+import tempfile
+import xxhash
+
+_ab_matrix_cache = None
+
+def get_extrusion_matrix_cache():
+    '''Get the in-memory cache for the extrusion matrices of infinite atmospheric layers.
+
+    The A and B matrices used by InfiniteAtmosphericLayer for extruding the phase screen
+    are computed for unit Cn^2, so that they only depend on the grid, the stencils and the
+    outer scale. Layers with identical parameters, or layers that return to a previously-used
+    outer scale, share their matrices through this cache. The cache is bounded in size by the
+    `atmosphere.infinite_layer.matrix_cache_size` configuration value.
+
+    Returns
+    -------
+    LRUCache
+        The extrusion matrix cache.
+    '''
+    global _ab_matrix_cache
+
+    if _ab_matrix_cache is None:
+        max_bytes = int(Configuration().atmosphere.infinite_layer.matrix_cache_size * 2**20)
+        _ab_matrix_cache = LRUCache(max_bytes=max_bytes)
+
+    return _ab_matrix_cache
+
+def _get_ab_matrix_filename(key):
+    '''Get the filename of the on-disk extrusion matrices for a cache key.
+
+    Parameters
+    ----------
+    key : string
+        The cache key.
+
+    Returns
+    -------
+    string or None
+        The filename, or None if the on-disk cache is disabled in the configuration.
+    '''
+    if not Configuration().atmosphere.infinite_layer.use_disk_cache:
+        return None
+
+    cache_directory = os.path.expanduser(Configuration().cache.directory)
+
+    return os.path.join(cache_directory, 'infinite_atmospheric_layer', key + '.npz')
+
+def _get_ab_matrices_from_cache(key):
+    '''Get extrusion matrices from the in-memory or on-disk cache.
+
+    Parameters
+    ----------
+    key : string
+        The cache key.
+
+    Returns
+    -------
+    dictionary or None
+        The A and B matrices, or None if they were not found.
+    '''
+    cache = get_extrusion_matrix_cache()
+    matrices = cache.get(key)
+
+    if matrices is not None:
+        return matrices
+
+    filename = _get_ab_matrix_filename(key)
+
+    if filename is None:
+        return None
+
+    try:
+        with np.load(filename) as f:
+            matrices = {name: f[name] for name in f.files}
+    except (OSError, ValueError):
+        # A missing or corrupted file is treated as a cache miss.
+        return None
+
+    # The matrices are shared between layers, so they should not be modified.
+    for matrix in matrices.values():
+        matrix.flags.writeable = False
+
+    cache[key] = matrices
+
+    return matrices
+
+def _add_ab_matrices_to_cache(key, matrices):
+    '''Add extrusion matrices to the in-memory cache, and to the on-disk cache if enabled.
+
+    Parameters
+    ----------
+    key : string
+        The cache key.
+    matrices : dictionary
+        The A and B matrices.
+    '''
+    # The matrices are shared between layers, so they should not be modified.
+    for matrix in matrices.values():
+        matrix.flags.writeable = False
+
+    get_extrusion_matrix_cache()[key] = matrices
+
+    filename = _get_ab_matrix_filename(key)
+
+    if filename is None:
+        return
+
+    try:
+        directory = os.path.dirname(filename)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first and atomically move it into place, so that
+        # other processes never read a partially-written file.
+        fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **matrices)
+            os.replace(temp_filename, filename)
+        except Exception:
+            os.remove(temp_filename)
+            raise
+    except OSError:
+        # Failing to write the cache should never break a computation.
+        pass
 
 class InfiniteAtmosphericLayer(AtmosphericLayer):
     '''An atmospheric layer that can be infinitely extended in any direction.
@@ -95,7 +222,6 @@ class InfiniteAtmosphericLayer(AtmosphericLayer):
         self.rng = np.random.default_rng(seed)
 
         self._make_stencils()
-        self._make_covariance_matrices()
         self._make_ab_matrices()
 
         self._original_rng = self.rng
@@ -105,7 +231,6 @@ class InfiniteAtmosphericLayer(AtmosphericLayer):
 
     def _recalculate_matrices(self):
         if self._initialized:
-            self._make_covariance_matrices()
             self._make_ab_matrices()
 
     def _make_stencils(self):
@@ -135,67 +260,140 @@ class InfiniteAtmosphericLayer(AtmosphericLayer):
         self.stencil_left = self.stencil_left.ravel()
         self.num_stencils_horizontal = np.sum(self.stencil_left)
 
-    def _make_covariance_matrices(self):
+        # Row and column indices of the stencil pixels, in the order of the boolean stencils.
+        shape = self.input_grid.shape
+        self._stencil_bottom_indices = np.unravel_index(np.flatnonzero(self.stencil_bottom), shape)
+        self._stencil_left_indices = np.unravel_index(np.flatnonzero(self.stencil_left), shape)
+
+    def _make_covariance_matrix(self, stencil, new_grid):
+        '''Make the covariance matrix between the stencil pixels and a new row or column.
+
+        As all pixels lie on the same regular grid, the covariance only depends on the
+        integer pixel offsets between each pair of pixels. The covariance function is
+        therefore evaluated once for each possible offset, and the matrix is filled
+        from that lookup table.
+
+        Parameters
+        ----------
+        stencil : array_like
+            The boolean stencil on the input grid.
+        new_grid : Grid
+            The grid of the new row or column.
+
+        Returns
+        -------
+        ndarray
+            The covariance matrix, with the stencil pixels first, followed by the new pixels.
+        '''
         phase_covariance = phase_covariance_von_karman(fried_parameter_from_Cn_squared(1, 1), self.L0)
 
-        # Vertical
-        x = np.concatenate((self.input_grid.x[self.stencil_bottom], self.new_grid_bottom.x))
-        x = np.concatenate([x - xx for xx in x])
-        y = np.concatenate((self.input_grid.y[self.stencil_bottom], self.new_grid_bottom.y))
-        y = np.concatenate([y - yy for yy in y])
+        delta = self.input_grid.delta
+        zero = self.input_grid.zero
 
-        separations = CartesianGrid(UnstructuredCoords((x, y)))
-        n = self.new_grid_bottom.size + self.num_stencils_vertical
-        self.cov_matrix_vertical = phase_covariance(separations).reshape((n, n))
+        x = np.concatenate((self.input_grid.x[stencil], new_grid.x))
+        y = np.concatenate((self.input_grid.y[stencil], new_grid.y))
 
-        # Horizontal
-        x = np.concatenate((self.input_grid.x[self.stencil_left], self.new_grid_left.x))
-        x = np.concatenate([x - xx for xx in x])
-        y = np.concatenate((self.input_grid.y[self.stencil_left], self.new_grid_left.y))
-        y = np.concatenate([y - yy for yy in y])
+        ix = np.round((x - zero[0]) / delta[0]).astype('int')
+        iy = np.round((y - zero[1]) / delta[1]).astype('int')
 
-        separations = CartesianGrid(UnstructuredCoords((x, y)))
-        n = self.new_grid_left.size + self.num_stencils_horizontal
-        self.cov_matrix_horizontal = phase_covariance(separations).reshape((n, n))
+        # The absolute pixel offsets between each pair of pixels.
+        dx = np.abs(ix[np.newaxis, :] - ix[:, np.newaxis])
+        dy = np.abs(iy[np.newaxis, :] - iy[:, np.newaxis])
 
-    def _make_ab_matrices(self):
-        # Vertical
-        n = self.num_stencils_vertical
-        cov_zz = self.cov_matrix_vertical[:n, :n]
-        cov_xz = self.cov_matrix_vertical[n:, :n]
-        cov_zx = self.cov_matrix_vertical[:n, n:]
-        cov_xx = self.cov_matrix_vertical[n:, n:]
+        num_x = ix.max() - ix.min() + 1
+        num_y = iy.max() - iy.min() + 1
 
-        cf = linalg.cho_factor(cov_zz)
-        inv_cov_zz = linalg.cho_solve(cf, np.eye(cov_zz.shape[0]))
+        offsets = CartesianGrid(RegularCoords(delta, [num_x, num_y]))
+        covariance_table = phase_covariance(offsets).reshape((num_y, num_x))
 
-        self.A_vertical = cov_xz.dot(inv_cov_zz)
+        return covariance_table[dy, dx]
 
-        BBt = cov_xx - self.A_vertical.dot(cov_zx)
+    def _make_covariance_matrices(self):
+        self.cov_matrix_vertical = self._make_covariance_matrix(self.stencil_bottom, self.new_grid_bottom)
+        self.cov_matrix_horizontal = self._make_covariance_matrix(self.stencil_left, self.new_grid_left)
 
-        U, S, Vt = np.linalg.svd(BBt)
-        L = np.sqrt(S[:self.input_grid.dims[0]])
+    @staticmethod
+    def _compute_ab_matrices(cov_matrix, num_stencils, num_new):
+        '''Compute the A and B matrices for extrusion from a covariance matrix.
 
-        self.B_vertical = U * L
+        Parameters
+        ----------
+        cov_matrix : ndarray
+            The covariance matrix, with the stencil pixels first, followed by the new pixels.
+        num_stencils : integer
+            The number of stencil pixels.
+        num_new : integer
+            The number of new pixels.
 
-        # Horizontal
-        n = self.num_stencils_horizontal
-        cov_zz = self.cov_matrix_horizontal[:n, :n]
-        cov_xz = self.cov_matrix_horizontal[n:, :n]
-        cov_zx = self.cov_matrix_horizontal[:n, n:]
-        cov_xx = self.cov_matrix_horizontal[n:, n:]
+        Returns
+        -------
+        A : ndarray
+            The matrix that maps the stencil pixels to the expected values of the new pixels.
+        B : ndarray
+            The matrix that maps white noise to the random part of the new pixels.
+        '''
+        n = num_stencils
+        cov_zz = cov_matrix[:n, :n]
+        cov_zx = cov_matrix[:n, n:]
+        cov_xx = cov_matrix[n:, n:]
 
+        # A = cov_xz inv(cov_zz), computed without explicitly inverting cov_zz.
         cf = linalg.cho_factor(cov_zz)
-        inv_cov_zz = linalg.cho_solve(cf, np.eye(cov_zz.shape[0]))
+        A = linalg.cho_solve(cf, cov_zx).T
 
-        self.A_horizontal = cov_xz.dot(inv_cov_zz)
-
-        BBt = cov_xx - self.A_horizontal.dot(cov_zx)
+        BBt = cov_xx - A.dot(cov_zx)
 
         U, S, Vt = np.linalg.svd(BBt)
-        L = np.sqrt(S[:self.input_grid.dims[1]])
+        L = np.sqrt(S[:num_new])
+
+        B = U * L
+
+        return A, B
+
+    def _get_ab_matrix_cache_key(self):
+        '''Get the key under which the A and B matrices for this layer are cached.
+
+        The A and B matrices are computed for unit Cn^2, so they only depend on the
+        input grid, the stencils and the outer scale.
+
+        Returns
+        -------
+        string
+            The cache key.
+        '''
+        h = xxhash.xxh64()
 
-        self.B_horizontal = U * L
+        h.update(np.array(hash(self.input_grid), dtype='uint64'))
+        h.update(np.ascontiguousarray(self.stencil_bottom))
+        h.update(np.ascontiguousarray(self.stencil_left))
+        h.update(np.array(self.L0, dtype='float64'))
+
+        return h.hexdigest()
+
+    def _make_ab_matrices(self):
+        key = self._get_ab_matrix_cache_key()
+
+        matrices = _get_ab_matrices_from_cache(key)
+
+        if matrices is None:
+            self._make_covariance_matrices()
+
+            A_vertical, B_vertical = self._compute_ab_matrices(self.cov_matrix_vertical, self.num_stencils_vertical, self.input_grid.dims[0])
+            A_horizontal, B_horizontal = self._compute_ab_matrices(self.cov_matrix_horizontal, self.num_stencils_horizontal, self.input_grid.dims[1])
+
+            matrices = {
+                'A_vertical': A_vertical,
+                'B_vertical': B_vertical,
+                'A_horizontal': A_horizontal,
+                'B_horizontal': B_horizontal
+            }
+
+            _add_ab_matrices_to_cache(key, matrices)
+
+        self.A_vertical = matrices['A_vertical']
+        self.B_vertical = matrices['B_vertical']
+        self.A_horizontal = matrices['A_horizontal']
+        self.B_horizontal = matrices['B_horizontal']
 
     def _make_initial_phase_screen(self):
         oversampling = 16
@@ -209,41 +407,109 @@ class InfiniteAtmosphericLayer(AtmosphericLayer):
         # This avoids reusing the same randomness every call to reset().
         self.rng = layer.rng
 
-    def _extrude(self, where=None):
+    @property
+    def _achromatic_screen(self):
+        '''The achromatic phase screen, without sub-pixel shift.
+
+        The screen is stored as a circular buffer, where the first row and column
+        of the screen are located at `_screen_offset` in the buffer. This avoids
+        moving the whole screen for each extruded row or column. The screen itself
+        is gathered from the buffer on first access after an extrusion.
+        '''
+        if self._screen is None:
+            offset_y, offset_x = self._screen_offset
+
+            if offset_x == 0 and offset_y == 0:
+                screen = self._screen_buffer
+            else:
+                ny, nx = self._screen_buffer.shape
+                screen = self._screen_buffer[np.ix_((np.arange(ny) + offset_y) % ny, (np.arange(nx) + offset_x) % nx)]
+
+            self._screen = Field(screen.ravel(), self.input_grid)
+
+        return self._screen
+
+    @_achromatic_screen.setter
+    def _achromatic_screen(self, screen):
+        self._screen_buffer = np.array(screen.shaped)
+        self._screen_offset = np.zeros(2, dtype='int')
+        self._screen = None
+
+    def _extrude(self, where=None, num_slices=1):
+        '''Extrude the phase screen by one or more rows or columns.
+
+        The random contributions for all new rows or columns are drawn at once and
+        computed with a single matrix multiplication. Only the deterministic part,
+        which depends on the previously extruded rows or columns, is computed row
+        by row.
+
+        Parameters
+        ----------
+        where : string
+            The side at which to add the new rows or columns. This can be 'top',
+            'bottom', 'left' or 'right'.
+        num_slices : integer
+            The number of rows or columns to add.
+        '''
+        if num_slices <= 0:
+            return
+
         flipped = (where == 'top') or (where == 'right')
         horizontal = (where == 'left') or (where == 'right')
 
-        if where == 'top' or where == 'right':
-            screen = self._achromatic_screen[::-1]
-        else:
-            screen = self._achromatic_screen
+        ny, nx = self._screen_buffer.shape
+        offset_y, offset_x = self._screen_offset
 
         if horizontal:
-            stencil = self.stencil_left
+            rows, cols = self._stencil_left_indices
             A = self.A_horizontal
             B = self.B_horizontal
         else:
-            stencil = self.stencil_bottom
+            rows, cols = self._stencil_bottom_indices
             A = self.A_vertical
             B = self.B_vertical
 
-        stencil_data = screen[stencil]
-        random_data = self.rng.normal(0, 1, size=B.shape[1])
-        new_slice = A.dot(stencil_data) + B.dot(random_data) * np.sqrt(self._Cn_squared)
+        # The stencils are defined for extrusion at the bottom or left. For the top or
+        # right, they are applied to the screen rotated by 180 degrees.
+        if flipped:
+            rows = ny - 1 - rows
+            cols = nx - 1 - cols
+
+        # Draw all random numbers in one go. This yields the same random numbers as
+        # drawing them for each row or column separately.
+        random_data = self.rng.normal(0, 1, size=(num_slices, B.shape[1]))
+        noise = B.dot(random_data.T).T * np.sqrt(self._Cn_squared)
+
+        for i in range(num_slices):
+            stencil_data = self._screen_buffer[(rows + offset_y) % ny, (cols + offset_x) % nx]
+            new_slice = A.dot(stencil_data) + noise[i]
+
+            if flipped:
+                new_slice = new_slice[::-1]
+
+            # Move the start of the screen in the buffer and overwrite the row or column
+            # that fell off the other side of the screen with the new data.
+            if horizontal:
+                if flipped:
+                    offset_x += 1
+                    col = (offset_x + nx - 1) % nx
+                else:
+                    offset_x -= 1
+                    col = offset_x % nx
+
+                self._screen_buffer[(np.arange(ny) + offset_y) % ny, col] = new_slice
+            else:
+                if flipped:
+                    offset_y += 1
+                    row = (offset_y + ny - 1) % ny
+                else:
+                    offset_y -= 1
+                    row = offset_y % ny
 
-        screen = screen.shaped
+                self._screen_buffer[row, (np.arange(nx) + offset_x) % nx] = new_slice
 
-        if horizontal:
-            screen = np.hstack((new_slice[:, np.newaxis], screen[:, :-1]))
-        else:
-            screen = np.vstack((new_slice[np.newaxis, :], screen[:-1, :]))
-
-        screen = Field(screen, self.input_grid)
-
-        if flipped:
-            self._achromatic_screen = screen[::-1, ::-1].ravel()
-        else:
-            self._achromatic_screen = screen.ravel()
+        self._screen_offset = np.array([offset_y % ny, offset_x % nx])
+        self._screen = None
 
     def phase_for(self, wavelength):
         '''Compute the phase at a certain wavelength.
@@ -278,11 +544,11 @@ class InfiniteAtmosphericLayer(AtmosphericLayer):
         if make_independent_realization:
             # Reset the original random generator to the current one. This
             # will essentially reset the randomness.
-            self._original_rng = copy.copy(self.rng)
+            self._original_rng = copy.deepcopy(self.rng)
         else:
             # Make a copy of the original random generator. This copy will be
             # used as the source for all randomness.
-            self.rng = copy.copy(self._original_rng)
+            self.rng = copy.deepcopy(self._original_rng)
 
         self._make_initial_phase_screen()
 
@@ -328,17 +594,15 @@ class InfiniteAtmosphericLayer(AtmosphericLayer):
         # Measure the sub-pixel shift
         sub_delta = self.center - new_pixel_center * self.input_grid.delta
 
-        for i in range(abs(delta[0])):
-            if delta[0] < 0:
-                self._extrude('left')
-            else:
-                self._extrude('right')
+        if delta[0] < 0:
+            self._extrude('left', -delta[0])
+        else:
+            self._extrude('right', delta[0])
 
-        for i in range(abs(delta[1])):
-            if delta[1] < 0:
-                self._extrude('bottom')
-            else:
-                self._extrude('top')
+        if delta[1] < 0:
+            self._extrude('bottom', -delta[1])
+        else:
+            self._extrude('top', delta[1])
 
         if self.use_interpolation:
             # Use bilinear interpolation to interpolate the achromatic phase screen to the correct position.
@@ -0,0 +1,288 @@
+from .atmospheric_model import _split_seed
+
+import numpy as np
+import concurrent.futures
+import os
+
+# The state of a worker process, set by _initialize_worker().
+_worker_state = {}
+
+def _initialize_worker(make_optical_system, make_atmosphere, evaluate, atmosphere_seed=None, reuse_atmosphere=False):
+    '''Initialize a worker process of a Monte-Carlo run.
+
+    The optical system is created only once per worker process, and the functions
+    are stored, so that the tasks themselves only need to contain the seeds.
+
+    Parameters
+    ----------
+    make_optical_system : function or None
+        A function that creates the optical system.
+    make_atmosphere : function
+        A function that creates an atmosphere from a seed.
+    evaluate : function
+        A function that evaluates a single realization.
+    atmosphere_seed : SeedSequence or None
+        The seed with which to create the atmosphere that is reused for all realizations.
+    reuse_atmosphere : boolean
+        Whether to create the atmosphere only once, and reseed it for each realization.
+    '''
+    _worker_state['optical_system'] = make_optical_system() if make_optical_system is not None else None
+    _worker_state['make_atmosphere'] = make_atmosphere
+    _worker_state['evaluate'] = evaluate
+    _worker_state['atmosphere'] = make_atmosphere(atmosphere_seed) if reuse_atmosphere else None
+
+def _reseed_atmosphere(atmosphere, seed):
+    '''Start an independent realization of an atmosphere from a seed.
+
+    Each of the layers gets a new random generator, and is reset to t=0 with
+    a new realization of its noise. The layers themselves, including their
+    extrusion matrices, are kept.
+
+    Parameters
+    ----------
+    atmosphere : MultiLayerAtmosphere or AtmosphericLayer
+        The atmosphere to reseed.
+    seed : SeedSequence or None
+        The seed of the realization.
+
+    Raises
+    ------
+    ValueError
+        If one of the layers cannot be reseeded.
+    '''
+    layers = getattr(atmosphere, 'layers', [atmosphere])
+
+    for layer, layer_seed in zip(layers, _split_seed(seed, len(layers))):
+        if not hasattr(layer, 'rng') or getattr(layer, 'use_imaginary_part', False):
+            raise ValueError('The atmospheric layer %s cannot be reseeded.' % layer.__class__.__name__)
+
+        layer.rng = np.random.default_rng(layer_seed)
+        layer.reset(make_independent_realization=True)
+
+    atmosphere.t = 0
+
+def _add_results(total, result, squared):
+    '''Add a result, or its square, to a running total.
+
+    Results can be scalars, arrays or Fields, or (nested) tuples, lists or
+    dictionaries of these.
+
+    Parameters
+    ----------
+    total : result or None
+        The running total. If this is None, a new total is started.
+    result : result
+        The result to add.
+    squared : boolean
+        Whether to add the square of the result rather than the result itself.
+
+    Returns
+    -------
+    result
+        The new running total.
+    '''
+    if isinstance(result, dict):
+        if total is None:
+            total = {key: None for key in result}
+
+        return {key: _add_results(total[key], result[key], squared) for key in result}
+
+    if isinstance(result, (tuple, list)):
+        if total is None:
+            total = [None] * len(result)
+
+        return type(result)(_add_results(t, r, squared) for t, r in zip(total, result))
+
+    if squared:
+        result = result * np.conj(result)
+
+    if total is None:
+        return np.array(result, copy=True, subok=True) if np.ndim(result) else result
+
+    total += result
+    return total
+
+def _map_results(func, *results):
+    '''Apply a function to corresponding elements of (nested) results.
+
+    Parameters
+    ----------
+    func : function
+        The function to apply.
+    *results : result
+        The results with identical structure.
+
+    Returns
+    -------
+    result
+        The mapped result.
+    '''
+    if isinstance(results[0], dict):
+        return {key: _map_results(func, *[r[key] for r in results]) for key in results[0]}
+
+    if isinstance(results[0], (tuple, list)):
+        return type(results[0])(_map_results(func, *r) for r in zip(*results))
+
+    return func(*results)
+
+def _run_chunk(seeds, compute_variance):
+    '''Evaluate a number of realizations, and return the sum of their results.
+
+    This function is run in a worker process.
+
+    Parameters
+    ----------
+    seeds : list of SeedSequence
+        The seeds for each of the realizations.
+    compute_variance : boolean
+        Whether to also return the sum of the squared results.
+
+    Returns
+    -------
+    total : result
+        The sum of the results of all realizations.
+    total_squared : result or None
+        The sum of the squares of the results of all realizations, or None if
+        `compute_variance` is False.
+    '''
+    optical_system = _worker_state['optical_system']
+    make_atmosphere = _worker_state['make_atmosphere']
+    evaluate = _worker_state['evaluate']
+    reused_atmosphere = _worker_state['atmosphere']
+
+    total = None
+    total_squared = None
+
+    for seed in seeds:
+        if reused_atmosphere is None:
+            atmosphere = make_atmosphere(seed)
+        else:
+            atmosphere = reused_atmosphere
+            _reseed_atmosphere(atmosphere, seed)
+
+        result = evaluate(optical_system, atmosphere)
+
+        total = _add_results(total, result, False)
+
+        if compute_variance:
+            total_squared = _add_results(total_squared, result, True)
+
+    return total, total_squared
+
+def run_monte_carlo(evaluate, make_atmosphere, num_realizations, make_optical_system=None, seed=None, num_processes=None, num_realizations_per_task=10, return_variance=False, reuse_atmosphere=False):
+    '''Average a quantity over independent realizations of the atmosphere.
+
+    The realizations are distributed over a pool of worker processes. Each worker
+    process creates the optical system only once. Only the seeds are sent to the
+    workers, and only the sum of the results of each task is sent back, rather than
+    the results of each individual realization.
+
+    Each realization gets its own seed, split from a parent SeedSequence. The seed of
+    each realization therefore does not depend on the number of processes. As the
+    number of realizations per task is fixed as well, the returned averages are
+    identical for any number of processes.
+
+    By default, a new atmosphere is made for each realization. This can be expensive:
+    an :class:`InfiniteAtmosphericLayer` draws its stencils from its seed, so that its
+    extrusion matrices have to be computed anew for each realization, as these cannot
+    be found in the cache. With `reuse_atmosphere`, each worker process instead makes
+    the atmosphere only once, from a seed shared by all processes, and reseeds its
+    layers for each realization. The realizations then share the stencils, but are
+    otherwise independent.
+
+    .. note::
+        All functions need to be picklable when using more than one process, so they
+        should be defined at the top level of a module. Lambda functions will not work.
+
+    Parameters
+    ----------
+    evaluate : function
+        A function `evaluate(optical_system, atmosphere)` that evaluates a single
+        realization, for example by evolving the atmosphere and computing a PSF or a
+        contrast curve. It should return a scalar, an array or a Field, or a (nested)
+        tuple, list or dictionary of these.
+    make_atmosphere : function
+        A function `make_atmosphere(seed)` that creates a new atmosphere, for example
+        a MultiLayerAtmosphere or a single atmospheric layer, from the seed of the
+        realization. The seed is a SeedSequence, which can be passed as the `seed` of
+        atmospheric layers, or be split further using its `spawn()` method.
+    num_realizations : integer
+        The number of realizations to average over.
+    make_optical_system : function or None
+        A function `make_optical_system()` that creates the optical system. This is
+        called once per process. If this is None, the optical system passed to
+        `evaluate` is None.
+    seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+        The parent seed from which the seeds of all realizations are derived. If None,
+        then fresh, unpredictable entropy will be pulled from the OS.
+    num_processes : integer or None
+        The number of worker processes. If this is one, all realizations are evaluated
+        in the current process. If this is None, the number of available cores is used.
+    num_realizations_per_task : integer
+        The number of realizations that are evaluated by a worker process before their
+        sum is sent back. Larger values reduce the communication overhead, at the cost
+        of a coarser distribution of the work over the processes.
+    return_variance : boolean
+        Whether to also return the variance of the results over the realizations.
+    reuse_atmosphere : boolean
+        Whether to make the atmosphere only once per process, and reseed it for each
+        realization, rather than making a new atmosphere for each realization. The
+        layers of the atmosphere need to have an `rng` attribute and support
+        `reset(make_independent_realization=True)`.
+
+    Returns
+    -------
+    mean : result
+        The average of the results over all realizations, with the same structure as
+        the return value of `evaluate`.
+    variance : result
+        The variance of the results over all realizations. This is only returned if
+        `return_variance` is True.
+    '''
+    if seed is None:
+        seed = np.random.SeedSequence()
+
+    # The extra seed is used to make the atmosphere if it is reused for all realizations.
+    seeds = _split_seed(seed, num_realizations + 1)
+    atmosphere_seed = seeds.pop()
+    chunks = [seeds[i:i + num_realizations_per_task] for i in range(0, num_realizations, num_realizations_per_task)]
+
+    if num_processes is None:
+        num_processes = os.cpu_count()
+    num_processes = max(1, min(num_processes, len(chunks)))
+
+    total = None
+    total_squared = None
+
+    def add_chunk(chunk_total, chunk_total_squared):
+        nonlocal total, total_squared
+
+        total = _add_results(total, chunk_total, False)
+
+        if return_variance:
+            total_squared = _add_results(total_squared, chunk_total_squared, False)
+
+    if num_processes == 1:
+        _initialize_worker(make_optical_system, make_atmosphere, evaluate, atmosphere_seed, reuse_atmosphere)
+
+        try:
+            for chunk in chunks:
+                add_chunk(*_run_chunk(chunk, return_variance))
+        finally:
+            _worker_state.clear()
+    else:
+        initargs = (make_optical_system, make_atmosphere, evaluate, atmosphere_seed, reuse_atmosphere)
+
+        with concurrent.futures.ProcessPoolExecutor(num_processes, initializer=_initialize_worker, initargs=initargs) as executor:
+            # The results are returned in order, which makes the summation deterministic.
+            for chunk_result in executor.map(_run_chunk, chunks, [return_variance] * len(chunks)):
+                add_chunk(*chunk_result)
+
+    mean = _map_results(lambda t: t / num_realizations, total)
+
+    if not return_variance:
+        return mean
+
+    variance = _map_results(lambda t, m: np.real(t / num_realizations - m * np.conj(m)), total_squared, mean)
+
+    return mean, variance
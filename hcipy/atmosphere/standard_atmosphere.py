@@ -1,20 +1,20 @@
-from .atmospheric_model import Cn_squared_from_fried_parameter
+from .atmospheric_model import Cn_squared_from_fried_parameter, _split_seed
 from .infinite_atmospheric_layer import InfiniteAtmosphericLayer
 
 import numpy as np
 
-def make_standard_atmospheric_layers(input_grid, L0=10):
+def make_standard_atmospheric_layers(input_grid, L0=10, seed=None):
     heights = np.array([500, 1000, 2000, 4000, 8000, 16000])
     velocities = np.array([10, 10, 10, 10, 10, 10])
     Cn_squared = np.array([0.2283, 0.0883, 0.0666, 0.1458, 0.3350, 0.1350]) * 1e-12
 
     layers = []
-    for h, v, cn in zip(heights, velocities, Cn_squared):
-        layers.append(InfiniteAtmosphericLayer(input_grid, cn, L0, v, h, 2))
+    for h, v, cn, layer_seed in zip(heights, velocities, Cn_squared, _split_seed(seed, len(heights))):
+        layers.append(InfiniteAtmosphericLayer(input_grid, cn, L0, v, h, 2, seed=layer_seed))
 
     return layers
 
-def make_las_campanas_atmospheric_layers(input_grid, r0=0.16, L0=25, wavelength=550e-9):
+def make_las_campanas_atmospheric_layers(input_grid, r0=0.16, L0=25, wavelength=550e-9, seed=None):
     '''Creates a multi-layer atmosphere for the Las Campanas Observatory site.
 
     The layer parameters are taken from [Males2019]_ who based it on site testing from [Prieto2010]_ and [Osip2011]_ .
@@ -38,6 +38,10 @@ def make_las_campanas_atmospheric_layers(input_grid, r0=0.16, L0=25, wavelength=
         The outer scale of the atmosphere
     wavelength : scalar
         The wavelength in meters at which to calculate the Fried parameter (default: 550nm).
+    seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+        A seed to initialize the layers. Each layer gets its own independent seed,
+        derived from this one. If None, then fresh, unpredictable entropy will be
+        pulled from the OS for each layer. Default: None.
 
     Returns
     -------
@@ -51,7 +55,7 @@ def make_las_campanas_atmospheric_layers(input_grid, r0=0.16, L0=25, wavelength=
     Cn_squared = np.array([0.42, 0.03, 0.06, 0.16, 0.11, 0.10, 0.12]) * integrated_cn_squared
 
     layers = []
-    for h, v, cn in zip(heights, velocities, Cn_squared):
-        layers.append(InfiniteAtmosphericLayer(input_grid, cn, L0, v, h, 2))
+    for h, v, cn, layer_seed in zip(heights, velocities, Cn_squared, _split_seed(seed, len(heights))):
+        layers.append(InfiniteAtmosphericLayer(input_grid, cn, L0, v, h, 2, seed=layer_seed))
 
     return layers
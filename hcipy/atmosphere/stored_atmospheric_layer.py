@@ -0,0 +1,324 @@
+from .atmospheric_model import AtmosphericLayer
+from .finite_atmospheric_layer import FiniteAtmosphericLayer
+from ..field import Field, CartesianGrid, RegularCoords
+
+import numpy as np
+import json
+import os
+
+def _get_metadata_filename(filename):
+    return str(filename) + '.json'
+
+def write_phase_screen_archive(filename, phase_screen, Cn_squared, L0=np.inf, dtype=None):
+    '''Write an achromatic phase screen to disk for use with a StoredAtmosphericLayer.
+
+    The phase screen is stored as a Numpy .npy file, which can be memory-mapped by
+    any number of processes at the same time. The grid, Cn^2 and outer scale are
+    stored alongside it in a small JSON file with the same name and the extension
+    ".json" appended.
+
+    Parameters
+    ----------
+    filename : string
+        The filename of the archive. This should end in ".npy".
+    phase_screen : Field
+        The phase screen in radians for a wavelength of one. This must be defined on
+        a regularly-spaced, two-dimensional Cartesian grid.
+    Cn_squared : scalar
+        The integrated strength of the turbulence of the phase screen.
+    L0 : scalar
+        The outer scale of the turbulence of the phase screen.
+    dtype : data-type or None
+        The data type with which to store the phase screen. If this is None, the data
+        type of `phase_screen` is used.
+
+    Raises
+    ------
+    ValueError
+        If the phase screen is not defined on a regular, two-dimensional Cartesian grid.
+    '''
+    grid = phase_screen.grid
+
+    if not grid.is_('cartesian') or not grid.is_regular or grid.ndim != 2:
+        raise ValueError('The phase screen must be defined on a regular, two-dimensional Cartesian grid.')
+
+    if dtype is None:
+        dtype = phase_screen.dtype
+
+    screen = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=tuple(int(n) for n in grid.shape))
+    screen[:] = phase_screen.shaped
+    screen.flush()
+    del screen
+
+    metadata = {
+        'delta': [float(d) for d in grid.delta],
+        'zero': [float(z) for z in grid.zero],
+        'Cn_squared': float(Cn_squared),
+        'L0': float(L0)
+    }
+
+    with open(_get_metadata_filename(filename), 'w') as f:
+        json.dump(metadata, f)
+
+def read_phase_screen_archive(filename):
+    '''Read a phase screen archive as a read-only memory-mapped Field.
+
+    Only the parts of the phase screen that are accessed are read from disk. The
+    memory used by the phase screen is shared between all processes that read the
+    same archive.
+
+    Parameters
+    ----------
+    filename : string
+        The filename of the archive.
+
+    Returns
+    -------
+    phase_screen : Field
+        The memory-mapped phase screen in radians for a wavelength of one.
+    Cn_squared : scalar
+        The integrated strength of the turbulence of the phase screen.
+    L0 : scalar
+        The outer scale of the turbulence of the phase screen.
+    '''
+    with open(_get_metadata_filename(filename), 'r') as f:
+        metadata = json.load(f)
+
+    screen = np.load(filename, mmap_mode='r')
+
+    dims = [screen.shape[1], screen.shape[0]]
+    grid = CartesianGrid(RegularCoords(metadata['delta'], dims, metadata['zero']))
+
+    return Field(screen.ravel(), grid), metadata['Cn_squared'], metadata['L0']
+
+def make_phase_screen_archive(filename, grid, Cn_squared, L0=np.inf, oversampling=1, seed=None, dtype='float64'):
+    '''Generate a phase screen and write it to disk for use with a StoredAtmosphericLayer.
+
+    The phase screen is generated by a FiniteAtmosphericLayer. With an oversampling
+    of one, the phase screen is periodic, so that a StoredAtmosphericLayer can wrap
+    around its edges without discontinuities.
+
+    Parameters
+    ----------
+    filename : string
+        The filename of the archive. This should end in ".npy".
+    grid : Grid
+        The grid on which to generate the phase screen. This must be a regularly-spaced,
+        two-dimensional Cartesian grid, and is usually much larger than the pupil.
+    Cn_squared : scalar
+        The integrated strength of the turbulence.
+    L0 : scalar
+        The outer scale of the turbulence.
+    oversampling : scalar
+        The oversampling in Fourier space, passed to the FiniteAtmosphericLayer.
+    seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+        A seed to initialize the spectral noise.
+    dtype : data-type
+        The data type with which to store the phase screen.
+
+    Returns
+    -------
+    Field
+        The memory-mapped phase screen in radians for a wavelength of one.
+    '''
+    layer = FiniteAtmosphericLayer(grid, Cn_squared, L0, oversampling=oversampling, seed=seed)
+    write_phase_screen_archive(filename, layer.phase_for(1), Cn_squared, L0, dtype)
+
+    return read_phase_screen_archive(filename)[0]
+
+class StoredAtmosphericLayer(AtmosphericLayer):
+    '''An atmospheric layer that slides over a precomputed phase screen.
+
+    The phase screen is moved over the input grid according to frozen flow. It wraps
+    around at its edges. The phase screen is usually stored in a phase screen archive,
+    made by :func:`make_phase_screen_archive` or :func:`write_phase_screen_archive`,
+    which is memory-mapped. In this case only the part of the phase screen under the
+    input grid is read for each time step, and the phase screen takes up no memory
+    in each individual process.
+
+    Parameters
+    ----------
+    input_grid : Grid
+        The grid on which the incoming wavefront is defined. This must be a regularly-
+        spaced Cartesian grid with the same spacing as the phase screen.
+    phase_screen : Field or string
+        The phase screen in radians for a wavelength of one, or the filename of a phase
+        screen archive.
+    Cn_squared : scalar or None
+        The integrated strength of the turbulence of `phase_screen`. If this is None, the
+        value will be read from the archive. Changing the Cn^2 of the layer afterwards
+        rescales the phase screen accordingly.
+    L0 : scalar or None
+        The outer scale of the turbulence of `phase_screen`. If this is None, the value
+        will be read from the archive. This cannot be changed afterwards.
+    velocity : scalar or array_like
+        The wind speed for this atmospheric layer. If this is a scalar,
+        the wind will be along x. If this is a 2D array, then the values
+        are interpreted as the wind speed along x and y. The default is
+        zero.
+    height : scalar
+        The height of the atmospheric layer. By itself, this value has no
+        influence, but it'll be used by the AtmosphericModel to perform
+        inter-layer propagations.
+    use_interpolation : boolean
+        Whether to use bilinear interpolation for sub-pixel shifts of the phase screen.
+        Otherwise the phase screen is shifted by whole pixels. The default is True.
+    seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+        A seed for choosing a random starting position on the phase screen when
+        making an independent realization using `reset()`.
+
+    Raises
+    ------
+    ValueError
+        When the input grid is not Cartesian and regularly spaced, when the spacing of
+        the input grid does not match that of the phase screen, or when Cn^2 or L0 are
+        not given for a phase screen that is not read from an archive.
+    '''
+    def __init__(self, input_grid, phase_screen, Cn_squared=None, L0=None, velocity=0, height=0, use_interpolation=True, seed=None):
+        if isinstance(phase_screen, (str, os.PathLike)):
+            phase_screen, archive_Cn_squared, archive_L0 = read_phase_screen_archive(phase_screen)
+
+            if Cn_squared is None:
+                Cn_squared = archive_Cn_squared
+            if L0 is None:
+                L0 = archive_L0
+
+        if Cn_squared is None or L0 is None:
+            raise ValueError('Both Cn_squared and L0 must be given for a phase screen that is not read from an archive.')
+
+        if not input_grid.is_('cartesian') or not input_grid.is_regular or input_grid.ndim != 2:
+            raise ValueError('Input grid must be a regularly-spaced, two-dimensional Cartesian grid.')
+        if not np.allclose(input_grid.delta, phase_screen.grid.delta):
+            raise ValueError('The input grid must have the same spacing as the phase screen.')
+
+        self._phase_screen = phase_screen.shaped
+        self._screen_grid = phase_screen.grid
+        self._reference_Cn_squared = Cn_squared
+        self._L0 = None
+
+        AtmosphericLayer.__init__(self, input_grid, Cn_squared, L0, velocity, height)
+
+        self.use_interpolation = use_interpolation
+        self.rng = np.random.default_rng(seed)
+
+        self.offset = np.zeros(2)
+        self.reset()
+
+    def reset(self, make_independent_realization=False):
+        '''Reset the atmospheric layer to t=0.
+
+        Parameters
+        ----------
+        make_independent_realization : boolean
+            Whether to start at a new, random position on the phase screen. When this
+            is False, the layer restarts at the same position as in the previous run.
+            Note that, as the phase screen itself is fixed, independent realizations
+            are only independent when the phase screen is much larger than the input grid.
+        '''
+        if make_independent_realization:
+            self.offset = self.rng.uniform(0, 1, size=2) * np.array(self._screen_grid.dims) * self._screen_grid.delta
+
+        self.center = np.zeros(2)
+        self._t = 0
+        self._achromatic_screen = None
+
+    def evolve_until(self, t):
+        '''Evolve the atmospheric layer until a certain time.
+
+        Parameters
+        ----------
+        t : scalar
+            The new time to evolve the phase screen to.
+        '''
+        self.center = self.velocity * t
+        self._t = t
+        self._achromatic_screen = None
+
+    @property
+    def achromatic_screen(self):
+        '''The phase of this layer for a wavelength of one.
+
+        This property is not intended to be used by the user.
+        '''
+        if self._achromatic_screen is None:
+            self._achromatic_screen = self._extract_screen()
+
+        return self._achromatic_screen
+
+    def _extract_screen(self):
+        '''Extract the part of the phase screen that is under the input grid.
+
+        Returns
+        -------
+        Field
+            The phase screen on the input grid for a wavelength of one.
+        '''
+        delta = self._screen_grid.delta
+        num_rows, num_cols = self._phase_screen.shape
+        ny, nx = self.input_grid.shape
+
+        # The phase screen moves with the wind, so the input grid moves in the opposite direction over the phase screen.
+        position = (self.input_grid.zero - self.center - self.offset - self._screen_grid.zero) / delta
+
+        if self.use_interpolation:
+            start = np.floor(position).astype('int')
+            fx, fy = position - start
+
+            rows = (start[1] + np.arange(ny + 1)) % num_rows
+            cols = (start[0] + np.arange(nx + 1)) % num_cols
+
+            # Reading only the necessary rows and columns avoids touching the rest of a memory-mapped screen.
+            window = np.asarray(self._phase_screen[np.ix_(rows, cols)], dtype='float64')
+
+            screen = (1 - fy) * ((1 - fx) * window[:-1, :-1] + fx * window[:-1, 1:])
+            screen += fy * ((1 - fx) * window[1:, :-1] + fx * window[1:, 1:])
+        else:
+            start = np.round(position).astype('int')
+
+            rows = (start[1] + np.arange(ny)) % num_rows
+            cols = (start[0] + np.arange(nx)) % num_cols
+
+            screen = np.array(self._phase_screen[np.ix_(rows, cols)], dtype='float64')
+
+        screen *= np.sqrt(self.Cn_squared / self._reference_Cn_squared)
+
+        return Field(screen.ravel(), self.input_grid)
+
+    def phase_for(self, wavelength):
+        '''Compute the phase at a certain wavelength.
+
+        Parameters
+        ----------
+        wavelength : scalar
+            The wavelength of the light for which to compute the phase screen.
+
+        Returns
+        -------
+        Field
+            The computed phase screen.
+        '''
+        return self.achromatic_screen / wavelength
+
+    @property
+    def Cn_squared(self):  # noqa: N802
+        '''The integrated strength of the turbulence for this layer.
+        '''
+        return self._Cn_squared
+
+    @Cn_squared.setter
+    def Cn_squared(self, Cn_squared):  # noqa: N802
+        self._Cn_squared = Cn_squared
+        self._achromatic_screen = None
+
+    @property
+    def outer_scale(self):
+        '''The outer scale of the turbulence for this layer.
+        '''
+        return self._L0
+
+    @outer_scale.setter
+    def L0(self, L0):  # noqa: N802
+        if self._L0 is not None and L0 != self._L0:
+            raise ValueError('The outer scale of a stored phase screen cannot be changed.')
+
+        self._L0 = L0
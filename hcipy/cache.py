@@ -0,0 +1,290 @@
+import collections
+import threading
+import types
+
+import numpy as np
+
+def get_nbytes(obj):
+    '''Estimate the number of bytes held by the Numpy arrays inside an object.
+
+    This function recursively walks through lists, tuples, dictionaries and
+    object attributes, and sums the sizes of all Numpy arrays it encounters.
+    Each array is counted only once, even if it is referenced multiple times.
+
+    Parameters
+    ----------
+    obj : anything
+        The object for which to estimate the size.
+
+    Returns
+    -------
+    integer
+        The estimated number of bytes.
+    '''
+    seen = set()
+    nbytes = 0
+    stack = [obj]
+
+    while stack:
+        o = stack.pop()
+
+        if o is None or id(o) in seen:
+            continue
+        seen.add(id(o))
+
+        if isinstance(o, np.ndarray):
+            # Count the memory of the base array for views.
+            base = o
+            while isinstance(base.base, np.ndarray):
+                base = base.base
+
+            if base is not o:
+                if id(base) in seen:
+                    continue
+                seen.add(id(base))
+
+            nbytes += base.nbytes
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, dict):
+            stack.extend(o.values())
+        elif hasattr(o, '__dict__') and not isinstance(o, (type, types.ModuleType)):
+            stack.extend(vars(o).values())
+
+    return nbytes
+
+class LRUCache(object):
+    '''A thread-safe least-recently-used cache with bounds on its size.
+
+    The cache can be bounded by the number of entries, the total number of
+    bytes of the Numpy arrays held by its entries, or both. When adding an
+    entry would exceed a bound, the least recently used entries are evicted
+    until the cache is within its bounds again. Entries that are larger than
+    the byte budget by themselves are not stored at all.
+
+    .. note::
+        Evicting an entry only removes the reference held by the cache. Arrays
+        that are still referenced elsewhere are not freed.
+
+    Parameters
+    ----------
+    max_entries : integer or None
+        The maximum number of entries. If this is None, the number of entries is not bounded.
+    max_bytes : integer or None
+        The maximum number of bytes. If this is None, the number of bytes is not bounded.
+    size_function : function or None
+        A function that returns the size in bytes of a value. If this is None,
+        `get_nbytes()` is used.
+    eviction_callback : function or None
+        A function `eviction_callback(key, value)` that is called for each entry
+        that was evicted to satisfy the bounds. It is called after the cache has
+        been updated, so it is allowed to access the cache itself.
+
+    Attributes
+    ----------
+    hits : integer
+        The number of lookups that found their key.
+    misses : integer
+        The number of lookups that did not find their key.
+    evictions : integer
+        The number of entries that were evicted to satisfy the bounds.
+    '''
+    def __init__(self, max_entries=None, max_bytes=None, size_function=None, eviction_callback=None):
+        self._entries = collections.OrderedDict()
+        self._sizes = {}
+        self._nbytes = 0
+
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+
+        if size_function is None:
+            size_function = get_nbytes
+        self.size_function = size_function
+        self.eviction_callback = eviction_callback
+
+        self._lock = threading.RLock()
+
+        self.reset_statistics()
+
+    @property
+    def max_entries(self):
+        '''The maximum number of entries in the cache, or None if unbounded.
+        '''
+        return self._max_entries
+
+    @max_entries.setter
+    def max_entries(self, max_entries):
+        with self._lock:
+            self._max_entries = max_entries
+            evicted = self._evict()
+
+        self._notify_evicted(evicted)
+
+    @property
+    def max_bytes(self):
+        '''The maximum number of bytes held by the cache, or None if unbounded.
+        '''
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        with self._lock:
+            self._max_bytes = max_bytes
+            evicted = self._evict()
+
+        self._notify_evicted(evicted)
+
+    @property
+    def nbytes(self):
+        '''The total number of bytes held by all entries in the cache.
+        '''
+        return self._nbytes
+
+    def reset_statistics(self):
+        '''Reset the hit, miss and eviction counters.
+        '''
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def statistics(self):
+        '''A dictionary with the current statistics of the cache.
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self),
+            'nbytes': self.nbytes
+        }
+
+    def get(self, key, default=None):
+        '''Get the value for a key and mark it as most recently used.
+
+        Parameters
+        ----------
+        key : hashable
+            The key to look up.
+        default : anything
+            The value to return if the key is not in the cache.
+
+        Returns
+        -------
+        anything
+            The cached value, or `default` if the key was not found.
+        '''
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return value
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                raise KeyError(key)
+
+            return self.get(key)
+
+    def __setitem__(self, key, value):
+        nbytes = self.size_function(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            if self._max_bytes is not None and nbytes > self._max_bytes:
+                # This value would never fit.
+                return
+
+            self._entries[key] = value
+            self._sizes[key] = nbytes
+            self._nbytes += nbytes
+
+            evicted = self._evict()
+
+        self._notify_evicted(evicted)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        '''A list of all keys, from least to most recently used.
+        '''
+        with self._lock:
+            return list(self._entries.keys())
+
+    def pop(self, key, default=None):
+        '''Remove an entry and return its value.
+
+        Parameters
+        ----------
+        key : hashable
+            The key to remove.
+        default : anything
+            The value to return if the key is not in the cache.
+
+        Returns
+        -------
+        anything
+            The removed value, or `default` if the key was not found.
+        '''
+        with self._lock:
+            if key not in self._entries:
+                return default
+
+            value = self._entries[key]
+            self._remove(key)
+
+            return value
+
+    def clear(self):
+        '''Remove all entries from the cache.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._nbytes = 0
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._nbytes -= self._sizes.pop(key)
+
+    def _evict(self):
+        evicted = []
+
+        while self._entries:
+            too_many_entries = self._max_entries is not None and len(self._entries) > self._max_entries
+            too_many_bytes = self._max_bytes is not None and self._nbytes > self._max_bytes
+
+            if not (too_many_entries or too_many_bytes):
+                break
+
+            key = next(iter(self._entries))
+            evicted.append((key, self._entries[key]))
+
+            self._remove(key)
+            self.evictions += 1
+
+        return evicted
+
+    def _notify_evicted(self, evicted):
+        # This is done outside of the lock to avoid deadlocks when the callback uses other caches.
+        if self.eviction_callback is not None:
+            for key, value in evicted:
+                self.eviction_callback(key, value)
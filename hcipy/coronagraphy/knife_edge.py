@@ -1,14 +1,9 @@
 from ..optics import Apodizer, OpticalElement, Wavefront
 from ..field import Field
-from ..fourier import FastFourierTransform, make_fft_grid
+from ..fourier import FastFourierTransform, make_fft_grid, get_fft_backend
 
 import numpy as np
 
-try:
-	import mkl_fft._numpy_fft as _fft_module
-except ImportError:
-	_fft_module = np.fft
-
 class KnifeEdgeLyotCoronagraph(OpticalElement):
 	'''A Lyot-style coronagraph with a centered, knife-edge focal-plane mask.
 
@@ -94,7 +89,8 @@ class KnifeEdgeLyotCoronagraph(OpticalElement):
 			axis = 0
 			focal_mask = self.focal_mask[:, np.newaxis]
 
-		post_coro = _fft_module.ifft(_fft_module.fft(ap, axis=axis) * focal_mask, axis=axis)
+		fft_backend = get_fft_backend()
+		post_coro = fft_backend.ifft(fft_backend.fft(ap, axis=axis) * focal_mask, axis=axis, overwrite_x=True)
 		post_coro = Field(post_coro[self.cutout_input].ravel(), wavefront.electric_field.grid)
 
 		wavefront = Wavefront(post_coro, wavefront.wavelength)
@@ -131,7 +127,8 @@ class KnifeEdgeLyotCoronagraph(OpticalElement):
 			axis = 0
 			focal_mask = self.focal_mask[:, np.newaxis]
 
-		post_coro = _fft_module.ifft(_fft_module.fft(ap, axis=axis) * focal_mask, axis=axis)
+		fft_backend = get_fft_backend()
+		post_coro = fft_backend.ifft(fft_backend.fft(ap, axis=axis) * focal_mask, axis=axis, overwrite_x=True)
 		post_coro = Field(post_coro[self.cutout_input].ravel(), wavefront.electric_field.grid)
 
 		wavefront = Wavefront(post_coro, wavefront.wavelength)
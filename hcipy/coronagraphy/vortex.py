@@ -218,47 +218,56 @@ class VectorVortexCoronagraph(AgnosticOpticalElement):
 		qs = [2 * self.scaling_factor**i for i in range(levels)]
 		num_airys = [input_grid.shape / 2]
 
-		focal_grids = []
-		instance_data.props = []
-		instance_data.jones_matrices = []
-
 		for i in range(1, levels):
 			num_airys.append(num_airys[i - 1] * self.window_size / (2 * qs[i - 1] * num_airys[i - 1]))
 
-		for i in range(levels):
-			q = qs[i]
-			num_airy = num_airys[i]
+		focal_grids = [make_focal_grid(q, num_airy, pupil_diameter=pupil_diameter, reference_wavelength=1, focal_length=1) for q, num_airy in zip(qs, num_airys)]
+		retardance = self.evaluate_parameter(self.phase_retardation, input_grid, output_grid, wavelength)
 
-			focal_grid = make_focal_grid(q, num_airy, pupil_diameter=pupil_diameter, reference_wavelength=1, focal_length=1)
+		def compute_jones_matrices():
+			jones_matrices = []
 
-			fast_axis_orientation = Field(self.charge / 2 * focal_grid.as_('polar').theta, focal_grid)
-			retardance = self.evaluate_parameter(self.phase_retardation, input_grid, output_grid, wavelength)
+			for i, focal_grid in enumerate(focal_grids):
+				fast_axis_orientation = Field(self.charge / 2 * focal_grid.as_('polar').theta, focal_grid)
 
-			focal_mask_raw = LinearRetarder(retardance, fast_axis_orientation)
-			jones_matrix = focal_mask_raw.jones_matrix
+				focal_mask_raw = LinearRetarder(retardance, fast_axis_orientation)
+				jones_matrix = focal_mask_raw.jones_matrix
 
-			jones_matrix *= 1 - make_circular_aperture(1e-9)(focal_grid)
+				jones_matrix *= 1 - make_circular_aperture(1e-9)(focal_grid)
 
-			if i != levels - 1:
-				wx = windows.tukey(self.window_size, 1, False)
-				wy = windows.tukey(self.window_size, 1, False)
-				w = np.outer(wy, wx)
+				if i != levels - 1:
+					wx = windows.tukey(self.window_size, 1, False)
+					wy = windows.tukey(self.window_size, 1, False)
+					w = np.outer(wy, wx)
 
-				w = np.pad(w, (focal_grid.shape - w.shape) // 2, 'constant').ravel()
-				jones_matrix *= 1 - w
+					w = np.pad(w, (focal_grid.shape - w.shape) // 2, 'constant').ravel()
+					jones_matrix *= 1 - w
 
-			for j in range(i):
-				fft = FastFourierTransform(focal_grids[j])
-				mft = MatrixFourierTransform(focal_grid, fft.output_grid)
+				for j in range(i):
+					fft = FastFourierTransform(focal_grids[j])
+					mft = MatrixFourierTransform(focal_grid, fft.output_grid)
+
+					jones_matrix -= mft.backward(fft.forward(jones_matrices[j]))
+
+				jones_matrices.append(jones_matrix)
+
+			return jones_matrices
 
-				jones_matrix -= mft.backward(fft.forward(instance_data.jones_matrices[j]))
+		# The multi-scale focal masks are expensive to compute, so these can be stored on disk.
+		parameters = [input_grid, retardance, self.charge, self.q, self.scaling_factor, self.window_size]
+		jones_matrices = self.evaluate_with_disk_cache(compute_jones_matrices, *parameters)
+
+		instance_data.props = []
+		instance_data.jones_matrices = []
+
+		for i, (q, focal_grid, jones_matrix) in enumerate(zip(qs, focal_grids, jones_matrices)):
+			jones_matrix = Field(jones_matrix, focal_grid)
 
 			if i == 0:
 				prop = FourierFilter(input_grid, jones_matrix, q)
 			else:
 				prop = FraunhoferPropagator(input_grid, focal_grid)
 
-			focal_grids.append(focal_grid)
 			instance_data.jones_matrices.append(jones_matrix)
 			instance_data.props.append(prop)
 
@@ -18,6 +18,12 @@ class Grid(object):
 	----------
 	coords
 		The coordinate values for each dimension.
+
+	.. note::
+		The hash of a grid is computed once and then memoized. It is recomputed after the coordinates are
+		changed by one of the in-place transformations (`shift()`, `scale()`, `rotate()` or `reverse()`) or
+		by assigning new coordinates. Modifying the coordinate arrays directly is not detected, so grids
+		should otherwise be treated as immutable.
 	'''
 
 	_coordinate_system = 'none'
@@ -28,6 +34,17 @@ class Grid(object):
 		self.coords = coords
 		self.weights = weights
 
+	@property
+	def coords(self):
+		'''The coordinate values for each dimension.
+		'''
+		return self._coords
+
+	@coords.setter
+	def coords(self, coords):
+		self._coords = coords
+		self._hash = None
+
 	def copy(self):
 		'''Create a copy.
 		'''
@@ -421,6 +438,8 @@ class Grid(object):
 			Itself to allow for chaining these transformations.
 		'''
 		self.coords.reverse()
+		self._hash = None
+
 		return self
 
 	def reversed(self):
@@ -443,6 +462,10 @@ class Grid(object):
 		return str(self.__class__.__name__) + '(' + str(self.coords.__class__.__name__) + ')'
 
 	def __hash__(self):
+		# Use the memoized hash if available.
+		if getattr(self, '_hash', None) is not None:
+			return self._hash
+
 		h = xxhash.xxh64()
 		h.update(self._coordinate_system)
 
@@ -452,12 +475,14 @@ class Grid(object):
 			h.update(self.zero)
 		elif self.is_separated:
 			for s in self.separated_coords:
-				h.update(s)
+				h.update(np.ascontiguousarray(s))
 		else:
 			for s in self.coords:
-				h.update(s)
+				h.update(np.ascontiguousarray(s))
 
-		return h.intdigest()
+		self._hash = h.intdigest()
+
+		return self._hash
 
 	def __eq__(self, other):
 		'''Check equality of two grids.
@@ -476,6 +501,9 @@ class Grid(object):
 		boolean
 			Whether the two objects are identical.
 		'''
+		if self is other:
+			return True
+
 		if not isinstance(other, Grid):
 			return False
 
@@ -93,7 +93,7 @@ class PolarGrid(Grid):
 		Grid
 			Itself to allow for chaining these transformations.
 		'''
-		self.theta += angle
+		self.coords = UnstructuredCoords([self.r, self.theta + angle])
 		return self
 
 	@staticmethod
@@ -8,12 +8,21 @@ __all__ = [
     'FastFourierTransform',
     'FourierFilter',
     'MatrixFourierTransform',
+    'get_mft_matrix_cache',
     'NaiveFourierTransform',
     'ZoomFastFourierTransform',
+    'FFTBackend',
+    'get_fft_backend',
+    'register_fft_backend',
+    'export_fourier_wisdom',
+    'import_fourier_wisdom',
+    'forget_fourier_wisdom',
 ]
 
 from .fourier_transform import *
 from .chirp_z_transform import *
+from .fft_backends import *
+from .fourier_wisdom import *
 from .fast_fourier_transform import *
 from .fourier_operations import *
 from .matrix_fourier_transform import *
@@ -2,11 +2,7 @@ import numpy as np
 from scipy.fft import next_fast_len
 
 from .fourier_transform import _get_float_and_complex_dtype
-
-try:
-	import mkl_fft._numpy_fft as _fft_module
-except ImportError:
-	_fft_module = np.fft
+from .fft_backends import get_fft_backend
 
 class ChirpZTransform:
 	'''The Chirp Z-transform (CZT).
@@ -64,7 +60,7 @@ class ChirpZTransform:
 			self.nfft = next_fast_len(self.n + self.m - 1)
 
 			self._Awk2 = self.a**-k[:self.n] * wk2[:self.n]
-			self._Fwk2 = _fft_module.fft(1 / np.hstack((wk2[self.n - 1:0:-1], wk2[:self.m])), self.nfft)
+			self._Fwk2 = get_fft_backend().fft(1 / np.hstack((wk2[self.n - 1:0:-1], wk2[:self.m])), self.nfft)
 			self._wk2 = wk2[:self.m]
 			self._yidx = slice(self.n - 1, self.n + self.m - 1)
 
@@ -99,9 +95,11 @@ class ChirpZTransform:
 		# Perform the CZT.
 		x = x * self._Awk2
 
-		intermediate = _fft_module.fft(x, self.nfft)
+		fft_backend = get_fft_backend()
+
+		intermediate = fft_backend.fft(x, self.nfft)
 		intermediate *= self._Fwk2
-		res = _fft_module.ifft(intermediate)
+		res = fft_backend.ifft(intermediate, overwrite_x=True)
 
 		res = res[..., self._yidx] * self._wk2
 
@@ -1,16 +1,12 @@
 from __future__ import division
 
 import numpy as np
-from .fourier_transform import FourierTransform, multiplex_for_tensor_fields, _get_float_and_complex_dtype
+from .fourier_transform import FourierTransform, _get_float_and_complex_dtype
 from ..field import Field, CartesianGrid, RegularCoords
+from .fft_backends import get_fft_backend
 from ..config import Configuration
 import numexpr as ne
 
-try:
-	import mkl_fft._numpy_fft as _fft_module
-except ImportError:
-	_fft_module = np.fft
-
 def make_fft_grid(input_grid, q=1, fov=1, shift=0):
 	'''Calculate the grid returned by a Fast Fourier Transform.
 
@@ -239,7 +235,7 @@ class FastFourierTransform(FourierTransform):
 
 		self.shape_out = self.output_grid.shape
 		self.internal_shape = self.internal_grid.shape
-		self.internal_array = np.zeros(self.internal_shape, 'complex')
+		self.internal_array = None
 
 		# Calculate the part of the array in which to insert the input field (for zeropadding).
 		if np.allclose(self.internal_shape, self.shape_in):
@@ -258,12 +254,8 @@ class FastFourierTransform(FourierTransform):
 			self.cutout_output = tuple([slice(start, end) for start, end in zip(cutout_start, cutout_end)])
 
 		# Calculate the shift array when the input grid was shifted compared to the native shift
-		# expected by the numpy FFT implementation.
-		center = input_grid.zero + input_grid.delta * (np.array(input_grid.dims) // 2)
-		self.shift_input = _numexpr_grid_shift(-center, self.output_grid)
-
-		# Remove piston shift (remove central shift phase)
-		self.shift_input /= np.fft.ifftshift(self.shift_input.reshape(self.shape_out)).ravel()[0]
+		# expected by the numpy FFT implementation, including the weights for Fourier normalization.
+		self.shift_input = self._compute_native_shift_input()
 
 		# Calculate the multiplication for emulating the FFTshift (if requested).
 		if emulate_fftshifts:
@@ -275,12 +267,16 @@ class FastFourierTransform(FourierTransform):
 			else:
 				self.shift_input *= fftshift
 
-		# Apply weights for Fourier normalization.
-		self.shift_input *= self.weights
-
 		# Calculate the shift array when the output grid was shifted compared to the native shift
 		# expcted by the numpy FFT implementation.
 		shift = np.ones(self.input_grid.ndim) * shift
+
+		# Real-to-complex and complex-to-real transforms are only possible without an output shift,
+		# as the shift would make the input domain complex.
+		self._real_transforms_possible = np.allclose(shift, 0)
+		self._real_transform_dtype = None
+		self._real_indices = None
+
 		if np.allclose(shift, 0):
 			self.shift_output = 1
 		else:
@@ -302,10 +298,183 @@ class FastFourierTransform(FourierTransform):
 		if np.isscalar(self.shift_output) and np.allclose(self.shift_output, 1):
 			self.shift_output = None
 
-	@multiplex_for_tensor_fields
+		self._current_dtype = None
+
+	def _compute_native_shift_input(self):
+		'''Compute the shift array in the Fourier domain without FFTshift emulation.
+
+		Returns
+		-------
+		array_like
+			The shift array, including weights for the Fourier normalization.
+		'''
+		center = self.input_grid.zero + self.input_grid.delta * (np.array(self.input_grid.dims) // 2)
+		shift_input = _numexpr_grid_shift(-center, self.output_grid)
+
+		# Remove piston shift (remove central shift phase)
+		shift_input /= np.fft.ifftshift(shift_input.reshape(self.shape_out)).ravel()[0]
+
+		# Apply weights for Fourier normalization.
+		shift_input *= self.weights
+
+		return shift_input
+
+	def _compute_real_transforms(self, dtype):
+		'''Compute the indices and shift arrays for real-to-complex and complex-to-real transforms.
+
+		Real transforms compute only half of the internal Fourier domain. The
+		indices map the input field into the internal array, and the output
+		field from (the Hermitian-symmetric counterpart of) that half. This
+		fuses the zeropadding, cropping and FFTshifts into single gathers.
+
+		Parameters
+		----------
+		dtype : numpy data type
+			The data type for which to calculate the shift arrays.
+		'''
+		float_dtype, complex_dtype = _get_float_and_complex_dtype(dtype)
+
+		if self._real_indices is None:
+			M = np.array(self.internal_shape)
+			half_shape = tuple(M[:-1]) + (M[-1] // 2 + 1,)
+			M_col = M[:, np.newaxis]
+
+			def cutout_start(cutout):
+				if cutout is None:
+					return np.zeros((self.ndim, 1), dtype='int')
+				else:
+					return np.array([c.start for c in cutout])[:, np.newaxis]
+
+			start_in = cutout_start(self.cutout_input)
+			start_out = cutout_start(self.cutout_output)
+
+			# Position of each input pixel in the internal array after an ifftshift.
+			c = np.indices(self.shape_in).reshape((self.ndim, -1)) + start_in
+			index_input = np.ravel_multi_index((c - M_col // 2) % M_col, M)
+
+			# Position of each output pixel in the half Fourier domain. Pixels in the missing
+			# half are taken from their Hermitian-symmetric counterpart, and need conjugation.
+			k = (np.indices(self.shape_out).reshape((self.ndim, -1)) + start_out - M_col // 2) % M_col
+			conjugate_output = k[-1] > M[-1] // 2
+			k[:, conjugate_output] = (-k[:, conjugate_output]) % M_col
+			index_output = np.ravel_multi_index(k, half_shape)
+
+			# Position in the output field of the pixels k and -k for each pixel k in the half
+			# Fourier domain, for computing the Hermitian part. Pixels outside of the output
+			# field point to an extra zero element at the end.
+			k = np.indices(half_shape).reshape((self.ndim, -1))
+			index_hermitian = []
+
+			for sign in [1, -1]:
+				o = (sign * k + M_col // 2) % M_col - start_out
+				inside = np.all((o >= 0) & (o < np.array(self.shape_out)[:, np.newaxis]), axis=0)
+
+				index = np.full(k.shape[1], self.output_grid.size)
+				index[inside] = np.ravel_multi_index(o[:, inside], self.shape_out)
+
+				index_hermitian.append(index)
+
+			self._real_indices = (half_shape, index_input, index_output, conjugate_output, index_hermitian)
+
+		if self._real_transform_dtype != complex_dtype:
+			shift_input = self._compute_native_shift_input()
+
+			self._real_shift_input = shift_input.astype(complex_dtype)
+			self._real_shift_input_inverse = (0.5 / shift_input).astype(complex_dtype)
+
+			self._real_transform_dtype = complex_dtype
+
+	def _forward_real(self, field):
+		'''Returns the forward Fourier transform of a real :class:`Field` using a real-to-complex FFT.
+
+		Parameters
+		----------
+		field : Field
+			The real field to Fourier transform.
+
+		Returns
+		-------
+		Field
+			The Fourier transform of the field.
+		'''
+		float_dtype, complex_dtype = _get_float_and_complex_dtype(field.dtype)
+		self._compute_real_transforms(field.dtype)
+
+		half_shape, index_input, index_output, conjugate_output, index_hermitian = self._real_indices
+
+		tensor_shape = field.shape[:-1]
+		axes = tuple(range(-self.ndim, 0))
+
+		f = field.reshape((-1, field.shape[-1]))
+
+		internal_array = np.zeros((f.shape[0], self.internal_grid.size), dtype=float_dtype)
+		internal_array[:, index_input] = f
+
+		half = get_fft_backend().rfftn(internal_array.reshape((-1,) + tuple(self.internal_shape)), axes=axes)
+
+		res = half.reshape((f.shape[0], -1))[:, index_output]
+		np.conjugate(res, out=res, where=conjugate_output)
+		res *= self._real_shift_input
+
+		return Field(res.reshape(tensor_shape + (-1,)), self.output_grid).astype(complex_dtype, copy=False)
+
+	def _compute_shifts(self, dtype):
+		'''Compute the shift arrays for the FFT using the specified data type.
+
+		The shift arrays are always calculated in double precision and cast
+		to the requested precision, to retain as much accuracy as possible.
+
+		Parameters
+		----------
+		dtype : numpy data type
+			The data type for which to calculate the shift arrays.
+		'''
+		float_dtype, complex_dtype = _get_float_and_complex_dtype(dtype)
+
+		if complex_dtype != self._current_dtype:
+			self._shift_input = self.shift_input.astype(complex_dtype, copy=False)
+
+			if self.shift_output is None:
+				self._shift_output = None
+			else:
+				self._shift_output = np.asarray(self.shift_output).astype(complex_dtype, copy=False)
+
+			self._current_dtype = complex_dtype
+
+	def _get_internal_array(self, tensor_shape):
+		'''Get the internal array for a field with a certain tensor shape.
+
+		The internal array is reallocated only if its shape or data type needs
+		to change. Its data type is the one of the last call to `_compute_shifts()`.
+
+		Parameters
+		----------
+		tensor_shape : tuple
+			The tensor shape of the field that is going to be transformed.
+
+		Returns
+		-------
+		array_like
+			The internal array.
+		'''
+		shape = tuple(tensor_shape) + tuple(self.internal_shape)
+
+		reallocate = self.internal_array is None
+		reallocate = reallocate or self.internal_array.shape != shape
+		reallocate = reallocate or self.internal_array.dtype != self._current_dtype
+
+		if reallocate:
+			self.internal_array = np.zeros(shape, dtype=self._current_dtype)
+
+		return self.internal_array
+
 	def forward(self, field):
 		'''Returns the forward Fourier transform of the :class:`Field` field.
 
+		Tensor fields are transformed in a single batched FFT along the last axes. Real
+		fields are transformed using a real-to-complex FFT if the output grid is not
+		shifted, which halves the computational cost.
+
 		Parameters
 		----------
 		field : Field
@@ -316,40 +485,54 @@ class FastFourierTransform(FourierTransform):
 		Field
 			The Fourier transform of the field.
 		'''
+		if self._real_transforms_possible and not np.iscomplexobj(field):
+			return self._forward_real(field)
+
+		tensor_shape = field.shape[:-1]
+		tensor_slice = (slice(None),) * len(tensor_shape)
+		axes = tuple(range(-self.ndim, 0))
+
+		self._compute_shifts(field.dtype)
+		internal_array = self._get_internal_array(tensor_shape)
+		f = field.reshape(tensor_shape + tuple(self.shape_in))
+
 		if self.cutout_input is None:
-			self.internal_array[:] = field.reshape(self.shape_in)
+			internal_array[:] = f
 
-			if self.shift_output is not None:
-				self.internal_array *= self.shift_output.reshape(self.shape_in)
+			if self._shift_output is not None:
+				internal_array *= self._shift_output.reshape(self.shape_in)
 		else:
-			self.internal_array[:] = 0
-			self.internal_array[self.cutout_input] = field.reshape(self.shape_in)
+			cutout_input = tensor_slice + self.cutout_input
+
+			internal_array[:] = 0
+			internal_array[cutout_input] = f
 
-			if self.shift_output is not None:
-				self.internal_array[self.cutout_input] *= self.shift_output.reshape(self.shape_in)
+			if self._shift_output is not None:
+				internal_array[cutout_input] *= self._shift_output.reshape(self.shape_in)
 
 		if not self.emulate_fftshifts:
-			self.internal_array = np.fft.ifftshift(self.internal_array)
+			internal_array = np.fft.ifftshift(internal_array, axes=axes)
 
-		fft_array = _fft_module.fftn(self.internal_array)
+		fft_array = get_fft_backend().fftn(internal_array, axes=axes)
 
 		if not self.emulate_fftshifts:
-			fft_array = np.fft.fftshift(fft_array)
+			fft_array = np.fft.fftshift(fft_array, axes=axes)
 
 		if self.cutout_output is None:
-			res = fft_array.ravel()
+			res = fft_array.reshape(tensor_shape + (-1,))
 		else:
-			res = fft_array[self.cutout_output].ravel()
+			res = fft_array[tensor_slice + self.cutout_output].reshape(tensor_shape + (-1,))
 
-		res *= self.shift_input
+		res *= self._shift_input
 
 		float_dtype, complex_dtype = _get_float_and_complex_dtype(field.dtype)
 		return Field(res, self.output_grid).astype(complex_dtype, copy=False)
 
-	@multiplex_for_tensor_fields
 	def backward(self, field):
 		'''Returns the inverse Fourier transform of the :class:`Field` field.
 
+		Tensor fields are transformed in a single batched FFT along the last axes.
+
 		Parameters
 		----------
 		field : Field
@@ -360,29 +543,82 @@ class FastFourierTransform(FourierTransform):
 		Field
 			The inverse Fourier transform of the field.
 		'''
+		tensor_shape = field.shape[:-1]
+		tensor_slice = (slice(None),) * len(tensor_shape)
+		axes = tuple(range(-self.ndim, 0))
+
+		self._compute_shifts(field.dtype)
+		internal_array = self._get_internal_array(tensor_shape)
+		f = field.reshape(tensor_shape + tuple(self.shape_out))
+
 		if self.cutout_output is None:
-			self.internal_array[:] = field.reshape(self.shape_out)
-			self.internal_array /= self.shift_input.reshape(self.shape_out)
+			internal_array[:] = f
+			internal_array /= self._shift_input.reshape(self.shape_out)
 		else:
-			self.internal_array[:] = 0
-			self.internal_array[self.cutout_output] = field.reshape(self.shape_out)
-			self.internal_array[self.cutout_output] /= self.shift_input.reshape(self.shape_out)
+			cutout_output = tensor_slice + self.cutout_output
+
+			internal_array[:] = 0
+			internal_array[cutout_output] = f
+			internal_array[cutout_output] /= self._shift_input.reshape(self.shape_out)
 
 		if not self.emulate_fftshifts:
-			self.internal_array = np.fft.ifftshift(self.internal_array)
+			internal_array = np.fft.ifftshift(internal_array, axes=axes)
 
-		fft_array = _fft_module.ifftn(self.internal_array)
+		fft_array = get_fft_backend().ifftn(internal_array, axes=axes)
 
 		if not self.emulate_fftshifts:
-			fft_array = np.fft.fftshift(fft_array)
+			fft_array = np.fft.fftshift(fft_array, axes=axes)
 
 		if self.cutout_input is None:
-			res = fft_array.ravel()
+			res = fft_array.reshape(tensor_shape + (-1,))
 		else:
-			res = fft_array[self.cutout_input].ravel()
+			res = fft_array[tensor_slice + self.cutout_input].reshape(tensor_shape + (-1,))
 
-		if self.shift_output is not None:
-				res /= self.shift_output
+		if self._shift_output is not None:
+			res /= self._shift_output
 
 		float_dtype, complex_dtype = _get_float_and_complex_dtype(field.dtype)
 		return Field(res, self.input_grid).astype(complex_dtype, copy=False)
+
+	def backward_real(self, field):
+		'''Returns the real part of the inverse Fourier transform of the :class:`Field` field.
+
+		If the output grid is not shifted, this uses a complex-to-real FFT of the Hermitian
+		part of the field, which halves the computational cost compared to taking the real
+		part of `backward()`.
+
+		Parameters
+		----------
+		field : Field
+			The field to inverse Fourier transform.
+
+		Returns
+		-------
+		Field
+			The real part of the inverse Fourier transform of the field.
+		'''
+		if not self._real_transforms_possible:
+			return super().backward_real(field)
+
+		float_dtype, complex_dtype = _get_float_and_complex_dtype(field.dtype)
+		self._compute_real_transforms(field.dtype)
+
+		half_shape, index_input, index_output, conjugate_output, index_hermitian = self._real_indices
+
+		tensor_shape = field.shape[:-1]
+		axes = tuple(range(-self.ndim, 0))
+
+		f = field.reshape((-1, field.shape[-1]))
+
+		# Add a zero element at the end for pixels outside of the output field.
+		padded = np.zeros((f.shape[0], f.shape[1] + 1), dtype=complex_dtype)
+		np.multiply(f, self._real_shift_input_inverse, out=padded[:, :-1])
+
+		# The real part of an inverse FFT is the inverse FFT of the Hermitian part.
+		hermitian = padded[:, index_hermitian[0]]
+		hermitian += padded[:, index_hermitian[1]].conj()
+
+		res = get_fft_backend().irfftn(hermitian.reshape((-1,) + half_shape), s=tuple(self.internal_shape), axes=axes)
+		res = res.reshape((f.shape[0], -1))[:, index_input]
+
+		return Field(res.reshape(tensor_shape + (-1,)), self.input_grid).astype(float_dtype, copy=False)
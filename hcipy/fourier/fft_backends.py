@@ -0,0 +1,521 @@
+import numpy as np
+import scipy.fft
+import os
+import pickle
+import tempfile
+
+from ..config import Configuration
+
+class FFTBackend(object):
+	'''The base class for all FFT backends.
+
+	An FFT backend provides the low-level one- and multi-dimensional FFT
+	routines used by the Fourier transform classes in HCIPy. All backends
+	follow the Numpy normalization conventions.
+
+	Parameters
+	----------
+	num_threads : integer
+		The number of threads to use for each FFT. A value of -1 indicates
+		that all available cores should be used. Backends that do not support
+		multithreading ignore this value.
+	'''
+	def __init__(self, num_threads=1):
+		self.num_threads = num_threads
+
+	def fft(self, x, n=None, axis=-1, overwrite_x=False):
+		'''Compute the one-dimensional forward FFT along an axis.
+
+		Parameters
+		----------
+		x : array_like
+			The array to Fourier transform.
+		n : integer or None
+			The length of the transformed axis. The input is zeropadded or
+			cropped to this length. If this is None, the length of the input
+			along `axis` is used.
+		axis : integer
+			The axis along which to compute the FFT.
+		overwrite_x : boolean
+			Whether the input array can be destroyed during the computation.
+			This is a hint, which a backend is free to ignore.
+
+		Returns
+		-------
+		array_like
+			The Fourier transformed array.
+		'''
+		raise NotImplementedError()
+
+	def ifft(self, x, n=None, axis=-1, overwrite_x=False):
+		'''Compute the one-dimensional inverse FFT along an axis.
+
+		Parameters
+		----------
+		x : array_like
+			The array to inverse Fourier transform.
+		n : integer or None
+			The length of the transformed axis. The input is zeropadded or
+			cropped to this length. If this is None, the length of the input
+			along `axis` is used.
+		axis : integer
+			The axis along which to compute the inverse FFT.
+		overwrite_x : boolean
+			Whether the input array can be destroyed during the computation.
+			This is a hint, which a backend is free to ignore.
+
+		Returns
+		-------
+		array_like
+			The inverse Fourier transformed array.
+		'''
+		raise NotImplementedError()
+
+	def fftn(self, x, axes=None, overwrite_x=False):
+		'''Compute the multi-dimensional forward FFT.
+
+		Parameters
+		----------
+		x : array_like
+			The array to Fourier transform.
+		axes : tuple of integers or None
+			The axes along which to compute the FFT. If this is None, the
+			FFT is computed along all axes.
+		overwrite_x : boolean
+			Whether the input array can be destroyed during the computation.
+			This is a hint, which a backend is free to ignore.
+
+		Returns
+		-------
+		array_like
+			The Fourier transformed array.
+		'''
+		raise NotImplementedError()
+
+	def ifftn(self, x, axes=None, overwrite_x=False):
+		'''Compute the multi-dimensional inverse FFT.
+
+		Parameters
+		----------
+		x : array_like
+			The array to inverse Fourier transform.
+		axes : tuple of integers or None
+			The axes along which to compute the inverse FFT. If this is None,
+			the inverse FFT is computed along all axes.
+		overwrite_x : boolean
+			Whether the input array can be destroyed during the computation.
+			This is a hint, which a backend is free to ignore.
+
+		Returns
+		-------
+		array_like
+			The inverse Fourier transformed array.
+		'''
+		raise NotImplementedError()
+
+	def rfftn(self, x, axes=None):
+		'''Compute the multi-dimensional forward FFT of a real array.
+
+		Only the non-negative frequencies along the last transformed axis
+		are returned, as the other half follows from Hermitian symmetry.
+
+		Parameters
+		----------
+		x : array_like
+			The real array to Fourier transform.
+		axes : tuple of integers or None
+			The axes along which to compute the FFT. If this is None, the
+			FFT is computed along all axes.
+
+		Returns
+		-------
+		array_like
+			The non-negative frequency half of the Fourier transformed array.
+		'''
+		# This default implementation uses a complex FFT. Backends should override
+		# this with a real-to-complex transform when they have one.
+		x = np.asarray(x)
+
+		if axes is None:
+			axes = tuple(range(x.ndim))
+
+		axis = axes[-1] % x.ndim
+
+		half = [slice(None)] * x.ndim
+		half[axis] = slice(0, x.shape[axis] // 2 + 1)
+
+		return self.fftn(x, axes=axes)[tuple(half)]
+
+	def irfftn(self, x, s, axes=None):
+		'''Compute the multi-dimensional inverse FFT with a real result.
+
+		This is the inverse of `rfftn()`.
+
+		Parameters
+		----------
+		x : array_like
+			The non-negative frequency half of a Hermitian-symmetric array.
+		s : tuple of integers
+			The shape of the real output along the transformed axes.
+		axes : tuple of integers or None
+			The axes along which to compute the inverse FFT. If this is None,
+			the inverse FFT is computed along all axes.
+
+		Returns
+		-------
+		array_like
+			The real inverse Fourier transformed array.
+		'''
+		# This default implementation uses complex inverse FFTs. Backends should
+		# override this with a complex-to-real transform when they have one.
+		x = np.asarray(x)
+
+		if axes is None:
+			axes = tuple(range(x.ndim - len(s), x.ndim))
+		axes = tuple(axis % x.ndim for axis in axes)
+
+		# Transform all but the last axis first. The result is then Hermitian
+		# symmetric along the last axis on its own.
+		if all(x.shape[axis] == n for axis, n in zip(axes[:-1], s[:-1])):
+			if len(axes) > 1:
+				x = self.ifftn(x, axes=axes[:-1])
+		else:
+			for axis, n in zip(axes[:-1], s[:-1]):
+				x = self.ifft(x, n=n, axis=axis)
+
+		axis = axes[-1]
+		n = s[-1]
+		m = n // 2 + 1
+
+		if x.shape[axis] < m:
+			padding = [(0, 0)] * x.ndim
+			padding[axis] = (0, m - x.shape[axis])
+			x = np.pad(x, padding)
+
+		# Complete the last axis with the complex conjugate of the negative frequencies.
+		k = np.arange(n)
+		x = np.take(x, np.where(k < m, k, n - k), axis=axis)
+
+		negative = [None] * x.ndim
+		negative[axis] = slice(None)
+		x = np.where((k >= m)[tuple(negative)], np.conj(x), x)
+
+		return self.ifft(x, axis=axis).real
+
+class NumpyFFTBackend(FFTBackend):
+	'''An FFT backend using the Numpy FFT routines.
+
+	This backend is always available, but is single-threaded.
+	'''
+	def fft(self, x, n=None, axis=-1, overwrite_x=False):
+		return np.fft.fft(x, n=n, axis=axis)
+
+	def ifft(self, x, n=None, axis=-1, overwrite_x=False):
+		return np.fft.ifft(x, n=n, axis=axis)
+
+	def fftn(self, x, axes=None, overwrite_x=False):
+		return np.fft.fftn(x, axes=axes)
+
+	def ifftn(self, x, axes=None, overwrite_x=False):
+		return np.fft.ifftn(x, axes=axes)
+
+	def rfftn(self, x, axes=None):
+		return np.fft.rfftn(x, axes=axes)
+
+	def irfftn(self, x, s, axes=None):
+		return np.fft.irfftn(x, s=s, axes=axes)
+
+class ScipyFFTBackend(FFTBackend):
+	'''An FFT backend using the Scipy FFT routines.
+
+	This backend is always available and supports multithreading, which
+	is performed over the non-transformed axes as well as within the
+	transforms themselves.
+	'''
+	def fft(self, x, n=None, axis=-1, overwrite_x=False):
+		return scipy.fft.fft(x, n=n, axis=axis, overwrite_x=overwrite_x, workers=self.num_threads)
+
+	def ifft(self, x, n=None, axis=-1, overwrite_x=False):
+		return scipy.fft.ifft(x, n=n, axis=axis, overwrite_x=overwrite_x, workers=self.num_threads)
+
+	def fftn(self, x, axes=None, overwrite_x=False):
+		return scipy.fft.fftn(x, axes=axes, overwrite_x=overwrite_x, workers=self.num_threads)
+
+	def ifftn(self, x, axes=None, overwrite_x=False):
+		return scipy.fft.ifftn(x, axes=axes, overwrite_x=overwrite_x, workers=self.num_threads)
+
+	def rfftn(self, x, axes=None):
+		return scipy.fft.rfftn(x, axes=axes, workers=self.num_threads)
+
+	def irfftn(self, x, s, axes=None):
+		return scipy.fft.irfftn(x, s=s, axes=axes, workers=self.num_threads)
+
+def _get_fftw_wisdom_filename():
+	'''Get the filename of the on-disk FFTW wisdom.
+
+	Returns
+	-------
+	string or None
+		The filename, or None if on-disk FFTW wisdom is disabled in the configuration.
+	'''
+	if not Configuration().fourier.fft.pyfftw_use_disk_cache:
+		return None
+
+	cache_directory = os.path.expanduser(Configuration().cache.directory)
+
+	return os.path.join(cache_directory, 'fftw_wisdom.pickle')
+
+def _read_fftw_wisdom_file(filename):
+	try:
+		with open(filename, 'rb') as f:
+			return pickle.load(f)
+	except (OSError, EOFError, pickle.UnpicklingError):
+		# A missing or corrupted file is treated as empty wisdom.
+		return None
+
+def _write_fftw_wisdom_file(filename, wisdom):
+	directory = os.path.dirname(os.path.abspath(filename))
+	os.makedirs(directory, exist_ok=True)
+
+	# Write to a temporary file first and atomically move it into place, so that
+	# other processes never read a partially-written file.
+	fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			pickle.dump(wisdom, f)
+		os.replace(temp_filename, filename)
+	except Exception:
+		os.remove(temp_filename)
+		raise
+
+class PyFFTWBackend(FFTBackend):
+	'''An FFT backend using pyFFTW.
+
+	FFTW plans are created on first use for each combination of array shape,
+	data type and transformed axes. These plans are kept in the pyFFTW interface
+	cache and reused for subsequent transforms. The planner effort is read from
+	the configuration file.
+
+	If this is enabled in the configuration, the FFTW wisdom is stored on disk
+	in the cache directory. It is read when the backend is created, and written
+	each time a transform with a new shape, data type or axes is planned. Plans
+	in other processes and future runs are then created without measuring again.
+
+	Raises
+	------
+	ImportError
+		If pyFFTW is not installed.
+	'''
+	def __init__(self, num_threads=1):
+		super().__init__(num_threads)
+
+		import pyfftw
+		import pyfftw.interfaces.numpy_fft
+		import pyfftw.interfaces.cache
+
+		self._pyfftw = pyfftw
+		self._fft_module = pyfftw.interfaces.numpy_fft
+
+		pyfftw.interfaces.cache.enable()
+
+		self._wisdom_filename = _get_fftw_wisdom_filename()
+		self._planned_transforms = set()
+
+		if self._wisdom_filename is not None:
+			wisdom = _read_fftw_wisdom_file(self._wisdom_filename)
+
+			if wisdom is not None:
+				pyfftw.import_wisdom(wisdom)
+
+		self.planner_effort = Configuration().fourier.fft.pyfftw_planner_effort
+
+		if self.num_threads < 0:
+			import multiprocessing
+			self._threads = multiprocessing.cpu_count()
+		else:
+			self._threads = self.num_threads
+
+	def _kwargs(self, overwrite_x):
+		return {
+			'overwrite_input': overwrite_x,
+			'threads': self._threads,
+			'planner_effort': self.planner_effort
+		}
+
+	def _transform(self, function_name, x, overwrite_x, **kwargs):
+		y = getattr(self._fft_module, function_name)(x, **kwargs, **self._kwargs(overwrite_x))
+
+		if self._wisdom_filename is not None:
+			arguments = tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(kwargs.items()))
+			key = (function_name, np.shape(x), np.result_type(x), arguments)
+
+			if key not in self._planned_transforms:
+				self._planned_transforms.add(key)
+				self._save_wisdom()
+
+		return y
+
+	def _save_wisdom(self):
+		# Merge with wisdom that other processes might have written in the meantime.
+		wisdom = _read_fftw_wisdom_file(self._wisdom_filename)
+
+		if wisdom is not None:
+			self._pyfftw.import_wisdom(wisdom)
+
+		try:
+			_write_fftw_wisdom_file(self._wisdom_filename, self._pyfftw.export_wisdom())
+		except OSError:
+			# Failing to write the cache should never break a computation.
+			pass
+
+	def fft(self, x, n=None, axis=-1, overwrite_x=False):
+		return self._transform('fft', x, overwrite_x, n=n, axis=axis)
+
+	def ifft(self, x, n=None, axis=-1, overwrite_x=False):
+		return self._transform('ifft', x, overwrite_x, n=n, axis=axis)
+
+	def fftn(self, x, axes=None, overwrite_x=False):
+		return self._transform('fftn', x, overwrite_x, axes=axes)
+
+	def ifftn(self, x, axes=None, overwrite_x=False):
+		return self._transform('ifftn', x, overwrite_x, axes=axes)
+
+	def rfftn(self, x, axes=None):
+		return self._transform('rfftn', x, False, axes=axes)
+
+	def irfftn(self, x, s, axes=None):
+		return self._transform('irfftn', x, False, s=s, axes=axes)
+
+class MklFFTBackend(FFTBackend):
+	'''An FFT backend using the Intel MKL FFT routines.
+
+	.. note::
+		The number of threads is governed by MKL itself, for example through
+		the MKL_NUM_THREADS environment variable, and not by this backend.
+
+	Raises
+	------
+	ImportError
+		If mkl_fft is not installed.
+	'''
+	def __init__(self, num_threads=1):
+		super().__init__(num_threads)
+
+		import mkl_fft
+		import mkl_fft._numpy_fft
+
+		self._fft_module = mkl_fft
+		self._numpy_fft_module = mkl_fft._numpy_fft
+
+	def fft(self, x, n=None, axis=-1, overwrite_x=False):
+		return self._fft_module.fft(x, n=n, axis=axis, overwrite_x=overwrite_x)
+
+	def ifft(self, x, n=None, axis=-1, overwrite_x=False):
+		return self._fft_module.ifft(x, n=n, axis=axis, overwrite_x=overwrite_x)
+
+	def fftn(self, x, axes=None, overwrite_x=False):
+		return self._fft_module.fftn(x, axes=axes, overwrite_x=overwrite_x)
+
+	def ifftn(self, x, axes=None, overwrite_x=False):
+		return self._fft_module.ifftn(x, axes=axes, overwrite_x=overwrite_x)
+
+	def rfftn(self, x, axes=None):
+		return self._numpy_fft_module.rfftn(x, axes=axes)
+
+	def irfftn(self, x, s, axes=None):
+		return self._numpy_fft_module.irfftn(x, s=s, axes=axes)
+
+_fft_backend_classes = {
+	'numpy': NumpyFFTBackend,
+	'scipy': ScipyFFTBackend,
+	'pyfftw': PyFFTWBackend,
+	'mkl': MklFFTBackend,
+}
+
+# The order in which backends are tried when the backend is set to 'auto'.
+_auto_backend_order = ['mkl', 'scipy', 'numpy']
+
+_fft_backend_instances = {}
+
+def register_fft_backend(name, backend_class):
+	'''Register a new FFT backend.
+
+	After registration, the backend can be selected by setting the
+	`fourier.fft.backend` configuration value to `name`.
+
+	Parameters
+	----------
+	name : string
+		The name of the backend.
+	backend_class : class
+		A subclass of FFTBackend. It will be instantiated with the number of threads
+		as its only argument.
+	'''
+	_fft_backend_classes[name] = backend_class
+
+	# Remove stale instances of a previous backend with the same name.
+	for key in list(_fft_backend_instances.keys()):
+		if key[0] == name:
+			del _fft_backend_instances[key]
+
+def get_fft_backend(name=None, num_threads=None):
+	'''Get an FFT backend.
+
+	Backend objects are created once and reused for subsequent calls with the
+	same arguments.
+
+	Parameters
+	----------
+	name : string or None
+		The name of the backend. This can be 'numpy', 'scipy', 'pyfftw', 'mkl',
+		the name of a user-registered backend, or 'auto'. The latter selects the
+		first available backend out of mkl and scipy. If this is None, the choice
+		will be determined by the configuration file.
+	num_threads : integer or None
+		The number of threads to use in each FFT. A value of -1 uses all
+		available cores. If this is None, the choice will be determined by the
+		configuration file.
+
+	Returns
+	-------
+	FFTBackend
+		The requested FFT backend.
+
+	Raises
+	------
+	ValueError
+		If the backend is not known.
+	ImportError
+		If the backend is not available.
+	'''
+	if name is None or num_threads is None:
+		config = Configuration().fourier.fft
+
+		if name is None:
+			name = config.backend
+		if num_threads is None:
+			num_threads = config.num_threads
+
+	key = (name, num_threads)
+
+	try:
+		return _fft_backend_instances[key]
+	except KeyError:
+		pass
+
+	if name == 'auto':
+		for backend_name in _auto_backend_order:
+			try:
+				backend = _fft_backend_classes[backend_name](num_threads)
+				break
+			except ImportError:
+				continue
+	else:
+		if name not in _fft_backend_classes:
+			raise ValueError(f'FFT backend "{name}" is not known.')
+
+		backend = _fft_backend_classes[name](num_threads)
+
+	_fft_backend_instances[key] = backend
+
+	return backend
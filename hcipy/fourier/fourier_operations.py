@@ -1,15 +1,9 @@
 import numpy as np
 
 from .fast_fourier_transform import FastFourierTransform
+from .fft_backends import get_fft_backend
 from ..field import Field, field_dot, field_conjugate_transpose
 
-try:
-	import mkl_fft as _fft_module
-	_use_mkl = True
-except ImportError:
-	_fft_module = np.fft
-	_use_mkl = False
-
 class FourierFilter(object):
 	'''A filter in the Fourier domain.
 
@@ -116,12 +110,11 @@ class FourierFilter(object):
 			c = tuple([slice(None)] * field.tensor_order) + self.cutout
 			f[c] = field.shaped
 
+		fft_backend = get_fft_backend()
+
 		# Don't overwrite f if it's the input array.
-		if _use_mkl:
-			kwargs = {'overwrite_x': self.cutout is not None and field.grid.ndim > 1}
-		else:
-			kwargs = {}
-		f = _fft_module.fftn(f, axes=tuple(range(-self.input_grid.ndim, 0)), **kwargs)
+		overwrite_x = self.cutout is not None and field.grid.ndim > 1
+		f = fft_backend.fftn(f, axes=tuple(range(-self.input_grid.ndim, 0)), overwrite_x=overwrite_x)
 
 		if (self._transfer_function.ndim - self.internal_grid.ndim) == 2:
 			# The transfer function is a matrix field.
@@ -144,11 +137,7 @@ class FourierFilter(object):
 
 			f *= tf
 
-		if _use_mkl:
-			kwargs = {'overwrite_x': True}
-		else:
-			kwargs = {}
-		f = _fft_module.ifftn(f, axes=tuple(range(-self.input_grid.ndim, 0)), **kwargs)
+		f = fft_backend.ifftn(f, axes=tuple(range(-self.input_grid.ndim, 0)), overwrite_x=True)
 
 		s = f.shape[:-self.internal_grid.ndim] + (-1,)
 		if self.cutout is None:
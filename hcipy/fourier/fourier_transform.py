@@ -41,6 +41,23 @@ class FourierTransform(object):
 		'''
 		raise NotImplementedError()
 
+	def backward_real(self, field):
+		'''Returns the real part of the inverse Fourier transform of the :class:`Field` field.
+
+		Child classes can override this to exploit Hermitian symmetry.
+
+		Parameters
+		----------
+		field : Field
+			The field to inverse Fourier transform.
+
+		Returns
+		-------
+		Field
+			The real part of the inverse Fourier transform of the field.
+		'''
+		return self.backward(field).real
+
 	def get_transformation_matrix_forward(self):
 		'''Returns the transformation matrix corresonding to the
 		Fourier transform.
@@ -108,10 +125,72 @@ def _time_it(function, t_max=0.1, repeat_max=5):
 
 	return np.median(times)
 
-def make_fourier_transform(input_grid, output_grid=None, q=1, fov=1, shift=0, planner='estimate'):
+# The relative slowdown per floating point operation of the ZoomFFT and naive Fourier
+# transforms compared to the BLAS matrix multiplications used by the MFT. This was
+# measured on typical hardware and is only used for estimating relative performance.
+_fft_efficiency_penalty = 10
+
+def _estimate_fourier_transform_cost(method, input_grid, output_grid, q=1):
+	'''Estimate the computational cost of a Fourier transform from its complexity.
+
+	Parameters
+	----------
+	method : string
+		The name of the method. This can be 'fft', 'mft', 'zoomfft' or 'naive'.
+	input_grid : Grid
+		The input grid of the Fourier transform.
+	output_grid : Grid
+		The output grid of the Fourier transform.
+	q : scalar or ndarray
+		The amount of zeropadding. This is only used for the FFT.
+
+	Returns
+	-------
+	scalar
+		The estimated cost in arbitrary units.
+	'''
+	# Convert shapes to float to avoid potential overflows.
+	if method == 'fft':
+		# The FFT is only compared to the MFT, using the plain complexities of both.
+		N_in = np.prod(input_grid.shape.astype('float') * q)
+		return 4 * N_in * np.log2(N_in)
+	elif method == 'mft':
+		shape_in = input_grid.shape.astype('float')
+		shape_out = output_grid.shape.astype('float')
+
+		if input_grid.ndim == 1:
+			return 4 * shape_in[0] * shape_out[0]
+		else:
+			return 4 * (np.prod(shape_in) * shape_out[1] + np.prod(shape_out) * shape_in[0])
+	elif method == 'zoomfft':
+		# The ZoomFFT performs a Chirp Z-transform along each axis in turn. Each of those
+		# consists of two FFTs of a length given by Bluestein's algorithm.
+		from scipy.fft import next_fast_len
+
+		dims = np.array(input_grid.dims, dtype='float')
+		cost = 0
+
+		for i, (n, m) in enumerate(zip(input_grid.dims, output_grid.dims)):
+			nfft = next_fast_len(int(n + m - 1))
+			num_lines = np.prod(dims) / dims[i]
+
+			cost += num_lines * (8 * nfft * np.log2(nfft) + 6 * nfft)
+			dims[i] = m
+
+		return cost * _fft_efficiency_penalty
+	elif method == 'naive':
+		return 4 * float(input_grid.size) * float(output_grid.size) * _fft_efficiency_penalty
+	else:
+		raise ValueError(f'Fourier transform method "{method}" is not known.')
+
+def make_fourier_transform(input_grid, output_grid=None, q=1, fov=1, shift=0, planner='estimate', dtype='complex128'):
 	'''Construct a FourierTransform object.
 
 	The most time-efficient Fourier transform method will be chosen according to actual or estimated performance.
+	For native FFT output grids, the FastFourierTransform and, for one- and two-dimensional grids, the
+	MatrixFourierTransform are considered. For other output grids, the candidates are the MatrixFourierTransform
+	(only for separated one- and two-dimensional grids), the ZoomFastFourierTransform (only for regular grids) and
+	the NaiveFourierTransform.
 
 	Parameters
 	----------
@@ -128,16 +207,30 @@ def make_fourier_transform(input_grid, output_grid=None, q=1, fov=1, shift=0, pl
 	planner : string
 		If it is 'estimate', performance of the different methods will be estimated from theoretical complexity estimates.
 		If it is 'measure', actual Fourier transforms will be performed to get the actual performance. The latter takes longer,
-		but is more accurate.
+		but is more accurate. Only methods with an estimated performance close to the best estimate will be measured.
+		Decisions of the 'measure' planner are cached in memory, and optionally on disk, and reused for subsequent calls
+		with the same grids and dtype.
+	dtype : numpy dtype
+		The data type of the fields that will be transformed. This is only used by the 'measure' planner.
 
 	Returns
 	-------
 	FourierTransform
 		The Fourier transform that was requested.
+
+	Raises
+	------
+	ValueError
+		If the planner is not known.
 	'''
+	if planner not in ['estimate', 'measure']:
+		raise ValueError(f'Planner "{planner}" is not known.')
+
 	from .fast_fourier_transform import FastFourierTransform, make_fft_grid, get_fft_parameters
 	from .matrix_fourier_transform import MatrixFourierTransform
 	from .naive_fourier_transform import NaiveFourierTransform
+	from .zoom_fast_fourier_transform import ZoomFastFourierTransform
+	from .fourier_wisdom import _make_wisdom_key, _get_wisdom, _set_wisdom
 
 	if output_grid is not None:
 		# Try to detect if the grid is compatible with an FFT grid.
@@ -152,59 +245,65 @@ def make_fourier_transform(input_grid, output_grid=None, q=1, fov=1, shift=0, pl
 			pass
 
 	if output_grid is None:
-		# Choose between FFT and MFT
 		if not (input_grid.is_regular and input_grid.is_('cartesian')):
 			raise ValueError('For non-regular non-cartesian Grids, a Fourier transform is required to have an output_grid.')
 
-		if input_grid.ndim not in [1, 2]:
-			method = 'fft'
+		output_grid = make_fft_grid(input_grid, q, fov, shift)
+
+		# For native FFT grids, only choose between the FFT and MFT.
+		if input_grid.ndim in [1, 2]:
+			candidates = ['fft', 'mft']
 		else:
-			output_grid = make_fft_grid(input_grid, q, fov, shift)
-
-			if planner == 'estimate':
-				# Estimate analytically from complexities.
-				# Convert shapes to float to avoid potential overflows.
-				N_in = input_grid.shape.astype('float') * q
-				N_out = output_grid.shape.astype('float')
-
-				if input_grid.ndim == 1:
-					fft = 4 * N_in[0] * np.log2(N_in)
-					mft = 4 * input_grid.size * N_out[0]
-				else:
-					fft = 4 * np.prod(N_in) * np.log2(np.prod(N_in))
-					mft = 4 * (np.prod(input_grid.shape) * N_out[1] + np.prod(N_out) * input_grid.shape[0])
-
-				if fft > mft:
-					method = 'mft'
-				else:
-					method = 'fft'
-			elif planner == 'measure':
-				# Measure directly.
-				fft = FastFourierTransform(input_grid, q, fov)
-				mft = MatrixFourierTransform(input_grid, output_grid)
-
-				a = input_grid.zeros(dtype='complex')
-				fft_time = _time_it(lambda: fft.forward(a))
-				mft_time = _time_it(lambda: mft.forward(a))
-
-				if fft_time > mft_time:
-					method = 'mft'
-				else:
-					method = 'fft'
+			candidates = ['fft']
 	else:
-		# Choose between MFT and Naive
-		if input_grid.is_separated and input_grid.is_('cartesian') and output_grid.is_separated and output_grid.is_('cartesian') and input_grid.ndim in [1, 2]:
-			method = 'mft'
-		else:
-			method = 'naive'
+		candidates = []
+		both_cartesian = input_grid.is_('cartesian') and output_grid.is_('cartesian')
 
-	# Make the Fourier transform
-	if method == 'fft':
-		return FastFourierTransform(input_grid, q, fov, shift)
-	elif method == 'mft':
-		return MatrixFourierTransform(input_grid, output_grid)
-	elif method == 'naive':
-		return NaiveFourierTransform(input_grid, output_grid)
+		if both_cartesian and input_grid.is_separated and output_grid.is_separated and input_grid.ndim in [1, 2]:
+			candidates.append('mft')
+
+		if both_cartesian and input_grid.is_regular and output_grid.is_regular:
+			candidates.append('zoomfft')
+
+		candidates.append('naive')
+
+	def make(method):
+		if method == 'fft':
+			return FastFourierTransform(input_grid, q, fov, shift)
+		elif method == 'mft':
+			return MatrixFourierTransform(input_grid, output_grid)
+		elif method == 'zoomfft':
+			return ZoomFastFourierTransform(input_grid, output_grid)
+		elif method == 'naive':
+			return NaiveFourierTransform(input_grid, output_grid)
+
+	# Estimate analytically from complexities.
+	costs = np.array([_estimate_fourier_transform_cost(c, input_grid, output_grid, q) for c in candidates])
+	method = candidates[np.argmin(costs)]
+
+	if planner == 'estimate' or len(candidates) == 1:
+		return make(method)
+
+	# Try to reuse a previous measurement.
+	wisdom_key = _make_wisdom_key(input_grid, output_grid, np.dtype(dtype))
+	method = _get_wisdom(wisdom_key)
+
+	if method is None:
+		# Measure directly, but only for methods that have a reasonable chance of being the fastest.
+		candidates = [c for c, cost in zip(candidates, costs) if cost < 10 * np.min(costs)]
+
+		a = input_grid.zeros(dtype=dtype)
+		times = []
+
+		for candidate in candidates:
+			ft = make(candidate)
+			times.append(_time_it(lambda: ft.forward(a)))
+
+		method = candidates[np.argmin(times)]
+
+		_set_wisdom(wisdom_key, method)
+
+	return make(method)
 
 def multiplex_for_tensor_fields(func):
 	'''A decorator for automatically multiplexing a function over the tensor directions.
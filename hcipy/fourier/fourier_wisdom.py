@@ -0,0 +1,166 @@
+import os
+import json
+import tempfile
+
+from ..config import Configuration
+from .fft_backends import get_fft_backend
+
+_wisdom = {}
+_disk_wisdom_loaded = False
+
+def _get_wisdom_filename():
+	'''Get the filename of the on-disk Fourier wisdom.
+
+	Returns
+	-------
+	string or None
+		The filename, or None if on-disk wisdom is disabled in the configuration.
+	'''
+	if not Configuration().fourier.planner.use_disk_cache:
+		return None
+
+	cache_directory = os.path.expanduser(Configuration().cache.directory)
+
+	return os.path.join(cache_directory, 'fourier_wisdom.json')
+
+def _read_wisdom_file(filename):
+	try:
+		with open(filename, 'r') as f:
+			return json.load(f)
+	except (FileNotFoundError, ValueError):
+		# A missing or corrupted file is treated as empty wisdom.
+		return {}
+
+def _write_wisdom_file(filename, wisdom):
+	directory = os.path.dirname(os.path.abspath(filename))
+	os.makedirs(directory, exist_ok=True)
+
+	# Write to a temporary file first and atomically move it into place, so that
+	# other processes never read a partially-written file.
+	fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'w') as f:
+			json.dump(wisdom, f)
+		os.replace(temp_filename, filename)
+	except Exception:
+		os.remove(temp_filename)
+		raise
+
+def _make_wisdom_key(input_grid, output_grid, dtype):
+	'''Make the key under which the planner decision is stored.
+
+	The key includes the FFT backend and number of threads, as these
+	influence the measured performance. The backend is the one that is
+	actually used, so that an 'auto' backend that resolves to a different
+	backend, for example after installing mkl_fft, does not reuse old decisions.
+
+	Parameters
+	----------
+	input_grid : Grid
+		The input grid of the Fourier transform.
+	output_grid : Grid
+		The output grid of the Fourier transform.
+	dtype : numpy dtype
+		The data type of the fields that will be transformed.
+
+	Returns
+	-------
+	string
+		The key.
+	'''
+	backend = get_fft_backend()
+
+	num_threads = backend.num_threads
+	if num_threads < 0:
+		num_threads = os.cpu_count()
+
+	return f'{hash(input_grid):x}-{hash(output_grid):x}-{dtype}-{type(backend).__name__}-{num_threads}'
+
+def _get_wisdom(key):
+	'''Get the planner decision for a key.
+
+	Parameters
+	----------
+	key : string
+		The key of the planner decision.
+
+	Returns
+	-------
+	string or None
+		The name of the chosen method, or None if no decision was stored.
+	'''
+	global _disk_wisdom_loaded
+
+	if key in _wisdom:
+		return _wisdom[key]
+
+	filename = _get_wisdom_filename()
+
+	if filename is not None and not _disk_wisdom_loaded:
+		_wisdom.update(_read_wisdom_file(filename))
+		_disk_wisdom_loaded = True
+
+	return _wisdom.get(key)
+
+def _set_wisdom(key, method):
+	'''Store a planner decision.
+
+	The decision is always stored in memory, and additionally on disk
+	if this is enabled in the configuration.
+
+	Parameters
+	----------
+	key : string
+		The key of the planner decision.
+	method : string
+		The name of the chosen method.
+	'''
+	_wisdom[key] = method
+
+	filename = _get_wisdom_filename()
+
+	if filename is not None:
+		# Merge with decisions that other processes might have written in the meantime.
+		wisdom = _read_wisdom_file(filename)
+		wisdom[key] = method
+
+		try:
+			_write_wisdom_file(filename, wisdom)
+		except OSError:
+			# Failing to write the cache should never break a computation.
+			pass
+
+def export_fourier_wisdom(filename):
+	'''Export all planner decisions currently held in memory to a file.
+
+	Parameters
+	----------
+	filename : string
+		The filename to write the wisdom to.
+	'''
+	_write_wisdom_file(filename, _wisdom)
+
+def import_fourier_wisdom(filename):
+	'''Import planner decisions from a file.
+
+	The decisions in the file are added to those that are already in memory,
+	overwriting any existing decisions with the same keys.
+
+	Parameters
+	----------
+	filename : string
+		The filename to read the wisdom from.
+	'''
+	with open(filename, 'r') as f:
+		_wisdom.update(json.load(f))
+
+def forget_fourier_wisdom():
+	'''Forget all planner decisions held in memory.
+
+	The on-disk wisdom, if enabled, is not removed. It will be read again on
+	the next use of the 'measure' planner.
+	'''
+	global _disk_wisdom_loaded
+
+	_wisdom.clear()
+	_disk_wisdom_loaded = False
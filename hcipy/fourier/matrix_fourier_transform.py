@@ -1,9 +1,123 @@
 import numpy as np
 from scipy.linalg import blas
-from .fourier_transform import FourierTransform, multiplex_for_tensor_fields, _get_float_and_complex_dtype
+from .fourier_transform import FourierTransform, _get_float_and_complex_dtype
 from ..field import Field
 from ..config import Configuration
+from ..cache import LRUCache
 import numexpr as ne
+import xxhash
+
+_dft_matrix_cache = None
+
+def get_mft_matrix_cache():
+	'''Get the cache for the DFT matrices used by all MatrixFourierTransforms.
+
+	This cache is shared by all MatrixFourierTransform objects in this process, so
+	that transforms with identical separated coordinates share their matrices. The
+	cache is bounded in size by the `fourier.mft.matrix_cache_size` configuration
+	value. Its hit, miss and eviction counters are available as attributes on the
+	cache object.
+
+	Returns
+	-------
+	LRUCache
+		The DFT matrix cache.
+	'''
+	global _dft_matrix_cache
+
+	if _dft_matrix_cache is None:
+		max_bytes = int(Configuration().fourier.mft.matrix_cache_size * 2**20)
+		_dft_matrix_cache = LRUCache(max_bytes=max_bytes)
+
+	return _dft_matrix_cache
+
+def _get_dft_matrix(a, b, complex_dtype, store_in_cache=True):
+	'''Get the one-dimensional DFT matrix exp(-1j * outer(a, b)).
+
+	The matrix is taken from the DFT matrix cache if possible. Matrices
+	are returned as read-only arrays, as they can be shared.
+
+	Parameters
+	----------
+	a : array_like
+		The coordinates along the rows of the matrix.
+	b : array_like
+		The coordinates along the columns of the matrix.
+	complex_dtype : numpy dtype
+		The data type of the matrix.
+	store_in_cache : boolean
+		Whether to add a newly-computed matrix to the DFT matrix cache.
+
+	Returns
+	-------
+	array_like
+		The DFT matrix.
+	'''
+	a = np.ascontiguousarray(a, dtype='float64')
+	b = np.ascontiguousarray(b, dtype='float64')
+
+	key = (xxhash.xxh64(a).intdigest(), a.size, xxhash.xxh64(b).intdigest(), b.size, np.dtype(complex_dtype).name)
+
+	cache = get_mft_matrix_cache()
+	M = cache.get(key)
+
+	if M is None:
+		ab = np.outer(a, b)
+		M = ne.evaluate('exp(-1j * ab)', local_dict={'ab': ab}).astype(complex_dtype, copy=False)
+		M.flags.writeable = False
+
+		if store_in_cache:
+			cache[key] = M
+
+	return M
+
+def _get_scaled_dft_matrices(a, scales, b, complex_dtype):
+	'''Get a stack of one-dimensional DFT matrices exp(-1j * scale * outer(a, b)).
+
+	This is used for computing the Fourier transforms of several fields, each with
+	its own scaling of the output coordinates, in a single stacked matrix product.
+	The stack is taken from the DFT matrix cache if possible. Matrices are returned
+	as read-only arrays, as they can be shared.
+
+	Parameters
+	----------
+	a : array_like
+		The coordinates along the rows of the matrices.
+	scales : array_like
+		The scale factor applied to `a` for each matrix in the stack.
+	b : array_like
+		The coordinates along the columns of the matrices.
+	complex_dtype : numpy dtype
+		The data type of the matrices.
+
+	Returns
+	-------
+	array_like
+		The stack of DFT matrices with shape (len(scales), len(a), len(b)).
+	'''
+	a = np.ascontiguousarray(a, dtype='float64')
+	b = np.ascontiguousarray(b, dtype='float64')
+	scales = np.ascontiguousarray(scales, dtype='float64')
+
+	key = (
+		'scaled',
+		xxhash.xxh64(a).intdigest(), a.size,
+		xxhash.xxh64(scales).intdigest(), scales.size,
+		xxhash.xxh64(b).intdigest(), b.size,
+		np.dtype(complex_dtype).name
+	)
+
+	cache = get_mft_matrix_cache()
+	M = cache.get(key)
+
+	if M is None:
+		ab = scales[:, np.newaxis, np.newaxis] * np.outer(a, b)
+		M = ne.evaluate('exp(-1j * ab)', local_dict={'ab': ab}).astype(complex_dtype, copy=False)
+		M.flags.writeable = False
+
+		cache[key] = M
+
+	return M
 
 class MatrixFourierTransform(FourierTransform):
 	'''A Matrix Fourier Transform (MFT) object.
@@ -24,9 +138,12 @@ class MatrixFourierTransform(FourierTransform):
 		The grid that is produced by the Fourier transform.
 	precompute_matrices : boolean or None
 		Whether to precompute the matrices used in the MFT. Turning this on will provide a 20-30%
-		speedup, in exchange for higher memory usage.If this is False, the matrices will be
-		calculated each time a Fourier transform is performed. If this is True, the matrices will be
-		calculated once, and reused for future evaluations. If this is None, the choice will be
+		speedup, in exchange for higher memory usage. If this is False, the matrices will be
+		retrieved from the shared DFT matrix cache, or calculated if they are not cached, each time
+		a Fourier transform is performed. Matrices calculated in this way are not added to the cache,
+		so that they do not take up memory after the Fourier transform. If this is True, the matrices
+		will be retrieved from the cache or calculated once, and kept by this object and the cache
+		for future evaluations. If this is None, the choice will be
 		determined by the configuration file.
 	allocate_intermediate : boolean or None
 		Whether to reserve memory for the intermediate result for the MFT. This provides a 5-10%
@@ -97,26 +214,30 @@ class MatrixFourierTransform(FourierTransform):
 				self.weights_output = self.weights_output[0]
 
 			if self.ndim == 1:
-				xu = np.outer(self.output_grid.x, self.input_grid.x)
-				self.M = ne.evaluate('exp(-1j * xu)', local_dict={'xu': xu}).astype(complex_dtype, copy=False)
+				self.M = _get_dft_matrix(self.output_grid.x, self.input_grid.x, complex_dtype, self.precompute_matrices)
 			elif self.ndim == 2:
 				x, y = self.input_grid.coords.separated_coords
 				u, v = self.output_grid.coords.separated_coords
 
-				vy = np.outer(v, y)
-				xu = np.outer(x, u)
-
-				self.M1 = ne.evaluate('exp(-1j * vy)', local_dict={'vy': vy}).astype(complex_dtype, copy=False)
-				self.M2 = ne.evaluate('exp(-1j * xu)', local_dict={'xu': xu}).astype(complex_dtype, copy=False)
+				self.M1 = _get_dft_matrix(v, y, complex_dtype, self.precompute_matrices)
+				self.M2 = _get_dft_matrix(x, u, complex_dtype, self.precompute_matrices)
 
 			self.matrices_dtype = complex_dtype
 
-		# Checki if the intermediate array needs to be (re)allocated.
-		if self.intermediate_dtype != complex_dtype:
-			if self.ndim == 2:
-				self.intermediate_array = np.empty((self.input_grid.shape[0], self.M2.shape[1]), dtype=complex_dtype)
+	def _compute_intermediate_array(self, num_fields):
+		'''Allocate the intermediate array for the MFT if necessary.
 
-				self.intermediate_dtype = complex_dtype
+		Parameters
+		----------
+		num_fields : integer
+			The number of scalar fields that are transformed at the same time.
+		'''
+		if self.ndim == 2:
+			shape = (num_fields * self.shape_input[0], self.shape_output[1])
+
+			if self.intermediate_dtype != self.matrices_dtype or self.intermediate_array.shape != shape:
+				self.intermediate_array = np.empty(shape, dtype=self.matrices_dtype)
+				self.intermediate_dtype = self.matrices_dtype
 
 	def _remove_matrices(self):
 		'''Remove the matrices after a Fourier transform.
@@ -137,10 +258,12 @@ class MatrixFourierTransform(FourierTransform):
 				self.intermediate_array = None
 				self.intermediate_dtype = None
 
-	@multiplex_for_tensor_fields
 	def forward(self, field):
 		'''Returns the forward Fourier transform of the :class:`Field` field.
 
+		Tensor fields are transformed in a batched fashion, where each of the
+		matrix multiplications is done for all tensor elements at once.
+
 		Parameters
 		----------
 		field : Field
@@ -154,9 +277,12 @@ class MatrixFourierTransform(FourierTransform):
 		self._compute_matrices(field.dtype)
 		field = field.astype(self.matrices_dtype, copy=False)
 
+		tensor_shape = field.shape[:-1]
+		num_fields = int(np.prod(tensor_shape))
+
 		if self.ndim == 1:
-			f = field * self.weights_input
-			res = np.dot(self.M, f)
+			f = (field * self.weights_input).reshape((num_fields, -1))
+			res = np.dot(f, self.M.T)
 		elif self.ndim == 2:
 			# Use handcoded BLAS call. BLAS is better when all inputs are Fortran ordered,
 			# so we apply matrix multiplications on the transpose of each of the arrays
@@ -166,27 +292,35 @@ class MatrixFourierTransform(FourierTransform):
 			else:
 				gemm = blas.zgemm
 
+			self._compute_intermediate_array(num_fields)
+
 			if np.isscalar(self.weights_input):
 				# Weights can be included in the gemm call as that multiplication
 				# happens anyway (and it saves an array copy).
-				f = field.reshape(self.shape_input)
+				f = field.reshape((-1, self.shape_input[1]))
 				alpha = self.weights_input
 			else:
 				# Fallback in case the weights is not a scalar.
-				f = (field * self.weights_input).reshape(self.shape_input)
+				f = (field * self.weights_input).reshape((-1, self.shape_input[1]))
 				alpha = 1
 
-			gemm(1, self.M2.T, f.T, c=self.intermediate_array.T, overwrite_c=True)
-			res = gemm(alpha, self.intermediate_array.T, self.M1.T).T.reshape(-1)
+			# The first multiplication is done for all tensor elements in a single call.
+			gemm(alpha, self.M2.T, f.T, c=self.intermediate_array.T, overwrite_c=True)
+
+			# The second multiplication is done for all tensor elements in a single stacked product.
+			intermediate = self.intermediate_array.reshape((num_fields, self.shape_input[0], -1))
+			res = np.matmul(self.M1, intermediate)
 
 		self._remove_matrices()
 
-		return Field(res, self.output_grid)
+		return Field(res.reshape(tensor_shape + (-1,)), self.output_grid)
 
-	@multiplex_for_tensor_fields
 	def backward(self, field):
 		'''Returns the inverse Fourier transform of the :class:`Field` field.
 
+		Tensor fields are transformed in a batched fashion, where each of the
+		matrix multiplications is done for all tensor elements at once.
+
 		Parameters
 		----------
 		field : Field
@@ -200,9 +334,12 @@ class MatrixFourierTransform(FourierTransform):
 		self._compute_matrices(field.dtype)
 		field = field.astype(self.matrices_dtype, copy=False)
 
+		tensor_shape = field.shape[:-1]
+		num_fields = int(np.prod(tensor_shape))
+
 		if self.ndim == 1:
-			f = field * self.weights_output
-			res = np.dot(self.M.conj().T, f)
+			f = (field * self.weights_output).reshape((num_fields, -1))
+			res = np.dot(f, self.M.conj())
 		elif self.ndim == 2:
 			# Use handcoded BLAS call. BLAS is better when all inputs are Fortran ordered,
 			# so we apply matrix multiplications on the transpose of each of the arrays
@@ -213,20 +350,26 @@ class MatrixFourierTransform(FourierTransform):
 			else:
 				gemm = blas.zgemm
 
+			self._compute_intermediate_array(num_fields)
+
 			if np.isscalar(self.weights_output):
 				# Weights can be included in the gemm call as that multiplication
 				# happens anyway (and it saves an array copy).
-				f = field.reshape(self.shape_output)
+				f = field.reshape((num_fields,) + tuple(self.shape_output))
 				alpha = self.weights_output
 			else:
 				# Fallback in case the weights is not a scalar.
-				f = (field * self.weights_output).reshape(self.shape_output)
+				f = (field * self.weights_output).reshape((num_fields,) + tuple(self.shape_output))
 				alpha = 1
 
-			# Use trans_a=2 and trans_b=2 to apply the conjugte transpose on the a and b arrays.
-			gemm(1, f.T, self.M1.T, trans_b=2, c=self.intermediate_array.T, overwrite_c=True)
-			res = gemm(alpha, self.M2.T, self.intermediate_array.T, trans_a=2).T.reshape(-1)
+			# The first multiplication is done for all tensor elements in a single stacked product.
+			intermediate = self.intermediate_array.reshape((num_fields, self.shape_input[0], -1))
+			np.matmul(self.M1.conj().T, f, out=intermediate)
+
+			# The second multiplication is done for all tensor elements in a single call.
+			# Use trans_a=2 to apply the conjugate transpose on the a array.
+			res = gemm(alpha, self.M2.T, self.intermediate_array.T, trans_a=2).T
 
 		self._remove_matrices()
 
-		return Field(res, self.input_grid)
+		return Field(res.reshape(tensor_shape + (-1,)), self.input_grid)
@@ -38,7 +38,10 @@ __all__ = [
     'make_agnostic_forward',
     'make_agnostic_backward',
     'make_agnostic_optical_element',
+    'get_instance_data_cache',
     'OpticalSystem',
+    'FusedOpticalElement',
+    'PointwiseTransmission',
     'PeriodicOpticalElement',
     'jones_to_mueller',
     'JonesMatrixOpticalElement',
@@ -7,7 +7,7 @@ from ..propagation import FresnelPropagator
 from ..aperture import make_circular_aperture
 from .optical_element import OpticalElement
 
-def make_power_law_error(pupil_grid, ptv, diameter, exponent=-2.5, aperture=None, remove_modes=None):
+def make_power_law_error(pupil_grid, ptv, diameter, exponent=-2.5, aperture=None, remove_modes=None, num_realizations=None, seed=None):
     '''Create an error surface from a power-law power spectral density.
 
     Parameters
@@ -27,11 +27,19 @@ def make_power_law_error(pupil_grid, ptv, diameter, exponent=-2.5, aperture=None
         The modes which to remove from the surface aberration. The peak-to-valley
         is enforced before these modes are removed. This allows for correctting surface
         errors with optic alignment.
+    num_realizations : integer or None
+        The number of independent surface errors to make. If this is None, a single
+        surface error is returned. Otherwise, the surface errors are generated in a
+        batch, which yields two surface errors per inverse Fourier transform.
+    seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+        A seed to initialize the spectral noise. If None, then fresh, unpredictable
+        entry will be pulled from the OS. Default: None.
 
     Returns
     -------
     Field
-        The surface error calculated on `pupil_grid`.
+        The surface error calculated on `pupil_grid`. If `num_realizations` is given,
+        this contains all surface errors, with the realization as its first axis.
     '''
     def psd(grid):
         res = Field(grid.as_('polar').r**exponent, grid)
@@ -41,15 +49,27 @@ def make_power_law_error(pupil_grid, ptv, diameter, exponent=-2.5, aperture=None
     if aperture is None:
         aperture = make_circular_aperture(diameter)(pupil_grid)
 
-    screen = SpectralNoiseFactoryFFT(psd, pupil_grid).make_random()()
-    screen *= ptv / np.ptp(screen[aperture != 0])
+    factory = SpectralNoiseFactoryFFT(psd, pupil_grid)
+
+    if num_realizations is None:
+        screens = factory.make_random(seed)()[np.newaxis, :]
+    else:
+        screens = factory.make_random_batch(num_realizations, seed, use_imaginary_part=True)
+
+    screens = np.array(screens)
+    screens *= ptv / np.ptp(screens[:, aperture != 0], axis=-1)[:, np.newaxis]
 
     if remove_modes is not None:
         trans = remove_modes.transformation_matrix
         trans_inv = inverse_tikhonov(trans, 1e-6)
-        screen -= trans.dot(trans_inv.dot(screen))
+        screens -= trans.dot(trans_inv.dot(screens.T)).T
+
+    screens *= aperture
 
-    return Field(screen * aperture, pupil_grid)
+    if num_realizations is None:
+        return Field(screens[0], pupil_grid)
+    else:
+        return Field(screens, pupil_grid)
 
 class SurfaceAberration(SurfaceApodizer):
     '''A surface aberration with a specific power law.
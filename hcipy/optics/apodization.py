@@ -1,5 +1,5 @@
 import numpy as np
-from .optical_element import OpticalElement, AgnosticOpticalElement, make_agnostic_forward, make_agnostic_backward
+from .optical_element import OpticalElement, AgnosticOpticalElement, PointwiseTransmission, make_agnostic_forward, make_agnostic_backward
 
 class Apodizer(AgnosticOpticalElement):
     '''A thin apodizer.
@@ -49,6 +49,19 @@ class Apodizer(AgnosticOpticalElement):
 
         return wf
 
+    def _get_pointwise_transmission(self, wavefront, backward=False):
+        # Derived classes that change the propagation are not pointwise in general.
+        if type(self).forward is not Apodizer.forward or type(self).backward is not Apodizer.backward:
+            return None
+
+        # The instance data is replaced when the apodization changes, so it identifies the apodization.
+        if backward:
+            instance_data = self.get_instance_data(None, wavefront.grid, wavefront.wavelength)
+            return PointwiseTransmission(lambda: np.conj(instance_data.apodization), instance_data)
+        else:
+            instance_data = self.get_instance_data(wavefront.grid, None, wavefront.wavelength)
+            return PointwiseTransmission(lambda: instance_data.apodization, instance_data)
+
 class PhaseApodizer(Apodizer):
     '''A phase-only thin apodizer.
 
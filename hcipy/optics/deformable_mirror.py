@@ -7,7 +7,7 @@ try:
 except ImportError:
     from importlib_resources import files
 
-from .optical_element import OpticalElement
+from .optical_element import OpticalElement, PointwiseTransmission
 from ..field import make_uniform_grid, evaluate_supersampled
 from ..mode_basis import ModeBasis, make_gaussian_pokes
 from ..interpolation import make_linear_interpolator_separated
@@ -240,6 +240,15 @@ class DeformableMirror(OpticalElement):
 
         return wf
 
+    def _get_pointwise_transmission(self, wavefront, backward=False):
+        # Derived classes that change the propagation are not pointwise in general.
+        if type(self).forward is not DeformableMirror.forward or type(self).backward is not DeformableMirror.backward:
+            return None
+
+        sign = -1 if backward else 1
+
+        return PointwiseTransmission(exponent_factor=sign * 2j * wavefront.wavenumber, exponent=self.surface)
+
     @property
     def influence_functions(self):
         '''The influence function for each of the actuators of this deformable mirror.
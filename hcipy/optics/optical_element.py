@@ -1,7 +1,22 @@
 import numpy as np
+import numexpr as ne
 import inspect
 import collections
 import itertools
+import weakref
+import math
+import os
+import concurrent.futures
+import shutil
+import tempfile
+import threading
+import contextlib
+import xxhash
+
+from ..cache import LRUCache, get_nbytes
+from ..config import Configuration
+from ..field import Grid
+from .wavefront import Wavefront
 
 class OpticalElement(object):
     '''Base class for all optical elements.
@@ -150,6 +165,56 @@ class OpticalElement(object):
         '''
         return self
 
+    def _get_pointwise_transmission(self, wavefront, backward=False):
+        '''Get the transmission of this optical element, if it acts pointwise on the electric field.
+
+        Optical elements that only multiply the electric field pointwise, without changing
+        its grid, can implement this function. This allows consecutive pointwise optical
+        elements to be fused into a single operation by :meth:`OpticalSystem.compile()`.
+
+        Parameters
+        ----------
+        wavefront : Wavefront
+            The wavefront that will be propagated.
+        backward : boolean
+            Whether the transmission for a backward propagation should be returned.
+
+        Returns
+        -------
+        PointwiseTransmission or None
+            The transmission for this wavefront, or None if this optical element cannot
+            propagate this wavefront by a pointwise multiplication.
+        '''
+        return None
+
+class PointwiseTransmission(object):
+    '''The transmission of an optical element that acts pointwise on the electric field.
+
+    The electric field is multiplied by `static * exp(exponent_factor * exponent)`. Both
+    parts are optional. The static part is assumed to stay the same for as long as the
+    same `static_key` object is given, so that it can be combined with that of other
+    optical elements ahead of time.
+
+    Parameters
+    ----------
+    static : function or None
+        A function without arguments returning the static part of the transmission.
+        This is only called when `static_key` changes.
+    static_key : object or None
+        An object identifying the static part of the transmission, such as the instance
+        data of an AgnosticOpticalElement. If this is None, `static` is evaluated for
+        each propagation.
+    exponent_factor : scalar
+        The factor with which to multiply the exponent.
+    exponent : Field or None
+        The exponent, such as a phase screen or a surface, for each point.
+    '''
+    def __init__(self, static=None, static_key=None, exponent_factor=1, exponent=None):
+        self.static = static
+        self.static_key = static_key
+        self.exponent_factor = exponent_factor
+        self.exponent = exponent
+
 class EmptyOpticalElement(OpticalElement):
     '''An empty optical element.
 
@@ -234,6 +299,426 @@ class InstanceData(object):
         self.output_grid = output_grid
         self.wavelength = wavelength
 
+def _get_instance_data_nbytes(instance_data):
+    '''Get the number of bytes held by an InstanceData object.
+
+    The input and output grids are not counted, as these are owned by the wavefronts.
+
+    Parameters
+    ----------
+    instance_data : InstanceData
+        The instance data.
+
+    Returns
+    -------
+    integer
+        The number of bytes held by the arrays of the instance data.
+    '''
+    return get_nbytes([val for key, val in vars(instance_data).items() if key not in ['input_grid', 'output_grid']])
+
+_instance_data_cache = None
+
+# Guards the bookkeeping of all instance caches. A single lock is used, since evicting
+# instance data from the global cache calls into the cache of another optical element.
+_instance_data_lock = threading.RLock()
+
+def get_instance_data_cache():
+    '''Get the global cache that bounds the instance data of all agnostic optical elements.
+
+    Each entry in this cache corresponds to an InstanceData object held by one of the
+    agnostic optical elements. The cache is bounded in size by the
+    `optics.instance_cache.max_total_size` configuration value. When it is exceeded, the
+    least recently used instance data is evicted from the optical element that holds it.
+    Its statistics therefore describe the use of instance data over all optical elements.
+
+    Returns
+    -------
+    LRUCache
+        The global instance data cache.
+    '''
+    global _instance_data_cache
+
+    with _instance_data_lock:
+        if _instance_data_cache is None:
+            max_total_size = Configuration().optics.instance_cache.max_total_size
+            max_bytes = None if max_total_size is None else int(max_total_size * 2**20)
+
+            _instance_data_cache = LRUCache(max_bytes=max_bytes, size_function=lambda entry: entry[1], eviction_callback=_evict_instance_data)
+
+    return _instance_data_cache
+
+def _evict_instance_data(key, entry):
+    owner = entry[0]()
+
+    if owner is not None:
+        owner._discard(key[1])
+
+def _release_instance_data(global_keys):
+    # Called when an instance cache is garbage collected.
+    if _instance_data_cache is not None:
+        for key in list(global_keys):
+            _instance_data_cache.pop(key)
+
+class _InstanceDataCache(object):
+    '''The cache for the instance data of a single agnostic optical element.
+
+    Each InstanceData object can be found under several cache keys. It is stored only
+    once under its first key, which is used for eviction. Its size is accounted for
+    in the global instance data cache as well.
+
+    All methods are thread safe, so that instances can be created concurrently.
+
+    Parameters
+    ----------
+    max_entries : integer or None
+        The maximum number of instances. If this is None, the number of instances is not bounded.
+    max_bytes : integer or None
+        The maximum number of bytes. If this is None, the number of bytes is not bounded.
+    '''
+    _ids = itertools.count()
+
+    def __init__(self, max_entries, max_bytes):
+        self._id = next(_InstanceDataCache._ids)
+        # Use a weak reference to avoid a reference cycle, so that the cache is released as soon as possible.
+        ref = weakref.ref(self)
+
+        def on_evict(primary_key, entry):
+            cache = ref()
+
+            if cache is not None:
+                cache._on_evict(primary_key, entry)
+
+        self._entries = LRUCache(max_entries, max_bytes, size_function=lambda entry: entry[2], eviction_callback=on_evict)
+        self._aliases = {}
+        self._global_keys = set()
+        self._creation_locks = {}
+
+        # Instance data that was not yet measured after its first propagation.
+        self._unmeasured = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # The most recently used instance data for forward and backward lookups, to avoid
+        # computing cache keys for repeated propagations with the same grid and wavelength.
+        self.last_used = [None, None]
+
+        weakref.finalize(self, _release_instance_data, self._global_keys)
+
+    def lookup(self, cache_keys):
+        '''Find the instance data for any of the cache keys and mark it as most recently used.
+
+        Parameters
+        ----------
+        cache_keys : list
+            The cache keys to look for.
+
+        Returns
+        -------
+        primary_key : tuple or None
+            The key under which the instance data is stored, or None if it was not found.
+        instance_data : InstanceData or None
+            The instance data, or None if it was not found.
+        '''
+        with _instance_data_lock:
+            for cache_key in cache_keys:
+                primary_key = self._aliases.get(cache_key)
+
+                if primary_key is not None:
+                    entry = self._entries.get(primary_key)
+
+                    if entry is not None:
+                        get_instance_data_cache().get((self._id, primary_key))
+
+                        return primary_key, entry[0]
+
+        return None, None
+
+    def touch(self, primary_key):
+        '''Mark instance data as most recently used.
+
+        Parameters
+        ----------
+        primary_key : tuple
+            The key under which the instance data is stored.
+        '''
+        with _instance_data_lock:
+            self._entries.get(primary_key)
+            get_instance_data_cache().get((self._id, primary_key))
+
+    def remember(self, slot, input_grid, output_grid, wavelength, grid_hashes, primary_key, instance_data):
+        '''Remember the instance data that was used for a lookup.
+
+        Parameters
+        ----------
+        slot : integer
+            The slot in which to store the lookup; 0 for forward and 1 for backward lookups.
+        input_grid : Grid or None
+            The input grid of the lookup.
+        output_grid : Grid or None
+            The output grid of the lookup.
+        wavelength : scalar or None
+            The wavelength of the lookup.
+        grid_hashes : tuple
+            The hashes of the input and output grid at the time of the lookup.
+        primary_key : tuple
+            The key under which the instance data is stored.
+        instance_data : InstanceData
+            The instance data that was found or created.
+        '''
+        with _instance_data_lock:
+            # Instance data that was too large for the cache should be created anew on each lookup.
+            if primary_key in self._entries:
+                self.last_used[slot] = (input_grid, output_grid, wavelength, grid_hashes, primary_key, instance_data)
+
+    def count(self, is_hit):
+        '''Count a lookup as a hit or a miss.
+
+        Parameters
+        ----------
+        is_hit : boolean
+            Whether the lookup found its instance data.
+        '''
+        with _instance_data_lock:
+            if is_hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @contextlib.contextmanager
+    def creating(self, primary_key):
+        '''A context in which instance data for a key is created.
+
+        Only one thread at a time can be in this context for the same key. Other
+        threads wait until the instance data is created, after which they should
+        find it in the cache.
+
+        Parameters
+        ----------
+        primary_key : tuple
+            The key under which the instance data will be stored.
+        '''
+        with _instance_data_lock:
+            lock, num_users = self._creation_locks.get(primary_key, (None, 0))
+
+            if lock is None:
+                lock = threading.Lock()
+
+            self._creation_locks[primary_key] = (lock, num_users + 1)
+
+        try:
+            with lock:
+                yield
+        finally:
+            with _instance_data_lock:
+                lock, num_users = self._creation_locks[primary_key]
+
+                if num_users == 1:
+                    del self._creation_locks[primary_key]
+                else:
+                    self._creation_locks[primary_key] = (lock, num_users - 1)
+
+    def add(self, instance_data, cache_keys):
+        '''Add instance data to the cache.
+
+        The size of the instance data is measured again after its first propagation,
+        as many optical elements compute their arrays lazily during that propagation.
+
+        Parameters
+        ----------
+        instance_data : InstanceData
+            The instance data to add.
+        cache_keys : list
+            All keys under which the instance data can be found.
+        '''
+        with _instance_data_lock:
+            # Count the miss in the global cache.
+            get_instance_data_cache().get((self._id, cache_keys[0]))
+
+            self._store(instance_data, cache_keys)
+
+            if cache_keys[0] in self._entries:
+                self._unmeasured[cache_keys[0]] = instance_data
+
+    def measure(self, instance_data):
+        '''Measure the size of instance data after it was used for a propagation.
+
+        This only does work for the first propagation with this instance data.
+
+        Parameters
+        ----------
+        instance_data : InstanceData
+            The instance data that was used.
+        '''
+        if not self._unmeasured:
+            return
+
+        with _instance_data_lock:
+            for primary_key, unmeasured_instance_data in list(self._unmeasured.items()):
+                if unmeasured_instance_data is instance_data:
+                    del self._unmeasured[primary_key]
+
+                    entry = self._entries.get(primary_key)
+
+                    if entry is not None:
+                        self._store(instance_data, entry[1])
+
+    def _store(self, instance_data, cache_keys):
+        # Should be called with the instance data lock held.
+        primary_key = cache_keys[0]
+        global_key = (self._id, primary_key)
+        nbytes = _get_instance_data_nbytes(instance_data)
+
+        self._entries[primary_key] = (instance_data, cache_keys, nbytes)
+
+        if primary_key not in self._entries:
+            # The instance data is too large for this cache.
+            self._remove_aliases(primary_key, cache_keys)
+            self._global_keys.discard(global_key)
+            get_instance_data_cache().pop(global_key)
+
+            self.evictions += 1
+            return
+
+        for cache_key in cache_keys:
+            self._aliases[cache_key] = primary_key
+
+        global_cache = get_instance_data_cache()
+
+        self._global_keys.add(global_key)
+        global_cache[global_key] = (weakref.ref(self), nbytes)
+
+        if global_key not in global_cache:
+            # The instance data is too large for the global cache.
+            self._discard(primary_key)
+
+    def clear(self):
+        '''Remove all instance data from the cache.
+        '''
+        with _instance_data_lock:
+            _release_instance_data(self._global_keys)
+            self._global_keys.clear()
+
+            self._entries.clear()
+            self._aliases.clear()
+            self._unmeasured.clear()
+            self.last_used = [None, None]
+
+    @property
+    def statistics(self):
+        '''A dictionary with the current statistics of the cache.
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'nbytes': self._entries.nbytes
+        }
+
+    def _remove_aliases(self, primary_key, cache_keys):
+        self.last_used = [None, None]
+        self._unmeasured.pop(primary_key, None)
+
+        for cache_key in cache_keys:
+            # Another instance may have been added later under the same key.
+            if self._aliases.get(cache_key) == primary_key:
+                del self._aliases[cache_key]
+
+    def _on_evict(self, primary_key, entry):
+        # Called when the instance data was evicted to satisfy the bounds of this cache.
+        # The instance data lock is already held, as entries are only added by _store().
+        self._remove_aliases(primary_key, entry[1])
+        self.evictions += 1
+
+        global_key = (self._id, primary_key)
+        self._global_keys.discard(global_key)
+
+        if _instance_data_cache is not None:
+            _instance_data_cache.pop(global_key)
+
+    def _discard(self, primary_key):
+        # Called when the instance data was evicted to satisfy the bounds of the global cache.
+        with _instance_data_lock:
+            self._global_keys.discard((self._id, primary_key))
+
+            entry = self._entries.pop(primary_key)
+
+            if entry is not None:
+                self._remove_aliases(primary_key, entry[1])
+                self.evictions += 1
+
+def _get_instance_data_directory(key):
+    '''Get the directory of the on-disk instance data for a cache key.
+
+    Parameters
+    ----------
+    key : string
+        The cache key.
+
+    Returns
+    -------
+    string or None
+        The directory, or None if the on-disk cache is disabled in the configuration.
+    '''
+    if not Configuration().optics.instance_cache.use_disk_cache:
+        return None
+
+    cache_directory = os.path.expanduser(Configuration().cache.directory)
+
+    return os.path.join(cache_directory, 'instance_data', key)
+
+def _load_instance_arrays(directory):
+    '''Load instance arrays from the on-disk cache as read-only memory-mapped arrays.
+
+    Parameters
+    ----------
+    directory : string
+        The directory in which the arrays are stored.
+
+    Returns
+    -------
+    list of ndarray or None
+        The arrays, or None if they were not found.
+    '''
+    try:
+        filenames = sorted(os.listdir(directory), key=lambda filename: int(filename.split('.')[0]))
+
+        return [np.load(os.path.join(directory, filename), mmap_mode='r') for filename in filenames]
+    except (OSError, ValueError):
+        # A missing or corrupted directory is treated as a cache miss.
+        return None
+
+def _save_instance_arrays(directory, arrays):
+    '''Save instance arrays to the on-disk cache.
+
+    Parameters
+    ----------
+    directory : string
+        The directory in which to store the arrays.
+    arrays : list of ndarray
+        The arrays to store.
+    '''
+    try:
+        parent_directory = os.path.dirname(directory)
+        os.makedirs(parent_directory, exist_ok=True)
+
+        # Write to a temporary directory first and atomically move it into place, so that
+        # other processes never read a partially-written set of arrays.
+        temp_directory = tempfile.mkdtemp(dir=parent_directory, suffix='.tmp')
+        try:
+            for i, array in enumerate(arrays):
+                np.save(os.path.join(temp_directory, '%d.npy' % i), np.asarray(array))
+            os.rename(temp_directory, directory)
+        except Exception:
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            raise
+    except OSError:
+        # Failing to write the cache, for example because another process wrote it
+        # first, should never break a computation.
+        pass
+
 def _get_function_parameters(func):
     '''Get the names of the parameters for a function for both Python2 and Python3.
 
@@ -254,6 +739,9 @@ def _get_function_parameters(func):
         # Python 2
         return inspect.getargspec(func).args
 
+# Wavelengths that differ by less than this relative step share their instance data.
+_LOG_WAVELENGTH_STEP = math.log(1 + 1e-9)
+
 INPUT_GRID_DEPENDENT = 1
 OUTPUT_GRID_DEPENDENT = 2
 WAVELENGTH_DEPENDENT = 4
@@ -272,8 +760,11 @@ class AgnosticOpticalElement(OpticalElement):
     user.
 
     As instanced data can take a lot of memory, at most `max_in_cache` instances will be held in the cache at
-    the time. If an additional instance is requested, the oldest instance will be thrown away, and the new
-    instance will be put in the cache instead.
+    the time. Additionally, the cache can be bounded by the number of bytes held by the arrays in the instances,
+    both per optical element and for all optical elements combined (see :func:`get_instance_data_cache`). If an
+    additional instance is requested, the least recently used instances will be thrown away, and the new
+    instance will be put in the cache instead. The hits, misses and evictions of the cache are available
+    from :attr:`cache_statistics`.
 
     Parameters
     ----------
@@ -286,12 +777,23 @@ class AgnosticOpticalElement(OpticalElement):
     max_in_cache : int
         The maximum size of the internal cache for optical elements. Reduce this if the cache is using
         too much memory, increase if there are a lot of cache misses.
+    max_bytes_in_cache : int or None
+        The maximum number of bytes held by the internal cache. If this is None, the
+        `optics.instance_cache.max_size_per_element` configuration value is used.
     '''
-    def __init__(self, grid_dependent=True, wavelength_dependent=True, max_in_cache=11):
+    def __init__(self, grid_dependent=True, wavelength_dependent=True, max_in_cache=11, max_bytes_in_cache=None):
         self._grid_dependent = grid_dependent
         self._wavelength_dependent = wavelength_dependent
         self._max_in_cache = max_in_cache
 
+        if max_bytes_in_cache is None:
+            max_size_per_element = Configuration().optics.instance_cache.max_size_per_element
+
+            if max_size_per_element is not None:
+                max_bytes_in_cache = int(max_size_per_element * 2**20)
+
+        self._max_bytes_in_cache = max_bytes_in_cache
+
         self.clear_cache()
 
     def _get_cache_keys(self, input_grid, output_grid, wavelength):
@@ -311,38 +813,31 @@ class AgnosticOpticalElement(OpticalElement):
         list
             The list of cache keys.
         '''
-        key_parts = []
-
         if self._grid_dependent:
             if input_grid is None:
                 if output_grid is None:
                     raise ValueError('Grid dependent, but no grids are given for lookup.')
 
-                key_parts.append([(None, hash(output_grid))])
+                grid_keys = [(None, hash(output_grid))]
             elif output_grid is None:
-                key_parts.append([(hash(input_grid), None)])
+                grid_keys = [(hash(input_grid), None)]
             else:
-                key_parts.append([(hash(input_grid), hash(output_grid)), (hash(input_grid), None), (None, hash(output_grid))])
+                input_hash = hash(input_grid)
+                output_hash = hash(output_grid)
+
+                grid_keys = [(input_hash, output_hash), (input_hash, None), (None, output_hash)]
         else:
-            key_parts.append([(None, None)])
+            grid_keys = [(None, None)]
 
         if self._wavelength_dependent:
             if wavelength is None:
                 raise ValueError('Wavelength dependent, but no wavelength is given for lookup.')
 
-            wavelength_key = int(np.round(np.log(wavelength) / np.log(1 + 1e-9)))
-            key_parts.append([(wavelength_key,)])
+            wavelength_key = (int(round(math.log(wavelength) / _LOG_WAVELENGTH_STEP)),)
         else:
-            key_parts.append([(None,)])
-
-        keys = []
-        for parts in itertools.product(*key_parts):
-            key = ()
-            for p in parts:
-                key += p
-            keys.append(key)
+            wavelength_key = (None,)
 
-        return keys
+        return [grid_key + wavelength_key for grid_key in grid_keys]
 
     def clear_cache(self):
         '''Clear the instance cache.
@@ -352,32 +847,38 @@ class AgnosticOpticalElement(OpticalElement):
         cache ensures that the propagations are always performed using
         up-to-date arguments.
         '''
-        self._instance_data_cache = collections.OrderedDict()
-        self._num_in_cache = 0
+        # This can be called by setters before the constructor has finished.
+        old_cache = self.__dict__.get('_instance_data_cache')
 
-    def _add_to_cache(self, instance_data, cache_keys=None):
-        if self._num_in_cache == self._max_in_cache:
-            # Remove last added item
-            key, value = self._instance_data_cache.popitem(False)
+        if old_cache is not None:
+            old_cache.clear()
 
-            # Remove all copies of that item as well
-            old_cache_keys = self._get_cache_keys(value.input_grid, value.output_grid, value.wavelength)
-            for i in range(len(old_cache_keys) - 1):
-                self._instance_data_cache.popitem(False)
+        max_in_cache = self.__dict__.get('_max_in_cache')
+        max_bytes_in_cache = self.__dict__.get('_max_bytes_in_cache')
 
-            # Update number of instance data items
-            self._num_in_cache -= 1
+        self._instance_data_cache = _InstanceDataCache(max_in_cache, max_bytes_in_cache)
+
+        # Keep the statistics over the lifetime of the optical element.
+        if old_cache is not None:
+            self._instance_data_cache.hits = old_cache.hits
+            self._instance_data_cache.misses = old_cache.misses
+            self._instance_data_cache.evictions = old_cache.evictions
+
+    @property
+    def cache_statistics(self):
+        '''A dictionary with the statistics of the instance cache.
+
+        This contains the number of hits, misses and evictions, and the current
+        number of entries and bytes held by the cache.
+        '''
+        return self._instance_data_cache.statistics
 
+    def _add_to_cache(self, instance_data, cache_keys=None):
         # Calculate cache keys
         if cache_keys is None:
             cache_keys = self._get_cache_keys(instance_data.input_grid, instance_data.output_grid, instance_data.wavelength)
 
-        # Add instance data under each of these keys
-        for cache_key in cache_keys:
-            self._instance_data_cache[cache_key] = instance_data
-
-        # Update number of instance data items
-        self._num_in_cache += 1
+        self._instance_data_cache.add(instance_data, cache_keys)
 
     def _get_parameter_signature(self, parameter):
         '''Guess the signature of a given parameter.
@@ -589,6 +1090,76 @@ class AgnosticOpticalElement(OpticalElement):
 
         return func
 
+    def get_disk_cache_key(self, *parameters):
+        '''Get a key for the on-disk cache that identifies instance data.
+
+        The key is a hash of the class of this optical element and the given parameters.
+        It should therefore be called with all parameters that the instance data depends on.
+
+        Parameters
+        ----------
+        *parameters : Grid, scalar, array_like or None
+            The parameters that determine the instance data. Grids are identified by their
+            coordinates, and scalars and arrays by their values.
+
+        Returns
+        -------
+        string
+            The cache key.
+        '''
+        h = xxhash.xxh64()
+        h.update(type(self).__module__ + '.' + type(self).__qualname__)
+
+        for parameter in parameters:
+            if isinstance(parameter, Grid):
+                h.update(b'grid')
+                h.update(np.array(hash(parameter), dtype='uint64'))
+            elif parameter is None:
+                h.update(b'none')
+            else:
+                parameter = np.ascontiguousarray(parameter)
+
+                h.update(parameter.dtype.str)
+                h.update(np.array(parameter.shape, dtype='int64'))
+                h.update(parameter)
+
+        return h.hexdigest()
+
+    def evaluate_with_disk_cache(self, function, *parameters):
+        '''Evaluate a function that computes instance arrays, using the on-disk cache.
+
+        If the on-disk cache is enabled in the configuration with
+        `optics.instance_cache.use_disk_cache`, the arrays are read from the cache
+        directory when they were computed before, by any process. Otherwise, they are
+        computed and written to the cache directory. This is useful for instance data
+        that is expensive to compute.
+
+        Parameters
+        ----------
+        function : function
+            A function without arguments that returns a list of arrays.
+        *parameters : Grid, scalar, array_like or None
+            All parameters that determine the arrays. See :meth:`get_disk_cache_key`.
+
+        Returns
+        -------
+        list of ndarray
+            The arrays. Arrays that are read from the on-disk cache are read-only
+            memory-mapped arrays.
+        '''
+        directory = _get_instance_data_directory(self.get_disk_cache_key(*parameters))
+
+        if directory is None:
+            return function()
+
+        arrays = _load_instance_arrays(directory)
+
+        if arrays is None:
+            arrays = function()
+            _save_instance_arrays(directory, arrays)
+
+        return arrays
+
     def get_instance_data(self, input_grid, output_grid, wavelength):
         '''Get the InstanceData object corresponding to the given grids and wavelength.
 
@@ -604,13 +1175,26 @@ class AgnosticOpticalElement(OpticalElement):
         wavelength : scalar or None
             The wavelength.
         '''
+        cache = self._instance_data_cache
+
+        # Fast path for repeated propagations with the same grid and wavelength.
+        # Grids can be changed in-place, so the (memoized) grid hashes are compared as well.
+        slot = int(input_grid is None)
+        last_used = cache.last_used[slot]
+        grid_hashes = (hash(input_grid), hash(output_grid))
+
+        if last_used is not None and last_used[0] is input_grid and last_used[1] is output_grid and last_used[2] == wavelength and last_used[3] == grid_hashes:
+            cache.touch(last_used[4])
+            cache.count(True)
+
+            return last_used[5]
+
+        lookup = (input_grid, output_grid, wavelength, grid_hashes)
+
         cache_keys = self._get_cache_keys(input_grid, output_grid, wavelength)
+        primary_key, instance_data = cache.lookup(cache_keys)
 
-        for cache_key in cache_keys:
-            if cache_key in self._instance_data_cache:
-                instance_data = self._instance_data_cache[cache_key]
-                break
-        else:
+        if instance_data is None:
             # Try to guess input and output grid.
             if input_grid is None:
                 input_grid = self.get_input_grid(output_grid, wavelength)
@@ -621,17 +1205,29 @@ class AgnosticOpticalElement(OpticalElement):
             # Recalculate cache keys and try again.
             cache_keys = self._get_cache_keys(input_grid, output_grid, wavelength)
 
-            for cache_key in cache_keys:
-                if cache_key in self._instance_data_cache:
-                    instance_data = self._instance_data_cache[cache_key]
-                    break
-            else:
-                # Item does not yet exist. Create instanceData element
-                instance_data = InstanceData(input_grid, output_grid, wavelength)
-                self.make_instance(instance_data, input_grid, output_grid, wavelength)
+            primary_key, instance_data = cache.lookup(cache_keys)
+
+        if instance_data is None:
+            with cache.creating(cache_keys[0]):
+                # Another thread may have created the instance data in the meantime.
+                primary_key, instance_data = cache.lookup(cache_keys)
+
+                if instance_data is None:
+                    cache.count(False)
 
-                # Add instance data to cache.
-                self._add_to_cache(instance_data, cache_keys)
+                    # Item does not yet exist. Create instanceData element
+                    instance_data = InstanceData(input_grid, output_grid, wavelength)
+                    self.make_instance(instance_data, input_grid, output_grid, wavelength)
+
+                    # Add instance data to cache.
+                    primary_key = cache_keys[0]
+                    self._add_to_cache(instance_data, cache_keys)
+                else:
+                    cache.count(True)
+        else:
+            cache.count(True)
+
+        cache.remember(slot, *lookup, primary_key, instance_data)
 
         return instance_data
 
@@ -721,9 +1317,12 @@ class AgnosticOpticalElement(OpticalElement):
         Returns
         -------
         dict
-            All contained variables.
+            All contained variables, except for the instance cache.
         '''
-        return self.__dict__
+        state = self.__dict__.copy()
+        del state['_instance_data_cache']
+
+        return state
 
     def __setstate__(self, state):
         '''Set the state of the optical element for pickle.
@@ -734,6 +1333,9 @@ class AgnosticOpticalElement(OpticalElement):
             The state of an optical element returned by a __getstate__().
         '''
         self.__dict__ = state
+        self.__dict__.pop('_instance_data_cache', None)
+
+        self.clear_cache()
 
 def make_agnostic_forward(forward):
     '''A decorator for a forward function on an AgnosticOpticalElement.
@@ -755,7 +1357,12 @@ def make_agnostic_forward(forward):
         # Look up instance data
         instance_data = self.get_instance_data(wavefront.grid, None, wavefront.wavelength)
 
-        return forward(self, instance_data, wavefront, *args, **kwargs)
+        wf = forward(self, instance_data, wavefront, *args, **kwargs)
+
+        # The instance data might have computed its arrays lazily during this propagation.
+        self._instance_data_cache.measure(instance_data)
+
+        return wf
     return res
 
 def make_agnostic_backward(backward):
@@ -778,7 +1385,12 @@ def make_agnostic_backward(backward):
         # Look up instance data
         instance_data = self.get_instance_data(None, wavefront.grid, wavefront.wavelength)
 
-        return backward(self, instance_data, wavefront, *args, **kwargs)
+        wf = backward(self, instance_data, wavefront, *args, **kwargs)
+
+        # The instance data might have computed its arrays lazily during this propagation.
+        self._instance_data_cache.measure(instance_data)
+
+        return wf
     return res
 
 def make_agnostic_optical_element(grid_dependent_arguments=None, wavelength_dependent_arguments=None, num_in_cache=50):  # pragma: no cover
@@ -983,6 +1595,207 @@ def make_agnostic_optical_element(grid_dependent_arguments=None, wavelength_depe
         return AgnosticOpticalElement
     return decorator
 
+class FusedOpticalElement(OpticalElement):
+    '''A run of consecutive optical elements that act pointwise on the electric field.
+
+    All optical elements are applied at once, in a single pass over the electric field.
+    The static parts of their transmissions are combined ahead of time, and reused for as
+    long as these do not change. The dynamic parts, such as the surface of a deformable
+    mirror or the phase screen of an atmospheric layer, are applied in the same operation.
+    If one of the optical elements cannot act pointwise on a wavefront, the optical elements
+    are applied one by one instead.
+
+    These are usually created by :meth:`OpticalSystem.compile()`.
+
+    Parameters
+    ----------
+    optical_elements : list of OpticalElement
+        The optical elements in the order that the wavefront propagates.
+    max_in_cache : int
+        The maximum number of combined static transmissions to keep.
+    '''
+    def __init__(self, optical_elements, max_in_cache=11):
+        self.optical_elements = list(optical_elements)
+
+        self._max_in_cache = max_in_cache
+        self._static_transmission_cache = LRUCache(max_entries=max_in_cache)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        # The cache cannot be pickled, and will be rebuilt on first use.
+        del state['_static_transmission_cache']
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._static_transmission_cache = LRUCache(max_entries=self._max_in_cache)
+
+    def _get_static_transmission(self, transmissions, backward):
+        '''Get the combined static transmission of a number of pointwise transmissions.
+
+        Parameters
+        ----------
+        transmissions : list of PointwiseTransmission
+            The transmissions to combine.
+        backward : boolean
+            Whether the transmissions are for a backward propagation.
+
+        Returns
+        -------
+        array_like or scalar or None
+            The combined static transmission, or None if none of the transmissions has
+            a static part.
+        '''
+        keys = tuple(t.static_key for t in transmissions if t.static is not None and t.static_key is not None)
+
+        if not keys:
+            return None
+
+        cache_key = (backward,) + tuple(id(key) for key in keys)
+        cached = self._static_transmission_cache.get(cache_key)
+
+        if cached is not None and all(ref() is key for ref, key in zip(cached[0], keys)):
+            return cached[1]
+
+        static = 1
+        for t in transmissions:
+            if t.static is not None and t.static_key is not None:
+                static = static * t.static()
+
+        static = np.asarray(static)
+        static.flags.writeable = False
+
+        # Only weak references to the keys are kept, so that instance data evicted from the cache
+        # of an optical element can be freed. The combined transmission is removed as soon as
+        # one of its keys is gone, which also means that the ids of the keys cannot be reused.
+        cache = self._static_transmission_cache
+
+        def remove_entry(ref):
+            cached = cache.get(cache_key)
+
+            if cached is not None and ref in cached[0]:
+                cache.pop(cache_key)
+
+        refs = tuple(weakref.ref(key, remove_entry) for key in keys)
+        cache[cache_key] = (refs, static)
+
+        return static
+
+    def _propagate(self, wavefront, backward):
+        '''Propagate a wavefront through all optical elements.
+
+        Parameters
+        ----------
+        wavefront : Wavefront
+            The wavefront to propagate.
+        backward : boolean
+            Whether to do a backward propagation.
+
+        Returns
+        -------
+        Wavefront
+            The propagated wavefront.
+        '''
+        transmissions = [el._get_pointwise_transmission(wavefront, backward) for el in self.optical_elements]
+
+        if any(t is None for t in transmissions):
+            wf = wavefront
+
+            if backward:
+                for optical_element in reversed(self.optical_elements):
+                    wf = optical_element.backward(wf)
+            else:
+                for optical_element in self.optical_elements:
+                    wf = optical_element.forward(wf)
+
+            return wf
+
+        electric_field = wavefront.electric_field
+
+        variables = {'E': electric_field}
+        factors = ['E']
+
+        static = self._get_static_transmission(transmissions, backward)
+        if static is not None:
+            variables['T'] = static
+            factors.append('T')
+
+        exponents = []
+        for i, t in enumerate(transmissions):
+            if t.static is not None and t.static_key is None:
+                variables['D%d' % i] = t.static()
+                factors.append('D%d' % i)
+
+            if t.exponent is not None:
+                variables['a%d' % i] = t.exponent_factor
+                variables['x%d' % i] = t.exponent
+                exponents.append('a%d * x%d' % (i, i))
+
+        expression = ' * '.join(factors)
+        if exponents:
+            expression += ' * exp(%s)' % ' + '.join(exponents)
+
+        res = np.empty_like(electric_field)
+        ne.evaluate(expression, local_dict=variables, out=res, casting='same_kind')
+
+        wf = wavefront.copy()
+        wf.electric_field = res
+
+        return wf
+
+    def forward(self, wavefront):
+        '''Propagate a wavefront forward through the optical elements.
+
+        Parameters
+        ----------
+        wavefront : Wavefront
+            The wavefront to propagate.
+
+        Returns
+        -------
+        Wavefront
+            The propagated wavefront.
+        '''
+        return self._propagate(wavefront, False)
+
+    def backward(self, wavefront):
+        '''Propagate a wavefront backward through the optical elements.
+
+        Parameters
+        ----------
+        wavefront : Wavefront
+            The wavefront to propagate.
+
+        Returns
+        -------
+        Wavefront
+            The propagated wavefront.
+        '''
+        return self._propagate(wavefront, True)
+
+    def get_transformation_matrix_forward(self, wavelength=1):
+        return OpticalSystem(self.optical_elements).get_transformation_matrix_forward(wavelength)
+
+    def get_transformation_matrix_backward(self, wavelength=1):
+        return OpticalSystem(self.optical_elements).get_transformation_matrix_backward(wavelength)
+
+def _is_pointwise(optical_element):
+    '''Whether an optical element can act pointwise on the electric field.
+
+    Parameters
+    ----------
+    optical_element : OpticalElement
+        The optical element to check.
+
+    Returns
+    -------
+    boolean
+        Whether the optical element implements a pointwise transmission.
+    '''
+    return type(optical_element)._get_pointwise_transmission is not OpticalElement._get_pointwise_transmission
+
 class OpticalSystem(OpticalElement):
     '''An linear path of optical elements.
 
@@ -1036,6 +1849,100 @@ class OpticalSystem(OpticalElement):
 
         return wf
 
+    def prepare(self, wavelengths, input_grid, num_threads=None):
+        '''Prepare the optical system for propagations at a number of wavelengths.
+
+        Agnostic optical elements create their instance data for a wavelength
+        on the first propagation at that wavelength. This function does this work
+        beforehand, by propagating a wavefront through the optical system for each
+        wavelength, concurrently in a pool of threads. This avoids the cost of creating
+        instances during the first propagations of, for example, a broadband simulation.
+
+        The instance data is created for forward propagations. Backward propagations
+        between the same grids share this instance data.
+
+        .. note::
+            Each instance is only kept as long as it resides in the instance cache of its
+            optical element, so caches should be large enough for all wavelengths.
+
+        Parameters
+        ----------
+        wavelengths : array_like
+            The wavelengths for which to prepare the optical system.
+        input_grid : Grid
+            The grid of the wavefronts that will be propagated through the optical system.
+        num_threads : integer or None
+            The number of threads to use. If this is None, the number of available cores is used.
+        '''
+        wavelengths = np.atleast_1d(wavelengths)
+
+        def propagate(wavelength):
+            self.forward(Wavefront(input_grid.ones(), wavelength))
+
+        if num_threads is None:
+            num_threads = os.cpu_count()
+        num_threads = max(1, min(num_threads, len(wavelengths)))
+
+        if num_threads == 1:
+            for wavelength in wavelengths:
+                propagate(wavelength)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+                # Retrieve all results to raise any exceptions.
+                list(executor.map(propagate, wavelengths))
+
+    def compile(self):
+        '''Make an equivalent optical system in which pointwise optical elements are fused.
+
+        Runs of consecutive optical elements that only multiply the electric field
+        pointwise, such as apodizers, deformable mirrors and atmospheric layers without
+        scintillation, are replaced by a :class:`FusedOpticalElement`. This applies all
+        of them in a single pass over the electric field, rather than one pass for each
+        optical element. Nested optical systems are flattened first.
+
+        The compiled optical system refers to the same optical elements, so changes to
+        these, for example to the actuators of a deformable mirror, are taken into account.
+        Changes to the list of optical elements of this optical system are not.
+
+        Returns
+        -------
+        OpticalSystem
+            The compiled optical system.
+        '''
+        elements = []
+
+        def flatten(optical_elements):
+            for optical_element in optical_elements:
+                # Subclasses of OpticalSystem might change the propagation, so only flatten exact types.
+                if type(optical_element) in (OpticalSystem, FusedOpticalElement):
+                    flatten(optical_element.optical_elements)
+                else:
+                    elements.append(optical_element)
+
+        flatten(self.optical_elements)
+
+        compiled_elements = []
+        run = []
+
+        def end_run():
+            if len(run) > 1:
+                compiled_elements.append(FusedOpticalElement(run))
+            else:
+                compiled_elements.extend(run)
+
+            del run[:]
+
+        for optical_element in elements:
+            if _is_pointwise(optical_element):
+                run.append(optical_element)
+            else:
+                end_run()
+                compiled_elements.append(optical_element)
+
+        end_run()
+
+        return OpticalSystem(compiled_elements)
+
     def get_transformation_matrix_forward(self, wavelength=1):
         '''Calculate the forward linear transformation matrix.
 
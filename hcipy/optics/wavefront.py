@@ -65,8 +65,22 @@ class Wavefront(object):
 
     def copy(self):
         '''Make a copy of the wavefront.
+
+        The copy shares the grid with this wavefront, as grids are treated as immutable.
+        The electric field data and input Stokes vector are copied.
+
+        Returns
+        -------
+        Wavefront
+            The copy of this wavefront.
         '''
-        return copy.deepcopy(self)
+        wf = copy.copy(self)
+        wf._electric_field = self._electric_field.copy()
+
+        if self._input_stokes_vector is not None:
+            wf._input_stokes_vector = self._input_stokes_vector.copy()
+
+        return wf
 
     @property
     def electric_field(self):
@@ -3,6 +3,8 @@ import numpy as np
 from ..optics import Wavefront, AgnosticOpticalElement, make_agnostic_forward, make_agnostic_backward
 from ..field import Field
 from ..fourier import make_fourier_transform
+from ..fourier.fourier_transform import _get_float_and_complex_dtype
+from ..fourier.matrix_fourier_transform import _get_scaled_dft_matrices
 
 class FraunhoferPropagator(AgnosticOpticalElement):
     '''A monochromatic perfect lens propagator.
@@ -23,6 +25,16 @@ class FraunhoferPropagator(AgnosticOpticalElement):
             The wavelength of the wavefront.
         focal_length : scalar
             The focal length of the lens system.
+
+        Notes
+        -----
+        Wavefronts at several wavelengths can be propagated together using
+        :meth:`forward_polychromatic` and :meth:`backward_polychromatic`. For
+        Cartesian separated grids, these compute all spectral channels from a
+        single set of stacked DFT matrices, with one matrix product per
+        wavelength and axis, rather than with a separate Fourier transform
+        object for each wavelength. This avoids cycling through the instance
+        cache when many wavelengths are used.
     '''
     def __init__(self, input_grid, output_grid, focal_length=1):
         self._input_grid = input_grid
@@ -88,3 +100,221 @@ class FraunhoferPropagator(AgnosticOpticalElement):
         '''
         U_new = instance_data.fourier_transform.backward(wavefront.electric_field) / instance_data.norm_factor
         return Wavefront(Field(U_new, instance_data.input_grid), wavefront.wavelength, wavefront.input_stokes_vector)
+
+    def _get_polychromatic_matrices(self, input_grid, output_grid, wavelengths, dtype, adjoint=False):
+        '''Get the stacked DFT matrices and normalization factors for a set of wavelengths.
+
+        Parameters
+        ----------
+        input_grid : Grid
+            The grid in the pupil plane.
+        output_grid : Grid
+            The grid in the focal plane.
+        wavelengths : array_like
+            The wavelength of each spectral channel.
+        dtype : numpy dtype
+            The data type of the electric fields.
+        adjoint : boolean
+            Whether to return the conjugate transposes of the DFT matrices, for
+            backward propagations. These are DFT matrices themselves, so they are
+            taken from the DFT matrix cache as well.
+
+        Returns
+        -------
+        matrices : list of array_like
+            The stacked DFT matrices. For two-dimensional grids, these are the matrices
+            that act on the y and x axes, in that order, with the same layout as in
+            the MatrixFourierTransform.
+        scales : array_like
+            The scaling from focal-plane coordinates to spatial frequencies for each wavelength.
+        norm_factors : array_like
+            The normalization factor for each wavelength.
+        '''
+        focal_lengths = np.array([self.evaluate_parameter(self.focal_length, input_grid, output_grid, wavelength) for wavelength in wavelengths])
+
+        scales = 2 * np.pi / (focal_lengths * wavelengths)
+        norm_factors = 1 / (1j * focal_lengths * wavelengths)
+
+        _, complex_dtype = _get_float_and_complex_dtype(dtype)
+
+        if input_grid.ndim == 1:
+            pairs = [(output_grid.x, input_grid.x)]
+        else:
+            x, y = input_grid.separated_coords
+            u, v = output_grid.separated_coords
+
+            pairs = [(v, y), (x, u)]
+
+        if adjoint:
+            # The conjugate transpose of exp(-1j * scale * outer(a, b)) is exp(1j * scale * outer(b, a)).
+            matrices = [_get_scaled_dft_matrices(b, -scales, a, complex_dtype) for a, b in pairs]
+        else:
+            matrices = [_get_scaled_dft_matrices(a, scales, b, complex_dtype) for a, b in pairs]
+
+        return matrices, scales, norm_factors.astype(complex_dtype)
+
+    def _can_propagate_polychromatic(self, wavefronts, input_grid, output_grid):
+        '''Check whether a stacked propagation can be used for a list of wavefronts.
+
+        Parameters
+        ----------
+        wavefronts : list of Wavefront
+            The wavefronts to propagate.
+        input_grid : Grid
+            The grid in the pupil plane.
+        output_grid : Grid
+            The grid in the focal plane.
+
+        Returns
+        -------
+        boolean
+            Whether all wavefronts can be propagated using stacked DFT matrices.
+        '''
+        if len(wavefronts) < 2:
+            return False
+
+        for grid in [input_grid, output_grid]:
+            if not grid.is_separated or not grid.is_('cartesian') or grid.ndim not in [1, 2]:
+                return False
+
+        if input_grid.ndim != output_grid.ndim:
+            return False
+
+        shape = wavefronts[0].electric_field.shape
+
+        return all(wf.electric_field.shape == shape for wf in wavefronts)
+
+    def forward_polychromatic(self, wavefronts):
+        '''Propagate wavefronts at several wavelengths forward through the lens.
+
+        All wavefronts should be defined on the same grid. For Cartesian separated
+        grids, all spectral channels are computed at the same time from stacked
+        DFT matrices, using a single stacked matrix product per axis. Otherwise,
+        each wavefront is propagated separately using :meth:`forward`.
+
+        Parameters
+        ----------
+        wavefronts : list of Wavefront
+            The incoming wavefronts.
+
+        Returns
+        -------
+        list of Wavefront
+            The wavefronts after the propagation, in the same order as `wavefronts`.
+        '''
+        wavefronts = list(wavefronts)
+
+        if not wavefronts:
+            return []
+
+        input_grid = wavefronts[0].electric_field.grid
+        wavelengths = np.array([wf.wavelength for wf in wavefronts], dtype='float')
+        output_grid = self.get_output_grid(input_grid, wavelengths[0])
+
+        same_grid = all(wf.electric_field.grid == input_grid for wf in wavefronts)
+
+        if not same_grid or not self._can_propagate_polychromatic(wavefronts, input_grid, output_grid):
+            return [self.forward(wf) for wf in wavefronts]
+
+        E = np.array([wf.electric_field for wf in wavefronts])
+        matrices, _, norm_factors = self._get_polychromatic_matrices(input_grid, output_grid, wavelengths, E.dtype)
+
+        weights = input_grid.weights
+        if np.isscalar(weights) or np.all(weights == weights[0]):
+            # Include the weights in the normalization to avoid a multiplication of the fields.
+            norm_factors = norm_factors * np.ravel(weights)[0]
+        else:
+            E = E * weights
+
+        E = E.astype(matrices[0].dtype, copy=False)
+
+        num_wavelengths = len(wavefronts)
+        tensor_shape = E.shape[1:-1]
+        num_fields = int(np.prod(tensor_shape))
+
+        if input_grid.ndim == 1:
+            M = matrices[0]
+
+            E = E.reshape((num_wavelengths, num_fields, -1))
+            U = np.matmul(E, np.swapaxes(M, -1, -2))
+            U *= norm_factors[:, np.newaxis, np.newaxis]
+        else:
+            M1, M2 = matrices
+
+            # Transform the second axis of all tensor elements of each wavelength at once.
+            E = E.reshape((num_wavelengths, num_fields * input_grid.shape[0], input_grid.shape[1]))
+            intermediate = np.matmul(E, M2)
+
+            # Transform the first axis, broadcasting the matrices over the tensor elements.
+            intermediate = intermediate.reshape((num_wavelengths, num_fields, input_grid.shape[0], -1))
+            U = np.matmul(M1[:, np.newaxis], intermediate)
+            U *= norm_factors[:, np.newaxis, np.newaxis, np.newaxis]
+
+        U = U.reshape((num_wavelengths,) + tensor_shape + (-1,))
+
+        return [Wavefront(Field(U_i, output_grid), wf.wavelength, wf.input_stokes_vector) for U_i, wf in zip(U, wavefronts)]
+
+    def backward_polychromatic(self, wavefronts):
+        '''Propagate wavefronts at several wavelengths backward through the lens.
+
+        All wavefronts should be defined on the same grid. For Cartesian separated
+        grids, all spectral channels are computed at the same time from stacked
+        DFT matrices, using a single stacked matrix product per axis. Otherwise,
+        each wavefront is propagated separately using :meth:`backward`.
+
+        Parameters
+        ----------
+        wavefronts : list of Wavefront
+            The incoming wavefronts.
+
+        Returns
+        -------
+        list of Wavefront
+            The wavefronts after the propagation, in the same order as `wavefronts`.
+        '''
+        wavefronts = list(wavefronts)
+
+        if not wavefronts:
+            return []
+
+        output_grid = wavefronts[0].electric_field.grid
+        wavelengths = np.array([wf.wavelength for wf in wavefronts], dtype='float')
+        input_grid = self.get_input_grid(output_grid, wavelengths[0])
+
+        same_grid = all(wf.electric_field.grid == output_grid for wf in wavefronts)
+
+        if not same_grid or not self._can_propagate_polychromatic(wavefronts, input_grid, output_grid):
+            return [self.backward(wf) for wf in wavefronts]
+
+        U = np.array([wf.electric_field for wf in wavefronts])
+        matrices, scales, norm_factors = self._get_polychromatic_matrices(input_grid, output_grid, wavelengths, U.dtype, adjoint=True)
+        U = (U * output_grid.weights).astype(matrices[0].dtype, copy=False)
+
+        num_wavelengths = len(wavefronts)
+        tensor_shape = U.shape[1:-1]
+        num_fields = int(np.prod(tensor_shape))
+
+        # The weights of the spatial frequency grid scale with the wavelength.
+        factors = (scales / (2 * np.pi))**input_grid.ndim / norm_factors
+
+        if input_grid.ndim == 1:
+            M = matrices[0]
+
+            U = U.reshape((num_wavelengths, num_fields, -1))
+            E = np.matmul(U, np.swapaxes(M, -1, -2))
+            E *= factors[:, np.newaxis, np.newaxis]
+        else:
+            M1, M2 = matrices
+
+            # Transform the first axis, broadcasting the matrices over the tensor elements.
+            U = U.reshape((num_wavelengths, num_fields, output_grid.shape[0], output_grid.shape[1]))
+            intermediate = np.matmul(M1[:, np.newaxis], U)
+
+            # Transform the second axis of all tensor elements of each wavelength at once.
+            intermediate = intermediate.reshape((num_wavelengths, num_fields * input_grid.shape[0], -1))
+            E = np.matmul(intermediate, M2)
+            E *= factors[:, np.newaxis, np.newaxis]
+
+        E = E.reshape((num_wavelengths,) + tensor_shape + (-1,))
+
+        return [Wavefront(Field(E_i, input_grid), wf.wavelength, wf.input_stokes_vector) for E_i, wf in zip(E, wavefronts)]
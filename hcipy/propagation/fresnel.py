@@ -79,7 +79,13 @@ class FresnelPropagator(AgnosticOpticalElement):
             def transfer_function(fourier_grid):
                 return evaluate_supersampled(transfer_function_native, fourier_grid, self.num_oversampling)
 
-        instance_data.fourier_filter = FourierFilter(input_grid, transfer_function, q=self.zero_padding)
+        def cached_transfer_function(fourier_grid):
+            parameters = [input_grid, fourier_grid, wavelength, k, self.distance, self.num_oversampling]
+            tf, = self.evaluate_with_disk_cache(lambda: [transfer_function(fourier_grid)], *parameters)
+
+            return Field(tf, fourier_grid)
+
+        instance_data.fourier_filter = FourierFilter(input_grid, cached_transfer_function, q=self.zero_padding)
 
     @property
     def distance(self):
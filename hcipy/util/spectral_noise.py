@@ -2,8 +2,70 @@ import numpy as np
 import copy
 
 from ..field import Field
+from ..config import Configuration
 from ..fourier import FastFourierTransform, MatrixFourierTransform
 
+def _apply_phase_ramp(C, coords, shift, out):
+	'''Multiply spectral coefficients by the phase ramp corresponding to a shift.
+
+	The phase ramp exp(-1j * shift . k) is separable on a separated grid. It is
+	therefore applied as a 1D exponential along each axis, rather than evaluating
+	a complex exponential for every coefficient.
+
+	Parameters
+	----------
+	C : array_like
+		The spectral coefficients.
+	coords : list of array_like
+		The separated coordinates of the grid on which `C` is defined.
+	shift : array_like
+		The shift in the grid axes.
+	out : array_like
+		The array in which to write the result. This can be `C` itself.
+
+	Returns
+	-------
+	array_like
+		The array `out`.
+	'''
+	shape = tuple(len(c) for c in coords)
+	res = out.reshape(shape)
+
+	for i, c in enumerate(coords):
+		ramp_shape = [1] * len(coords)
+		ramp_shape[i] = -1
+
+		ramp = np.exp(-1j * shift[i] * c).reshape(ramp_shape)
+
+		if i == 0:
+			np.multiply(C.reshape(shape), ramp, out=res)
+		else:
+			res *= ramp
+
+	return out
+
+def _split_integer_pixel_shift(shift, delta):
+	'''Split a shift into whole pixels and a sub-pixel remainder.
+
+	Parameters
+	----------
+	shift : array_like
+		The shift in the grid axes.
+	delta : array_like
+		The pixel size along each of the grid axes.
+
+	Returns
+	-------
+	num_pixels : array_like
+		The integer number of pixels to shift along each axis.
+	remainder : array_like
+		The remaining sub-pixel shift along each axis.
+	'''
+	num_pixels = np.round(np.asarray(shift) / delta).astype('int')
+	remainder = shift - num_pixels * delta
+
+	return num_pixels, remainder
+
 class SpectralNoiseFactory(object):
 	def __init__(self, psd, output_grid):
 		'''A factory class for spectral noise.
@@ -39,6 +101,126 @@ class SpectralNoiseFactory(object):
 		'''
 		raise NotImplementedError()
 
+	def make_random_batch(self, num_realizations, seed=None, as_generator=False, use_imaginary_part=False):
+		'''Make and evaluate many independent realizations of the spectral noise.
+
+		The realizations are evaluated in chunks, using batched Fourier transforms.
+		The size of each chunk is chosen such that its evaluation uses at most the
+		amount of memory given by the `spectral_noise.batch_memory` configuration
+		value. The realizations are identical to those made by consecutive calls to
+		`make_random()` with the same random generator, unless `use_imaginary_part`
+		is True.
+
+		Parameters
+		----------
+		num_realizations : integer
+			The number of realizations to make.
+		seed : None, int, array of ints, SeedSequence, BitGenerator, Generator
+			A seed to initialize the spectral noise. If None, then fresh, unpredictable
+			entry will be pulled from the OS. If an int or array of ints, then it will
+			be passed to a numpy.SeedSequency to derive the initial BitGenerator state.
+			If a BitGenerator or Generator are passed, these will be wrapped and used
+			instead. Default: None.
+		as_generator : boolean
+			Whether to return a generator that yields the realizations one by one,
+			rather than all realizations at once. This avoids keeping all realizations
+			in memory at the same time. Default: False.
+		use_imaginary_part : boolean
+			Whether to use both the real and imaginary part of each noise realization
+			as independent realizations, as is done by `SpectralNoise.evaluate_pair()`.
+			This yields two realizations per random draw and inverse Fourier transform.
+			Default: False.
+
+		Returns
+		-------
+		Field or generator
+			The evaluated realizations, as a Field with the realization as its first
+			axis, or a generator yielding each evaluated realization as a Field.
+		'''
+		rng = np.random.default_rng(seed)
+
+		batch_memory = Configuration().spectral_noise.batch_memory * 1024**2
+		chunk_size = int(max(1, min(num_realizations, batch_memory // self._get_bytes_per_realization())))
+
+		if use_imaginary_part:
+			# Make sure that no imaginary parts are discarded halfway through the batch.
+			chunk_size = max(2, chunk_size - chunk_size % 2)
+
+		def chunks():
+			for i in range(0, num_realizations, chunk_size):
+				yield self._evaluate_random_chunk(min(chunk_size, num_realizations - i), rng, use_imaginary_part)
+
+		if as_generator:
+			return (realization for chunk in chunks() for realization in chunk)
+
+		res = Field(np.empty((num_realizations, self.output_grid.size)), self.output_grid)
+
+		i = 0
+		for chunk in chunks():
+			res[i:i + len(chunk)] = chunk
+			i += len(chunk)
+
+		return res
+
+	def _get_bytes_per_realization(self):
+		'''Estimate the memory used for evaluating a single realization in a batch.
+
+		Child classes should override this with a better estimate.
+
+		Returns
+		-------
+		integer
+			The estimated number of bytes.
+		'''
+		return 64 * self.output_grid.size
+
+	def _evaluate_random_chunk(self, num_realizations, rng, use_imaginary_part=False):
+		'''Make and evaluate a number of realizations of the spectral noise.
+
+		Child classes can override this to evaluate all realizations at once.
+
+		Parameters
+		----------
+		num_realizations : integer
+			The number of realizations to make.
+		rng : Generator
+			The random generator to use.
+		use_imaginary_part : boolean
+			Whether to use both the real and imaginary part of each noise realization.
+
+		Returns
+		-------
+		Field
+			The evaluated realizations, with the realization as its first axis.
+		'''
+		if use_imaginary_part:
+			num_noises = (num_realizations + 1) // 2
+			res = [screen for i in range(num_noises) for screen in self.make_random(rng).evaluate_pair()]
+		else:
+			res = [self.make_random(rng)() for i in range(num_realizations)]
+
+		return Field(res[:num_realizations], self.output_grid)
+
+def _interleave_real_and_imaginary_parts(screens, num_realizations):
+	'''Split complex screens into their real and imaginary parts, and interleave them.
+
+	Parameters
+	----------
+	screens : Field
+		The complex screens, with the realization as its first axis.
+	num_realizations : integer
+		The number of real screens to return.
+
+	Returns
+	-------
+	Field
+		The real screens, with the real and imaginary part of each complex screen
+		next to each other.
+	'''
+	res = np.stack((screens.real, screens.imag), axis=1).reshape((-1, screens.shape[-1]))
+
+	return Field(res[:num_realizations], screens.grid)
+
 class SpectralNoise(object):
 	'''A spectral noise object.
 
@@ -84,6 +266,58 @@ class SpectralNoise(object):
 
 		return a
 
+	def complementary(self):
+		'''Return the complementary realization of this noise.
+
+		The spectral noise is evaluated as the real part of a complex noise. The
+		imaginary part of this complex noise is an independent realization with the
+		same power spectral density. The complementary noise evaluates to this
+		imaginary part. It is shifted in the same way as ourselves.
+
+		This function needs to be implemented by the child class.
+
+		Returns
+		-------
+		SpectralNoise
+			The complementary noise.
+		'''
+		raise NotImplementedError()
+
+	def evaluate_pair(self):
+		'''Evaluate two independent realizations of the noise with a single transform.
+
+		The first realization is identical to `self()`, the second one to
+		`self.complementary()()`.
+
+		Returns
+		-------
+		tuple of Field
+			The two computed spectral noises.
+		'''
+		return self(), self.complementary()()
+
+	def evaluate_shifted(self, shift, roll_integer_pixels=False):
+		'''Evaluate the noise shifted by `shift`, without modifying ourselves.
+
+		This is equivalent to `self.shifted(shift)()`. Child classes can override
+		this to avoid making a copy of the noise for each evaluation.
+
+		Parameters
+		----------
+		shift : array_like
+			The shift in the grid axes.
+		roll_integer_pixels : boolean
+			Whether to shift the noise by whole pixels by rolling the evaluated
+			noise, rather than with a phase ramp in Fourier space. This is only
+			used by noises that are periodic on their grid and is ignored otherwise.
+
+		Returns
+		-------
+		Field
+			The computed spectral noise.
+		'''
+		return self.shifted(shift)()
+
 	def __call__(self):
 		'''Evaluate the noise on the pre-specified grid.
 
@@ -160,6 +394,26 @@ class SpectralNoiseFactoryFFT(SpectralNoiseFactory):
 
 		return SpectralNoiseFFT(self, C)
 
+	def _get_bytes_per_realization(self):
+		# The coefficients, their random draws and the intermediate arrays of the inverse FFT.
+		return 64 * self.input_grid.size + 8 * self.output_grid.size
+
+	def _evaluate_random_chunk(self, num_realizations, rng, use_imaginary_part=False):
+		N = self.input_grid.size
+		num_noises = (num_realizations + 1) // 2 if use_imaginary_part else num_realizations
+
+		# Draw the random numbers in the same order as consecutive calls to make_random().
+		Z = rng.standard_normal((num_noises, 2, N))
+
+		C = Field(np.empty((num_noises, N), dtype='complex'), self.input_grid)
+		np.multiply(Z[:, 0], self.C, out=C.real)
+		np.multiply(Z[:, 1], self.C, out=C.imag)
+
+		if use_imaginary_part:
+			return _interleave_real_and_imaginary_parts(self.fourier.backward(C), num_realizations)
+		else:
+			return self.fourier.backward_real(C)
+
 class SpectralNoiseFFT(SpectralNoise):
 	'''A single realization of FFT spectral noise.
 
@@ -176,6 +430,46 @@ class SpectralNoiseFFT(SpectralNoise):
 
 		self.coords = C.grid.separated_coords
 
+		self._buffer = None
+
+	def copy(self):
+		'''Return a copy.
+
+		The factory is shared with the copy.
+
+		Returns
+		-------
+		SpectralNoiseFFT
+			A copy of ourselves.
+		'''
+		return SpectralNoiseFFT(self.factory, self.C.copy())
+
+	def complementary(self):
+		'''Return the complementary realization of this noise.
+
+		Returns
+		-------
+		SpectralNoiseFFT
+			The noise that evaluates to the imaginary part of our complex noise.
+		'''
+		# The real part of -1j times a complex number is its imaginary part.
+		return SpectralNoiseFFT(self.factory, -1j * self.C)
+
+	def evaluate_pair(self):
+		'''Evaluate two independent realizations of the noise with a single transform.
+
+		The first realization is identical to `self()`, the second one to
+		`self.complementary()()`.
+
+		Returns
+		-------
+		tuple of Field
+			The two computed spectral noises.
+		'''
+		res = self.factory.fourier.backward(self.C)
+
+		return res.real, res.imag
+
 	def shift(self, shift):
 		'''In-place shift the noise along the grid axes.
 
@@ -184,10 +478,32 @@ class SpectralNoiseFFT(SpectralNoise):
 		shift : array_like
 			The shift in the grid axes.
 		'''
-		S = [shift[i] * self.coords[i] for i in range(len(self.coords))]
-		S = np.add.reduce(np.ix_(*S))
+		_apply_phase_ramp(self.C, self.coords, shift, self.C)
+
+	def evaluate_shifted(self, shift, roll_integer_pixels=False):
+		'''Evaluate the noise shifted by `shift`, without modifying ourselves.
+
+		The shifted spectral coefficients are written into a buffer that is
+		reused between calls.
+
+		Parameters
+		----------
+		shift : array_like
+			The shift in the grid axes.
+		roll_integer_pixels : boolean
+			Ignored, as FFT spectral noise is not periodic on its grid in general.
+
+		Returns
+		-------
+		Field
+			The computed spectral noise.
+		'''
+		if self._buffer is None:
+			self._buffer = Field(np.empty_like(self.C), self.C.grid)
 
-		self.C *= np.exp(-1j * S.ravel())
+		_apply_phase_ramp(self.C, self.coords, shift, self._buffer)
+
+		return self.factory.fourier.backward_real(self._buffer)
 
 	def __call__(self):
 		'''Evaluate the noise on the pre-specified grid.
@@ -197,7 +513,7 @@ class SpectralNoiseFFT(SpectralNoise):
 		Field
 			The computed spectral noise.
 		'''
-		return self.factory.fourier.backward(self.C).real
+		return self.factory.fourier.backward_real(self.C)
 
 class SpectralNoiseFactoryMultiscale(SpectralNoiseFactory):
 	'''A spectral noise factory based on multiscale Fourier transforms.
@@ -267,6 +583,37 @@ class SpectralNoiseFactoryMultiscale(SpectralNoiseFactory):
 
 		return SpectralNoiseMultiscale(self, C_1, C_2)
 
+	def _get_bytes_per_realization(self):
+		# The coefficients, their random draws and the intermediate arrays of the inverse transforms.
+		return 64 * (self.input_grid_1.size + self.input_grid_2.size) + 16 * self.output_grid.size
+
+	def _evaluate_random_chunk(self, num_realizations, rng, use_imaginary_part=False):
+		N_1 = self.input_grid_1.size
+		N_2 = self.input_grid_2.size
+		num_noises = (num_realizations + 1) // 2 if use_imaginary_part else num_realizations
+
+		# Draw the random numbers in the same order as consecutive calls to make_random().
+		Z = rng.standard_normal((num_noises, 2 * (N_1 + N_2)))
+
+		C_1 = Field(np.empty((num_noises, N_1), dtype='complex'), self.input_grid_1)
+		np.multiply(Z[:, :N_1], self.C_1, out=C_1.real)
+		np.multiply(Z[:, N_1:2 * N_1], self.C_1, out=C_1.imag)
+
+		C_2 = Field(np.empty((num_noises, N_2), dtype='complex'), self.input_grid_2)
+		np.multiply(Z[:, 2 * N_1:2 * N_1 + N_2], self.C_2, out=C_2.real)
+		np.multiply(Z[:, 2 * N_1 + N_2:], self.C_2, out=C_2.imag)
+
+		if use_imaginary_part:
+			ps = self.fourier_1.backward(C_1)
+			ps += self.fourier_2.backward(C_2)
+
+			return _interleave_real_and_imaginary_parts(ps, num_realizations)
+
+		ps = self.fourier_1.backward_real(C_1)
+		ps += self.fourier_2.backward_real(C_2)
+
+		return ps
+
 class SpectralNoiseMultiscale(SpectralNoise):
 	'''A single realization of multiscale spectral noise.
 
@@ -288,6 +635,51 @@ class SpectralNoiseMultiscale(SpectralNoise):
 		self.coords_1 = C_1.grid.separated_coords
 		self.coords_2 = C_2.grid.separated_coords
 
+		self._buffer_1 = None
+		self._buffer_2 = None
+
+		self._periodic_part = None
+		self._periodic_part_shift = None
+
+	def copy(self):
+		'''Return a copy.
+
+		The factory is shared with the copy.
+
+		Returns
+		-------
+		SpectralNoiseMultiscale
+			A copy of ourselves.
+		'''
+		return SpectralNoiseMultiscale(self.factory, self.C_1.copy(), self.C_2.copy())
+
+	def complementary(self):
+		'''Return the complementary realization of this noise.
+
+		Returns
+		-------
+		SpectralNoiseMultiscale
+			The noise that evaluates to the imaginary part of our complex noise.
+		'''
+		# The real part of -1j times a complex number is its imaginary part.
+		return SpectralNoiseMultiscale(self.factory, -1j * self.C_1, -1j * self.C_2)
+
+	def evaluate_pair(self):
+		'''Evaluate two independent realizations of the noise with a single transform.
+
+		The first realization is identical to `self()`, the second one to
+		`self.complementary()()`.
+
+		Returns
+		-------
+		tuple of Field
+			The two computed spectral noises.
+		'''
+		ps = self.factory.fourier_1.backward(self.C_1)
+		ps += self.factory.fourier_2.backward(self.C_2)
+
+		return ps.real, ps.imag
+
 	def shift(self, shift):
 		'''In-place shift the noise along the grid axes.
 
@@ -296,14 +688,79 @@ class SpectralNoiseMultiscale(SpectralNoise):
 		shift : array_like
 			The shift in the grid axes.
 		'''
-		S_1 = [shift[i] * self.coords_1[i] for i in range(len(self.coords_1))]
-		S_1 = sum(np.ix_(*S_1))
+		_apply_phase_ramp(self.C_1, self.coords_1, shift, self.C_1)
+		_apply_phase_ramp(self.C_2, self.coords_2, shift, self.C_2)
+
+		self._periodic_part = None
+		self._periodic_part_shift = None
+
+	def _can_roll(self):
+		'''Whether whole-pixel shifts of the high-frequency part can be done by rolling.
+
+		The high-frequency part is periodic on the output grid. Rolling is
+		only equivalent to a phase ramp if the spectral coefficients, laid out
+		along the separated coordinates, have the same shape as the output grid.
+		'''
+		grid = self.factory.output_grid
+
+		if not grid.is_regular:
+			return False
+
+		shape = tuple(len(c) for c in self.coords_1)
+
+		return shape == tuple(grid.shape)
+
+	def evaluate_shifted(self, shift, roll_integer_pixels=False):
+		'''Evaluate the noise shifted by `shift`, without modifying ourselves.
+
+		The shifted spectral coefficients are written into buffers that are
+		reused between calls.
+
+		Parameters
+		----------
+		shift : array_like
+			The shift in the grid axes.
+		roll_integer_pixels : boolean
+			Whether to shift the high-frequency part of the noise by whole pixels by
+			rolling it, rather than with a phase ramp in Fourier space. Only the
+			sub-pixel remainder of the shift is then done in Fourier space. The
+			high-frequency part is reused if the sub-pixel remainder does not change
+			between calls, which avoids its FFT altogether. The low-frequency part
+			is always shifted in Fourier space.
+
+		Returns
+		-------
+		Field
+			The computed spectral noise.
+		'''
+		if self._buffer_1 is None:
+			self._buffer_1 = Field(np.empty_like(self.C_1), self.C_1.grid)
+			self._buffer_2 = Field(np.empty_like(self.C_2), self.C_2.grid)
+
+		shift = np.array(shift, dtype='float')
+
+		if roll_integer_pixels and self._can_roll():
+			delta = self.factory.output_grid.delta
+			num_pixels, remainder = _split_integer_pixel_shift(shift, delta)
+
+			if self._periodic_part_shift is None or not np.allclose(remainder, self._periodic_part_shift, rtol=0, atol=1e-10 * np.min(delta)):
+				_apply_phase_ramp(self.C_1, self.coords_1, remainder, self._buffer_1)
+
+				self._periodic_part = self.factory.fourier_1.backward_real(self._buffer_1)
+				self._periodic_part_shift = remainder
+
+			shape = tuple(len(c) for c in self.coords_1)
+			axes = tuple(range(len(shape)))
+
+			ps = np.roll(self._periodic_part.reshape(shape), tuple(num_pixels), axis=axes).ravel()
+		else:
+			_apply_phase_ramp(self.C_1, self.coords_1, shift, self._buffer_1)
+			ps = self.factory.fourier_1.backward_real(self._buffer_1)
 
-		S_2 = [shift[i] * self.coords_2[i] for i in range(len(self.coords_2))]
-		S_2 = sum(np.ix_(*S_2))
+		_apply_phase_ramp(self.C_2, self.coords_2, shift, self._buffer_2)
+		ps = ps + self.factory.fourier_2.backward_real(self._buffer_2)
 
-		self.C_1 *= np.exp(-1j * S_1.ravel())
-		self.C_2 *= np.exp(-1j * S_2.ravel())
+		return Field(ps, self.factory.output_grid)
 
 	def __call__(self):
 		'''Evaluate the noise on the pre-specified grid.
@@ -313,7 +770,7 @@ class SpectralNoiseMultiscale(SpectralNoise):
 		Field
 			The computed spectral noise.
 		'''
-		ps = self.factory.fourier_1.backward(self.C_1).real
-		ps += self.factory.fourier_2.backward(self.C_2).real
+		ps = self.factory.fourier_1.backward_real(self.C_1)
+		ps += self.factory.fourier_2.backward_real(self.C_2)
 
 		return ps
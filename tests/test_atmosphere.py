@@ -3,6 +3,7 @@ import numpy as np
 from math import *
 import mpmath
 import scipy
+import os
 
 import pytest
 
@@ -160,6 +161,128 @@ def test_infinite_atmosphere_zernike_variances_in_depth():
     check_zernike_variances(0.5e-6, 1, 0.3, 10, True)
     check_zernike_variances(0.5e-6, 1, 0.1, 40, True)
 
+def test_infinite_atmosphere_extrusion():
+    pupil_grid = make_pupil_grid(32, 1)
+    Cn_squared = Cn_squared_from_fried_parameter(0.1, 500e-9)
+
+    layer = InfiniteAtmosphericLayer(pupil_grid, Cn_squared, 10, seed=1)
+
+    for where in ['bottom', 'top', 'left', 'right', 'top', 'top', 'right', 'bottom', 'left', 'left']:
+        screen = layer._achromatic_screen.shaped.copy()
+        layer._extrude(where)
+        new_screen = layer._achromatic_screen.shaped
+
+        # The rest of the screen should have moved by one pixel.
+        if where == 'bottom':
+            assert np.allclose(new_screen[1:, :], screen[:-1, :])
+        elif where == 'top':
+            assert np.allclose(new_screen[:-1, :], screen[1:, :])
+        elif where == 'left':
+            assert np.allclose(new_screen[:, 1:], screen[:, :-1])
+        else:
+            assert np.allclose(new_screen[:, :-1], screen[:, 1:])
+
+    # Extruding multiple rows at once should be identical to extruding them one by one.
+    layer_1 = InfiniteAtmosphericLayer(pupil_grid, Cn_squared, 10, seed=2)
+    layer_2 = InfiniteAtmosphericLayer(pupil_grid, Cn_squared, 10, seed=2)
+
+    for where, num_slices in [('top', 5), ('left', 3), ('bottom', 40), ('right', 1)]:
+        layer_1._extrude(where, num_slices)
+
+        for i in range(num_slices):
+            layer_2._extrude(where)
+
+        assert np.allclose(layer_1._achromatic_screen, layer_2._achromatic_screen)
+
+def test_infinite_atmosphere_matrix_cache(tmp_path):
+    pupil_grid = make_pupil_grid(32, 1)
+    Cn_squared = Cn_squared_from_fried_parameter(0.1, 500e-9)
+
+    cache = get_extrusion_matrix_cache()
+    cache.clear()
+    cache.reset_statistics()
+
+    Configuration().cache.directory = str(tmp_path)
+    Configuration().atmosphere.infinite_layer.use_disk_cache = True
+
+    try:
+        layer_1 = InfiniteAtmosphericLayer(pupil_grid, Cn_squared, 10, seed=1)
+        assert cache.misses == 1
+        assert len(list((tmp_path / 'infinite_atmospheric_layer').glob('*.npz'))) == 1
+
+        # A layer with the same stencils should reuse the matrices.
+        layer_2 = InfiniteAtmosphericLayer(pupil_grid, Cn_squared, 10, seed=1)
+        assert cache.hits == 1
+        assert layer_2.A_vertical is layer_1.A_vertical
+
+        # Changing the outer scale should compute new matrices, and changing it back should reuse the old ones.
+        layer_1.L0 = 20
+        assert cache.misses == 2
+        assert not np.allclose(layer_1.A_vertical, layer_2.A_vertical)
+
+        layer_1.L0 = 10
+        assert cache.hits == 2
+        assert layer_2.A_vertical is layer_1.A_vertical
+
+        # The matrices should be read back from disk.
+        cache.clear()
+        layer_3 = InfiniteAtmosphericLayer(pupil_grid, Cn_squared, 10, seed=1)
+        assert np.allclose(layer_3.A_vertical, layer_2.A_vertical)
+        assert np.allclose(layer_3.B_horizontal, layer_2.B_horizontal)
+
+        # Matrices read from disk are shared as well, so they should not be writeable.
+        assert not layer_3.A_vertical.flags.writeable
+        assert not layer_3.B_horizontal.flags.writeable
+    finally:
+        Configuration().reset()
+        cache.clear()
+
+def test_finite_atmosphere_shift():
+    pupil_grid = make_pupil_grid(64, 1)
+    velocity = np.array([3, -2]) * pupil_grid.delta
+
+    layer = FiniteAtmosphericLayer(pupil_grid, 1e-13, 10, velocity, seed=1)
+    layer_roll = FiniteAtmosphericLayer(pupil_grid, 1e-13, 10, velocity, seed=1, roll_integer_pixels=True)
+
+    noise = layer.noise.copy()
+
+    for t in [0, 1, 2.5, 7, 7.3]:
+        layer.t = t
+        layer_roll.t = t
+
+        # Evaluating the shifted noise should not modify the noise itself.
+        reference = layer.noise.shifted(layer.center)()
+        assert np.allclose(layer.noise.C_1, noise.C_1)
+        assert np.allclose(layer.noise.C_2, noise.C_2)
+
+        assert np.allclose(layer.phase_for(1), reference)
+        assert np.allclose(layer_roll.phase_for(1), reference)
+
+def test_finite_atmosphere_imaginary_part():
+    pupil_grid = make_pupil_grid(32, 1)
+
+    layer = FiniteAtmosphericLayer(pupil_grid, 1e-13, 10, [1, 0], seed=1, use_imaginary_part=True)
+    noise = layer.noise
+
+    phase_1 = layer.phase_for(1)
+    assert np.allclose(phase_1, noise())
+
+    # The first independent realization should be the imaginary part of the same noise.
+    layer.reset(make_independent_realization=True)
+    layer.t = 0.1
+    phase_2 = layer.phase_for(1)
+    assert np.allclose(phase_2, noise.complementary().shifted(layer.center)())
+
+    layer.reset(make_independent_realization=False)
+    layer.t = 0.1
+    assert np.allclose(layer.phase_for(1), phase_2)
+
+    # The second one should be a new noise.
+    layer.reset(make_independent_realization=True)
+    phase_3 = layer.phase_for(1)
+    assert not np.allclose(phase_3, phase_1)
+    assert np.allclose(phase_3, layer.noise.shifted(layer.center)())
+
 @pytest.mark.parametrize('layer_cls', [InfiniteAtmosphericLayer, FiniteAtmosphericLayer])
 def test_atmospheric_layer_reset(layer_cls):
     fried_parameter = 0.3  # meter
@@ -277,3 +400,210 @@ def test_phase_covariance_phase_structure_function_von_karman():
             phase_structure_function_from_covariance = 2 * (phase_covariance.max() - phase_covariance)
 
             assert np.allclose(phase_structure_function_from_covariance, phase_structure_function)
+
+def test_multi_layer_atmosphere_threads():
+    pupil_grid = make_pupil_grid(64, 1.5)
+    wavelength = 500e-9
+
+    atmospheres = []
+    for num_threads in [1, 4]:
+        layers = [InfiniteAtmosphericLayer(pupil_grid, 1e-13, 10, [10 * i, 5], height=1000 * i, seed=i) for i in range(5)]
+        atmospheres.append(MultiLayerAtmosphere(layers, num_threads=num_threads))
+
+    for t in [0, 0.01, 0.05]:
+        phases = []
+        for atmosphere in atmospheres:
+            atmosphere.t = t
+            phases.append(atmosphere.phase_for(wavelength))
+
+        reference = sum(layer.phase_for(wavelength) for layer in atmospheres[0].layers)
+
+        assert np.allclose(phases[0], reference)
+        assert np.allclose(phases[1], reference)
+        assert phases[1].grid == pupil_grid
+
+def _evolve_threaded_atmosphere():
+    pupil_grid = make_pupil_grid(32, 1.5)
+
+    atmosphere = MultiLayerAtmosphere(make_standard_atmospheric_layers(pupil_grid, seed=1), num_threads=2)
+    atmosphere.t = 0.01
+
+    return atmosphere.phase_for(500e-9)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Forking is not supported on this platform.')
+def test_multi_layer_atmosphere_threads_after_fork():
+    import multiprocessing
+
+    # This creates the thread pool in this process.
+    phase = _evolve_threaded_atmosphere()
+
+    # A forked child should not use the thread pool of its parent.
+    process = multiprocessing.get_context('fork').Process(target=_evolve_threaded_atmosphere)
+    process.start()
+    process.join(60)
+
+    if process.is_alive():
+        process.terminate()
+        process.join()
+
+        assert False, 'The forked child did not finish.'
+
+    assert process.exitcode == 0
+    assert np.allclose(phase, _evolve_threaded_atmosphere())
+
+def test_multi_layer_atmosphere_fused_propagation():
+    pupil_grid = make_pupil_grid(64, 1.5)
+    wavelength = 500e-9
+
+    layers = [InfiniteAtmosphericLayer(pupil_grid, 1e-13, 10, [10 * i, 5], height=1000 * i, seed=i) for i in range(3)]
+    atmosphere = MultiLayerAtmosphere(layers, scintillation=False)
+    atmosphere.t = 0.01
+
+    aperture = make_circular_aperture(1.5)(pupil_grid)
+
+    for input_stokes_vector in [None, [1, 0.3, 0, 0]]:
+        wf = Wavefront(aperture, wavelength, input_stokes_vector)
+
+        # Reference propagation through each layer separately.
+        wf_reference = wf
+        for layer in layers:
+            wf_reference = layer.forward(wf_reference)
+
+        wf_out = atmosphere.forward(wf)
+        assert np.allclose(wf_out.electric_field, wf_reference.electric_field)
+
+        # The input wavefront should not be modified.
+        assert np.allclose(wf.electric_field, Wavefront(aperture, wavelength, input_stokes_vector).electric_field)
+
+        wf_back = atmosphere.backward(wf_out)
+        assert np.allclose(wf_back.electric_field, wf.electric_field)
+
+def test_stored_atmospheric_layer(tmp_path):
+    pupil_grid = make_pupil_grid(64, 1)
+    screen_grid = make_uniform_grid([512, 512], 8)
+    Cn_squared = Cn_squared_from_fried_parameter(0.1, 500e-9)
+
+    filename = str(tmp_path / 'screen.npy')
+    screen = make_phase_screen_archive(filename, screen_grid, Cn_squared, 20, seed=1)
+    assert not screen.flags.writeable
+
+    screen_read, Cn_squared_read, L0_read = read_phase_screen_archive(filename)
+    assert screen_read.grid == screen_grid
+    assert np.isclose(Cn_squared_read, Cn_squared)
+    assert L0_read == 20
+
+    # The pupil is located at pixel 224 in the screen.
+    reference = screen.shaped[224:288, 224:288]
+
+    for use_interpolation in [True, False]:
+        layer = StoredAtmosphericLayer(pupil_grid, filename, velocity=[1, 0], use_interpolation=use_interpolation)
+        assert np.allclose(layer.phase_for(2).shaped, reference / 2)
+
+        # Shift by three pixels along x.
+        layer.t = 3 * pupil_grid.delta[0]
+        assert np.allclose(layer.phase_for(1).shaped, screen.shaped[224:288, 221:285])
+
+        # Rescaling the Cn^2 should rescale the phase.
+        layer.Cn_squared = 4 * Cn_squared
+        assert np.allclose(layer.phase_for(1).shaped, 2 * screen.shaped[224:288, 221:285])
+
+        layer.reset()
+        assert np.allclose(layer.phase_for(1).shaped, 2 * reference)
+
+    # Half a pixel shift should interpolate between pixels.
+    layer = StoredAtmosphericLayer(pupil_grid, filename, velocity=[0, 1])
+    layer.t = 0.5 * pupil_grid.delta[1]
+    assert np.allclose(layer.phase_for(1).shaped, (screen.shaped[223:287, 224:288] + reference) / 2)
+
+    # The screen should wrap around.
+    layer.t = 1000
+    assert np.all(np.isfinite(layer.phase_for(1)))
+
+    # Independent realizations start at a different position.
+    layer.reset(make_independent_realization=True)
+    assert not np.allclose(layer.phase_for(1).shaped, reference)
+
+    with pytest.raises(ValueError):
+        layer.L0 = 10
+
+    with pytest.raises(ValueError):
+        StoredAtmosphericLayer(make_pupil_grid(32, 1), filename)
+
+def _make_monte_carlo_atmosphere(seed):
+    pupil_grid = make_pupil_grid(16, 1)
+    return MultiLayerAtmosphere(make_standard_atmospheric_layers(pupil_grid, seed=seed))
+
+def _make_threaded_monte_carlo_atmosphere(seed):
+    pupil_grid = make_pupil_grid(16, 1)
+    return MultiLayerAtmosphere(make_standard_atmospheric_layers(pupil_grid, seed=seed), num_threads=2)
+
+def _evaluate_monte_carlo_realization(optical_system, atmosphere):
+    atmosphere.t = 0.01
+    phase = atmosphere.phase_for(1e-6)
+
+    return {'variance': np.var(phase), 'squared_phase': phase**2}
+
+def test_monte_carlo():
+    pupil_grid = make_pupil_grid(16, 1)
+
+    # Seeded standard atmospheres should be reproducible, with independent layers.
+    layers_1 = make_standard_atmospheric_layers(pupil_grid, seed=1)
+    layers_2 = make_standard_atmospheric_layers(pupil_grid, seed=1)
+    for layer_1, layer_2 in zip(layers_1, layers_2):
+        assert np.allclose(layer_1.phase_for(1), layer_2.phase_for(1))
+    assert not np.allclose(layers_1[0].phase_for(1) / layers_1[0].Cn_squared, layers_1[1].phase_for(1) / layers_1[1].Cn_squared)
+
+    results = []
+    for num_processes in [1, 2]:
+        res = run_monte_carlo(_evaluate_monte_carlo_realization, _make_monte_carlo_atmosphere, 12, seed=2, num_processes=num_processes, num_realizations_per_task=5, return_variance=True)
+        results.append(res)
+
+    mean, variance = results[0]
+    assert mean['squared_phase'].grid is not None
+    assert mean['squared_phase'].shape == (pupil_grid.size,)
+    assert variance['variance'] > 0
+
+    # The results should not depend on the number of processes.
+    for key in ['variance', 'squared_phase']:
+        assert np.array_equal(results[0][0][key], results[1][0][key])
+        assert np.array_equal(results[0][1][key], results[1][1][key])
+
+    # The mean should be the average over the individual realizations.
+    seeds = np.random.SeedSequence(2).spawn(12)
+    variances = [_evaluate_monte_carlo_realization(None, _make_monte_carlo_atmosphere(seed))['variance'] for seed in seeds]
+    assert np.allclose(mean['variance'], np.mean(variances))
+    assert np.allclose(variance['variance'], np.var(variances))
+
+    # Reusing the atmosphere should not compute new extrusion matrices for each realization.
+    num_layers = len(_make_monte_carlo_atmosphere(None).layers)
+
+    cache = get_extrusion_matrix_cache()
+    cache.clear()
+    cache.reset_statistics()
+
+    results = []
+    for num_processes in [1, 2]:
+        res = run_monte_carlo(_evaluate_monte_carlo_realization, _make_monte_carlo_atmosphere, 12, seed=2, num_processes=num_processes, num_realizations_per_task=5, return_variance=True, reuse_atmosphere=True)
+        results.append(res)
+
+    # Only the worker in this process adds to the cache of this process.
+    assert cache.misses == num_layers
+    assert results[0][1]['variance'] > 0
+
+    for key in ['variance', 'squared_phase']:
+        assert np.array_equal(results[0][0][key], results[1][0][key])
+        assert np.array_equal(results[0][1][key], results[1][1][key])
+
+def test_monte_carlo_threaded_atmosphere():
+    # Evolving a threaded atmosphere creates a thread pool in this process, which
+    # should not be used by the worker processes.
+    atmosphere = _make_threaded_monte_carlo_atmosphere(1)
+    atmosphere.t = 0.01
+
+    results = []
+    for num_processes in [1, 2]:
+        res = run_monte_carlo(_evaluate_monte_carlo_realization, _make_threaded_monte_carlo_atmosphere, 4, seed=2, num_processes=num_processes, num_realizations_per_task=2)
+        results.append(res)
+
+    for key in ['variance', 'squared_phase']:
+        assert np.array_equal(results[0][key], results[1][key])
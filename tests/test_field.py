@@ -238,6 +238,29 @@ def test_grid_hashing_and_comparison():
     assert grid1 != 0
     assert grid1 != 'string'
 
+def test_grid_hash_invalidation():
+    for grid in [make_pupil_grid(16), make_pupil_grid(16).as_('polar'), CartesianGrid(UnstructuredCoords(make_pupil_grid(16).coords))]:
+        grid = grid.copy()
+
+        h = hash(grid)
+        assert hash(grid) == h
+        assert grid == grid
+
+        # In-place transformations should change the hash.
+        for transform in [lambda g: g.shift([0.1, 0.2]), lambda g: g.scale(2), lambda g: g.rotate(0.3), lambda g: g.reverse()]:
+            reference = transform(grid.copy())
+            transform(grid)
+
+            assert hash(grid) != h
+            assert hash(grid) == hash(reference)
+            assert grid == reference
+
+            h = hash(grid)
+
+        # Assigning new coordinates should change the hash.
+        grid.coords = make_pupil_grid(8).coords
+        assert hash(grid) != h
+
 def test_grid_supersampled():
     g = make_uniform_grid(128, [1, 1])
     g2 = make_supersampled_grid(g, 4)
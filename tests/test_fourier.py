@@ -176,6 +176,37 @@ def test_make_fourier_transform():
     assert ft.input_grid == input_grid
     assert ft.output_grid == output_grid
 
+    # Large zooms should use a ZoomFFT.
+    input_grid = make_pupil_grid(2048)
+    output_grid = make_uniform_grid([1024, 1024], 1000)
+    ft = make_fourier_transform(input_grid, output_grid, planner='estimate')
+    assert type(ft) == ZoomFastFourierTransform
+
+    # Three-dimensional non-FFT output grids can only be done by ZoomFFT or naive transforms.
+    input_grid = make_uniform_grid([32, 32, 32], 1)
+    output_grid = make_uniform_grid([32, 32, 32], 10)
+    ft = make_fourier_transform(input_grid, output_grid, planner='estimate')
+    assert type(ft) == ZoomFastFourierTransform
+
+    output_grid = make_uniform_grid([2, 2, 2], 10)
+    ft = make_fourier_transform(input_grid, output_grid, planner='estimate')
+    assert type(ft) == NaiveFourierTransform
+
+    with pytest.raises(ValueError):
+        make_fourier_transform(input_grid, output_grid, planner='nonexistent_planner')
+
+    # Unknown planners should also be rejected when there is only a single candidate.
+    with pytest.raises(ValueError):
+        make_fourier_transform(input_grid, planner='nonexistent_planner')
+
+    # Native FFT grids should keep the FFT/MFT decisions of the plain complexity estimates.
+    for num_pix, q, fov, method in [(32, 1, 1, FastFourierTransform), (64, 2, 1, FastFourierTransform), (128, 2, 0.5, FastFourierTransform), (256, 2, 0.5, FastFourierTransform), (512, 4, 0.25, FastFourierTransform), (1024, 4, 0.25, FastFourierTransform), (256, 8, 0.1, MatrixFourierTransform)]:
+        ft = make_fourier_transform(make_pupil_grid(num_pix), q=q, fov=fov, planner='estimate')
+        assert type(ft) == method
+
+    ft = make_fourier_transform(make_uniform_grid([16, 16, 16], 1), q=2, fov=0.25, planner='estimate')
+    assert type(ft) == FastFourierTransform
+
 def test_fft_grid_reconstruction():
     for shift_input in [[0, 0], [0.1]]:
             for scale in [1, 2]:
@@ -328,3 +359,255 @@ def test_chirp_z_transform(dtype):
         a = np.exp(1j * np.random.uniform(0, 2 * np.pi))
 
         check_czt_vs_scipy(x, m, w, a, dtype)
+
+@pytest.mark.parametrize('backend', ['numpy', 'scipy', 'pyfftw', 'mkl'])
+def test_fft_backends(backend):
+    try:
+        fft_backend = get_fft_backend(backend, 2)
+    except ImportError:
+        pytest.skip(f'FFT backend "{backend}" is not installed.')
+
+    x = np.random.randn(16, 32) + 1j * np.random.randn(16, 32)
+
+    assert np.allclose(fft_backend.fftn(x), np.fft.fftn(x))
+    assert np.allclose(fft_backend.ifftn(x), np.fft.ifftn(x))
+    assert np.allclose(fft_backend.fftn(x, axes=(-1,)), np.fft.fftn(x, axes=(-1,)))
+    assert np.allclose(fft_backend.fft(x, 64, axis=0), np.fft.fft(x, 64, axis=0))
+    assert np.allclose(fft_backend.ifft(x, 8), np.fft.ifft(x, 8))
+
+    # Check that all Fourier transforms give the same results with this backend.
+    input_grid = make_pupil_grid(32)
+    aperture = make_circular_aperture(1)(input_grid)
+    fft = FastFourierTransform(input_grid, q=2, fov=0.5)
+    mft = MatrixFourierTransform(input_grid, fft.output_grid)
+
+    Configuration().fourier.fft.backend = backend
+    try:
+        assert np.allclose(fft.forward(aperture), mft.forward(aperture))
+    finally:
+        Configuration().reset()
+
+    with pytest.raises(ValueError):
+        get_fft_backend('nonexistent_backend', 1)
+
+class _ComplexOnlyFFTBackend(FFTBackend):
+    def fft(self, x, n=None, axis=-1, overwrite_x=False):
+        return np.fft.fft(x, n=n, axis=axis)
+
+    def ifft(self, x, n=None, axis=-1, overwrite_x=False):
+        return np.fft.ifft(x, n=n, axis=axis)
+
+    def fftn(self, x, axes=None, overwrite_x=False):
+        return np.fft.fftn(x, axes=axes)
+
+    def ifftn(self, x, axes=None, overwrite_x=False):
+        return np.fft.ifftn(x, axes=axes)
+
+def test_fft_backend_without_real_transforms():
+    register_fft_backend('complex_only', _ComplexOnlyFFTBackend)
+    fft_backend = get_fft_backend('complex_only', 1)
+
+    x = np.random.randn(8, 16, 15)
+
+    for axes in [(1, 2), (2,), (0, 1)]:
+        y = np.fft.rfftn(x, axes=axes)
+        s = tuple(x.shape[axis] for axis in axes)
+
+        assert np.allclose(fft_backend.rfftn(x, axes=axes), y)
+        assert np.allclose(fft_backend.irfftn(y, s=s, axes=axes), x)
+
+    # Real fields should be Fourier transformed using the complex transforms.
+    input_grid = make_pupil_grid(32)
+    aperture = make_circular_aperture(1)(input_grid)
+    fft = FastFourierTransform(input_grid)
+
+    reference = fft.forward(aperture)
+    reference_real = fft.backward_real(reference)
+
+    Configuration().fourier.fft.backend = 'complex_only'
+    try:
+        assert np.allclose(fft.forward(aperture), reference)
+        assert np.allclose(fft.backward_real(reference), reference_real)
+    finally:
+        Configuration().reset()
+
+@pytest.mark.parametrize('dtype', ['complex128', 'complex64'])
+def test_fourier_tensor_fields(dtype):
+    np.random.seed(0)
+
+    tol = 1e-12 if dtype == 'complex128' else 1e-5
+
+    for dims in [64, [8, 8], [9, 18]]:
+        input_grid = make_uniform_grid(dims, 1)
+        fourier_transforms = make_all_fourier_transforms(input_grid, q=2, fov=0.8, shift=0.1)
+
+        for tensor_shape in [(3,), (2, 2)]:
+            shape = tensor_shape + (input_grid.size,)
+            f_in = Field(np.random.randn(*shape) + 1j * np.random.randn(*shape), input_grid).astype(dtype)
+
+            for ft in fourier_transforms:
+                f_out = ft.forward(f_in)
+                f_back = ft.backward(f_out)
+
+                assert f_out.shape == tensor_shape + (ft.output_grid.size,)
+                assert f_back.shape == f_in.shape
+
+                # Compare against transforming each tensor element separately.
+                for index in np.ndindex(*tensor_shape):
+                    f_out_scalar = ft.forward(f_in[index])
+
+                    assert np.allclose(f_out[index], f_out_scalar, atol=tol * np.abs(f_out_scalar).max())
+                    assert np.allclose(f_back[index], ft.backward(f_out_scalar), atol=tol * np.abs(f_in).max())
+
+def test_fft_single_precision():
+    input_grid = make_pupil_grid(64)
+    aperture = make_circular_aperture(1)(input_grid)
+
+    fft = FastFourierTransform(input_grid, q=2, fov=0.75, shift=0.1)
+
+    res_double = fft.forward(aperture.astype('float64'))
+    assert fft.internal_array.dtype == np.dtype('complex128')
+
+    res_single = fft.forward(aperture.astype('float32'))
+    assert fft.internal_array.dtype == np.dtype('complex64')
+    assert res_single.dtype == np.dtype('complex64')
+
+    assert np.allclose(res_single, res_double, atol=1e-5 * np.abs(res_double).max())
+
+    back_single = fft.backward(res_single)
+    assert back_single.dtype == np.dtype('complex64')
+    assert np.allclose(back_single, fft.backward(res_double), atol=1e-5)
+
+def test_fourier_wisdom(tmp_path, monkeypatch):
+    import hcipy.fourier.fourier_transform
+
+    input_grid = make_pupil_grid(64)
+
+    forget_fourier_wisdom()
+    Configuration().cache.directory = str(tmp_path)
+    Configuration().fourier.planner.use_disk_cache = True
+
+    try:
+        ft = make_fourier_transform(input_grid, q=2, fov=0.5, planner='measure')
+        assert (tmp_path / 'fourier_wisdom.json').exists()
+
+        # The second call should reuse the decision of the first call without timing
+        # the Fourier transforms again, even after forgetting the in-memory wisdom.
+        def time_it(*args, **kwargs):
+            raise AssertionError('The Fourier transforms should not be timed again.')
+
+        monkeypatch.setattr(hcipy.fourier.fourier_transform, '_time_it', time_it)
+
+        forget_fourier_wisdom()
+        ft2 = make_fourier_transform(input_grid, q=2, fov=0.5, planner='measure')
+        assert type(ft2) == type(ft)
+
+        # Another FFT backend should not reuse the decision.
+        Configuration().fourier.fft.backend = 'numpy'
+
+        with pytest.raises(AssertionError):
+            make_fourier_transform(input_grid, q=2, fov=0.5, planner='measure')
+
+        export_fourier_wisdom(tmp_path / 'exported_wisdom.json')
+        forget_fourier_wisdom()
+        import_fourier_wisdom(tmp_path / 'exported_wisdom.json')
+    finally:
+        Configuration().reset()
+        forget_fourier_wisdom()
+
+def test_fftw_disk_wisdom(tmp_path):
+    pyfftw = pytest.importorskip('pyfftw')
+    from hcipy.fourier.fft_backends import PyFFTWBackend
+
+    Configuration().cache.directory = str(tmp_path)
+    Configuration().fourier.fft.pyfftw_use_disk_cache = True
+    Configuration().fourier.fft.pyfftw_planner_effort = 'FFTW_ESTIMATE'
+
+    try:
+        x = np.random.randn(16, 32) + 1j * np.random.randn(16, 32)
+
+        pyfftw.forget_wisdom()
+        backend = PyFFTWBackend()
+        assert np.allclose(backend.fftn(x, axes=[0, 1]), np.fft.fftn(x))
+        assert (tmp_path / 'fftw_wisdom.pickle').exists()
+
+        # A new backend should import the wisdom from disk.
+        wisdom = pyfftw.export_wisdom()
+        pyfftw.forget_wisdom()
+        PyFFTWBackend()
+        for imported, exported in zip(pyfftw.export_wisdom(), wisdom):
+            assert set(imported.splitlines()) == set(exported.splitlines())
+    finally:
+        Configuration().reset()
+        pyfftw.forget_wisdom()
+
+def test_mft_matrix_cache():
+    input_grid = make_pupil_grid(64)
+    output_grid = make_fft_grid(input_grid, 4, 0.3)
+
+    cache = get_mft_matrix_cache()
+    cache.clear()
+    cache.reset_statistics()
+
+    mft1 = MatrixFourierTransform(input_grid, output_grid, precompute_matrices=True)
+    mft2 = MatrixFourierTransform(input_grid, output_grid, precompute_matrices=True)
+
+    f = input_grid.ones()
+    res1 = mft1.forward(f)
+    assert cache.misses == 2
+    assert cache.nbytes == mft1.M1.nbytes + mft1.M2.nbytes
+
+    res2 = mft2.forward(f)
+    assert cache.hits == 2
+    assert mft1.M1 is mft2.M1
+    assert np.allclose(res1, res2)
+
+    # Transforms without precomputed matrices should reuse cached matrices, but not add their own.
+    mft4 = MatrixFourierTransform(input_grid, output_grid, precompute_matrices=False)
+    assert np.allclose(mft4.forward(f), res1)
+    assert cache.hits == 4
+
+    mft5 = MatrixFourierTransform(input_grid, make_fft_grid(input_grid, 4, 0.2), precompute_matrices=False)
+    mft5.forward(f)
+    assert len(cache) == 2
+
+    # A budget smaller than a single matrix disables caching, but transforms should still work.
+    max_bytes = cache.max_bytes
+    try:
+        cache.max_bytes = 1
+        assert len(cache) == 0
+        assert cache.evictions == 2
+
+        mft3 = MatrixFourierTransform(input_grid, output_grid, precompute_matrices=False)
+        assert np.allclose(mft3.forward(f), res1)
+        assert len(cache) == 0
+    finally:
+        cache.max_bytes = max_bytes
+
+def test_fft_real_transforms():
+    np.random.seed(0)
+
+    for dims in [64, 65, [8, 8], [9, 18], [4, 5, 6]]:
+        for q in [1, 1.23, 2]:
+            for fov in [1, 0.5]:
+                for emulate_fftshifts in [True, False]:
+                    input_grid = make_uniform_grid(dims, 1, has_center=True).shifted(0.1)
+                    fft = FastFourierTransform(input_grid, q, fov, emulate_fftshifts=emulate_fftshifts)
+                    fft_shifted = FastFourierTransform(input_grid, q, fov, shift=0.1, emulate_fftshifts=emulate_fftshifts)
+
+                    f_in = Field(np.random.randn(2, input_grid.size), input_grid)
+
+                    # Real-to-complex transform should match the full complex transform.
+                    f_out = fft.forward(f_in)
+                    assert np.allclose(f_out, fft.forward(f_in + 0j))
+
+                    # Complex-to-real transform should match the real part of the full inverse transform.
+                    f_out = Field(np.random.randn(*f_out.shape) + 1j * np.random.randn(*f_out.shape), fft.output_grid)
+                    f_back = fft.backward_real(f_out)
+                    assert np.isrealobj(f_back)
+                    assert np.allclose(f_back, fft.backward(f_out).real)
+
+                    # Shifted output grids fall back to complex transforms.
+                    f_out = fft_shifted.forward(f_in)
+                    assert np.allclose(f_out, fft_shifted.forward(f_in + 0j))
+                    assert np.allclose(fft_shifted.backward_real(f_out), fft_shifted.backward(f_out).real)
@@ -289,6 +289,72 @@ def test_wavefront_stokes():
     assert np.allclose(jones_element_forward.U, mueller_forward[2])
     assert np.allclose(jones_element_forward.V, mueller_forward[3])
 
+def test_wavefront_copy():
+    grid = make_pupil_grid(16)
+
+    wf = Wavefront(grid.ones(), wavelength=2, input_stokes_vector=[1, 0.5, 0, 0])
+    wf_copy = wf.copy()
+
+    # The grid is shared, not copied.
+    assert wf_copy.grid is wf.grid
+    assert wf_copy.wavelength == wf.wavelength
+    assert np.allclose(wf_copy.input_stokes_vector, wf.input_stokes_vector)
+    assert wf_copy.input_stokes_vector is not wf.input_stokes_vector
+
+    wf = Wavefront(grid.ones())
+    wf_copy = wf.copy()
+
+    # Writing to the copy should not change the original.
+    wf_copy.electric_field *= 2
+    assert np.allclose(wf.electric_field, 1)
+    assert np.allclose(wf_copy.electric_field, 2)
+
+    # Writing to the original should not change the copy.
+    wf_copy_2 = wf.copy()
+    wf.electric_field *= 3
+    assert np.allclose(wf.electric_field, 3)
+    assert np.allclose(wf_copy_2.electric_field, 1)
+
+    # Changing the grid on the electric field of a copy should not change the original.
+    wf_copy_3 = wf.copy()
+    wf_copy_3.electric_field.grid = grid.scaled(2)
+    assert wf.grid is grid
+    assert wf_copy_3.grid is not grid
+
+    # Replacing the electric field should not affect other copies.
+    wf_copy_4 = wf.copy()
+    wf_copy_4.electric_field = grid.zeros()
+    assert np.allclose(wf.electric_field, 3)
+    assert np.allclose(wf_copy_4.electric_field, 0)
+
+    # Modifying the original field array in-place should not change a copy.
+    E = grid.ones(dtype='complex')
+    wf = Wavefront(E)
+    wf_copy_5 = wf.copy()
+    E *= 5
+    assert np.allclose(wf.electric_field, 5)
+    assert np.allclose(wf_copy_5.electric_field, 1)
+    assert wf_copy_5.electric_field.grid is grid
+
+def test_power_law_error():
+    grid = make_pupil_grid(32, 1)
+    aperture = make_circular_aperture(1)(grid)
+
+    surface = make_power_law_error(grid, 1e-8, 1, seed=1)
+    assert surface.shape == (grid.size,)
+    assert np.allclose(np.ptp(surface[aperture != 0]), 1e-8)
+    assert np.allclose(surface / 1e-8, make_power_law_error(grid, 1e-8, 1, seed=1) / 1e-8)
+
+    surfaces = make_power_law_error(grid, 1e-8, 1, num_realizations=5, seed=1)
+    assert surfaces.shape == (5, grid.size)
+    assert surfaces.grid is grid
+    assert np.allclose(np.ptp(surfaces[:, aperture != 0], axis=-1), 1e-8)
+    assert np.all(surfaces[:, aperture == 0] == 0)
+
+    # All surfaces should be different.
+    for i in range(4):
+        assert not np.allclose(surfaces[i] / 1e-8, surfaces[i + 1] / 1e-8)
+
 def test_degree_and_angle_of_polarization():
     grid = make_pupil_grid(16)
 
@@ -596,6 +662,314 @@ def test_pickle_optical_element():
 
         os.remove(fname)
 
+def test_optical_system_compile():
+    import dill as pickle
+
+    pupil_grid = make_pupil_grid(64, 1)
+    focal_grid = make_focal_grid(4, 8)
+
+    aperture = make_circular_aperture(1)(pupil_grid)
+    dm = DeformableMirror(make_gaussian_influence_functions(pupil_grid, 8, 1 / 8))
+    dm.random(1e-8)
+    layer = InfiniteAtmosphericLayer(pupil_grid, Cn_squared_from_fried_parameter(0.2), 10, seed=1)
+    apodizer = Apodizer(aperture)
+
+    elements = [apodizer, dm, PhaseApodizer(pupil_grid.x), FraunhoferPropagator(pupil_grid, focal_grid)]
+    optical_system = OpticalSystem([layer, OpticalSystem(elements[:2]), SurfaceApodizer(pupil_grid.y * 1e-7, 1.5)] + elements[2:])
+    compiled = optical_system.compile()
+
+    # The nested optical system should be flattened and all pointwise elements fused.
+    assert len(compiled.optical_elements) == 2
+    assert isinstance(compiled.optical_elements[0], FusedOpticalElement)
+    assert len(compiled.optical_elements[0].optical_elements) == 5
+    assert compiled.optical_elements[1] is elements[-1]
+
+    def check():
+        for stokes_vector in [None, [1, 0.5, 0, 0]]:
+            wf = Wavefront(aperture, 1e-6, input_stokes_vector=stokes_vector)
+            assert np.allclose(compiled.forward(wf).electric_field, optical_system.forward(wf).electric_field)
+
+            wf = Wavefront(focal_grid.ones(), 1e-6, input_stokes_vector=stokes_vector)
+            assert np.allclose(compiled.backward(wf).electric_field, optical_system.backward(wf).electric_field)
+
+    check()
+
+    # Changes to the optical elements should be taken into account.
+    dm.random(1e-8)
+    apodizer.apodization = aperture * 0.5
+    layer.t = 0.01
+    check()
+
+    # Combined transmissions should not keep the instance data of the optical elements alive.
+    fused = compiled.optical_elements[0]
+    assert len(fused._static_transmission_cache) > 0
+
+    apodizer.clear_cache()
+    assert len(fused._static_transmission_cache) == 0
+    check()
+
+    # The input wavefront should not be modified.
+    wf = Wavefront(aperture, 1e-6)
+    compiled(wf)
+    assert np.allclose(wf.electric_field, aperture)
+
+    # Compiled optical systems should be picklable.
+    compiled_loaded = pickle.loads(pickle.dumps(compiled))
+    wf = Wavefront(aperture, 1e-6)
+    assert np.allclose(compiled_loaded(wf).electric_field, compiled(wf).electric_field)
+
+def test_instance_cache():
+    class ArrayElement(AgnosticOpticalElement):
+        def __init__(self, max_bytes_in_cache=None):
+            AgnosticOpticalElement.__init__(self, False, True, max_bytes_in_cache=max_bytes_in_cache)
+
+        def make_instance(self, instance_data, input_grid, output_grid, wavelength):
+            instance_data.array = np.zeros(1000 * int(wavelength))
+
+    # Each instance holds 8000 bytes per unit of wavelength.
+    element = ArrayElement(max_bytes_in_cache=20000)
+
+    for wavelength in [1, 1, 1.5, 1, 1.2]:
+        element.array(wavelength=wavelength)
+
+    # The least recently used instance should have been evicted.
+    assert element.cache_statistics == {'hits': 2, 'misses': 3, 'evictions': 1, 'entries': 2, 'nbytes': 16000}
+
+    element.array(wavelength=1)
+    assert element.cache_statistics['hits'] == 3
+
+    element.array(wavelength=1.5)
+    assert element.cache_statistics['misses'] == 4
+
+    # An instance that is larger than the budget should not be stored.
+    assert len(element.array(wavelength=3)) == 3000
+    assert element.cache_statistics['entries'] == 2
+    assert element.cache_statistics['nbytes'] == 16000
+
+    # Clearing the cache should keep the statistics.
+    element.clear_cache()
+    assert element.cache_statistics['entries'] == 0
+    assert element.cache_statistics['misses'] == 5
+
+    # Test the budget for all optical elements combined.
+    global_cache = get_instance_data_cache()
+    max_bytes = global_cache.max_bytes
+
+    try:
+        global_cache.max_bytes = 0
+        global_cache.max_bytes = 20000
+
+        elements = [ArrayElement(), ArrayElement()]
+
+        elements[0].array(wavelength=1)
+        elements[1].array(wavelength=1)
+        elements[0].array(wavelength=1)
+        elements[1].array(wavelength=1.5)
+
+        assert elements[0].cache_statistics['entries'] == 1
+        assert elements[1].cache_statistics['entries'] == 1
+        assert elements[1].cache_statistics['evictions'] == 1
+        assert global_cache.nbytes == 16000
+
+        # Released optical elements should release their part of the global cache.
+        del elements
+        assert len(global_cache) == 0
+    finally:
+        global_cache.max_bytes = max_bytes
+
+def test_instance_cache_lazy_instances():
+    class LazyElement(AgnosticOpticalElement):
+        def __init__(self):
+            AgnosticOpticalElement.__init__(self, True, True)
+
+        def make_instance(self, instance_data, input_grid, output_grid, wavelength):
+            instance_data.array = None
+
+        @make_agnostic_forward
+        def forward(self, instance_data, wavefront):
+            if instance_data.array is None:
+                instance_data.array = np.ones(1000)
+
+            return wavefront
+
+    element = LazyElement()
+    grid = make_pupil_grid(16)
+
+    # The size should be measured after the first propagation, rather than on the first reuse.
+    element.forward(Wavefront(grid.ones(), 1))
+    assert element.cache_statistics['nbytes'] == 8000
+
+    element.forward(Wavefront(grid.ones(), 2))
+    assert element.cache_statistics['nbytes'] == 16000
+    assert get_instance_data_cache().nbytes >= 16000
+
+def test_instance_cache_threads():
+    import concurrent.futures
+    import time
+
+    class SlowElement(AgnosticOpticalElement):
+        def __init__(self, wavelength_dependent, max_bytes_in_cache=None):
+            AgnosticOpticalElement.__init__(self, False, wavelength_dependent, max_bytes_in_cache=max_bytes_in_cache)
+            self.num_instances = 0
+
+        def make_instance(self, instance_data, input_grid, output_grid, wavelength):
+            self.num_instances += 1
+            time.sleep(0.01)
+
+            instance_data.array = np.zeros(1000 * int(wavelength))
+
+    # Concurrent lookups of the same instance should create it only once.
+    element = SlowElement(False)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda wavelength: element.array(wavelength=wavelength), [1] * 16))
+
+    assert element.num_instances == 1
+    assert element.cache_statistics['misses'] == 1
+    assert element.cache_statistics['hits'] == 15
+
+    # Concurrent evictions should keep the cache consistent.
+    element = SlowElement(True, max_bytes_in_cache=20000)
+    wavelengths = [1, 1.5, 1.2, 1.7, 1.1, 1.4] * 4
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(lambda wavelength: element.array(wavelength=wavelength), wavelengths))
+
+    statistics = element.cache_statistics
+    assert statistics['hits'] + statistics['misses'] == len(wavelengths)
+    assert statistics['nbytes'] == 8000 * statistics['entries']
+    assert statistics['nbytes'] <= 20000
+
+    cache = element._instance_data_cache
+    for primary_key in cache._entries.keys():
+        assert cache._aliases[primary_key] == primary_key
+        assert (cache._id, primary_key) in get_instance_data_cache()
+
+def test_instance_cache_last_used():
+    pupil_grid = make_pupil_grid(32)
+    focal_grid = make_focal_grid(2, 4)
+    aperture = make_circular_aperture(1)(pupil_grid)
+
+    prop = FraunhoferPropagator(pupil_grid, focal_grid)
+
+    for wavelength in [1, 1, 2, 1, 1 + 1e-12, 2]:
+        reference = FraunhoferPropagator(pupil_grid, focal_grid)
+
+        wf = Wavefront(aperture, wavelength)
+        assert np.allclose(prop.forward(wf).electric_field, reference.forward(wf).electric_field)
+
+        wf = Wavefront(focal_grid.ones(), wavelength)
+        assert np.allclose(prop.backward(wf).electric_field, reference.backward(wf).electric_field)
+
+    # Wavelengths that differ by less than the key resolution should share their instance.
+    assert prop.cache_statistics['misses'] == 2
+    assert prop.cache_statistics['hits'] == 10
+
+    # Clearing the cache should also forget the last used instance.
+    prop.clear_cache()
+    prop.forward(Wavefront(aperture, 2))
+    assert prop.cache_statistics['misses'] == 3
+
+    # Changing a grid in-place should not return the instance for the old grid.
+    grid = make_pupil_grid(64, 2)
+    apodizer = Apodizer(make_circular_aperture(1))
+
+    power_before = apodizer.forward(Wavefront(grid.ones())).total_power
+    grid.shift([0.9, 0])
+    power_after = apodizer.forward(Wavefront(grid.ones())).total_power
+
+    reference = Apodizer(make_circular_aperture(1)).forward(Wavefront(grid.ones())).total_power
+    assert np.isclose(power_after, reference)
+    assert not np.isclose(power_after, power_before)
+
+def test_instance_cache_last_used_nbytes():
+    pupil_grid = make_pupil_grid(128)
+    prop = FresnelPropagator(pupil_grid, 1)
+
+    # Repeated propagations at a single wavelength go through the last-used fast path,
+    # but should still account for the arrays that were computed during the first one.
+    for i in range(5):
+        prop.forward(Wavefront(pupil_grid.ones(), 1e-6))
+
+    fourier_filter = prop.get_instance_data(pupil_grid, None, 1e-6).fourier_filter
+
+    assert prop.cache_statistics['misses'] == 1
+    assert prop.cache_statistics['nbytes'] >= fourier_filter._transfer_function.nbytes + fourier_filter.internal_array.nbytes
+
+def test_optical_system_prepare():
+    pupil_grid = make_pupil_grid(64, 1e-3)
+    focal_grid = make_focal_grid(4, 8, spatial_resolution=500e-9 / 1e-3)
+    aperture = make_circular_aperture(1e-3)(pupil_grid)
+
+    wavelengths = np.linspace(500e-9, 600e-9, 5)
+
+    def make_optical_system():
+        return OpticalSystem([
+            Apodizer(aperture),
+            FresnelPropagator(pupil_grid, 0.1),
+            FraunhoferPropagator(pupil_grid, focal_grid)
+        ])
+
+    optical_system = make_optical_system()
+    optical_system.prepare(wavelengths, pupil_grid, num_threads=3)
+
+    for element in optical_system.optical_elements[1:]:
+        assert element.cache_statistics['misses'] == len(wavelengths)
+
+    reference = make_optical_system()
+
+    for wavelength in wavelengths:
+        wf = Wavefront(aperture, wavelength)
+        assert np.allclose(optical_system.forward(wf).electric_field, reference.forward(wf).electric_field)
+
+    # All instances should have been created by prepare().
+    for element in optical_system.optical_elements[1:]:
+        assert element.cache_statistics['misses'] == len(wavelengths)
+
+    # Wavefront sensor optics are optical systems as well.
+    wfs = PyramidWavefrontSensorOptics(pupil_grid, pupil_grid, wavelength_0=550e-9)
+    wfs.prepare(wavelengths, pupil_grid, num_threads=2)
+
+    assert wfs.pupil_to_focal.cache_statistics['misses'] == len(wavelengths)
+    assert wfs.pyramid.cache_statistics['misses'] == len(wavelengths)
+
+def test_instance_data_disk_cache(tmp_path):
+    pupil_grid = make_pupil_grid(64, 1e-3)
+    aperture = make_circular_aperture(1e-3)(pupil_grid)
+
+    Configuration().cache.directory = str(tmp_path)
+    Configuration().optics.instance_cache.use_disk_cache = True
+
+    def num_in_cache():
+        return len(list((tmp_path / 'instance_data').iterdir()))
+
+    try:
+        element_types = [
+            lambda: FresnelPropagator(pupil_grid, 0.1),
+            lambda: AngularSpectrumPropagator(pupil_grid, 0.1),
+            lambda: VectorVortexCoronagraph(2, q=32)
+        ]
+
+        for i, make_element in enumerate(element_types):
+            wf = Wavefront(aperture, 500e-9)
+
+            reference = make_element()(wf)
+            assert num_in_cache() == i + 1
+
+            # A new optical element, as in another process, should load the instance data from disk.
+            wf_out = make_element()(wf)
+            assert num_in_cache() == i + 1
+            assert np.allclose(wf_out.electric_field, reference.electric_field)
+
+        # Other parameters should not reuse the instance data.
+        wf = Wavefront(aperture, 500e-9)
+
+        wf_out = FresnelPropagator(pupil_grid, 0.2)(wf)
+        assert num_in_cache() == len(element_types) + 1
+        assert not np.allclose(wf_out.electric_field, FresnelPropagator(pupil_grid, 0.1)(wf).electric_field)
+    finally:
+        Configuration().reset()
+
 def test_step_index_fiber():
     core_radius_multimode = 25e-6  # m
     core_radius_singlemode = 2e-6  # m
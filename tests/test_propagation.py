@@ -61,6 +61,61 @@ def test_fraunhofer_propagation_rectangular():
                         # This should never happen.
                         assert False
 
+def test_fraunhofer_propagation_polychromatic():
+    pupil_grid = make_pupil_grid(64)
+    focal_grid = make_focal_grid(4, 8)
+    wavelengths = np.linspace(0.9, 1.1, 5)
+
+    aperture = make_circular_aperture(1)(pupil_grid)
+    tilt = np.exp(1j * 2 * pupil_grid.x)
+
+    for focal_length in [1, lambda wavelength: 1 + wavelength]:
+        prop = FraunhoferPropagator(pupil_grid, focal_grid, focal_length=focal_length)
+
+        for input_stokes_vector in [None, (1, 0.5, 0, 0)]:
+            wavefronts = [Wavefront(aperture * tilt, wl, input_stokes_vector) for wl in wavelengths]
+
+            imgs = prop.forward_polychromatic(wavefronts)
+
+            for wf, img in zip(wavefronts, imgs):
+                reference = prop.forward(wf)
+
+                assert img.wavelength == wf.wavelength
+                assert img.electric_field.grid == focal_grid
+                assert np.allclose(img.electric_field, reference.electric_field)
+
+            pupils = prop.backward_polychromatic(imgs)
+
+            for img, pupil in zip(imgs, pupils):
+                reference = prop.backward(img)
+
+                assert pupil.electric_field.grid == pupil_grid
+                assert np.allclose(pupil.electric_field, reference.electric_field)
+
+    # Rectangular grids should not mix up the axes.
+    rectangular_pupil_grid = make_pupil_grid([64, 32], [1, 0.5])
+    rectangular_focal_grid = make_uniform_grid([40, 24], [10, 6])
+    prop = FraunhoferPropagator(rectangular_pupil_grid, rectangular_focal_grid)
+
+    wavefronts = [Wavefront(Field(np.exp(1j * 2 * rectangular_pupil_grid.x), rectangular_pupil_grid), wl, (1, 0.5, 0, 0)) for wl in wavelengths]
+    imgs = prop.forward_polychromatic(wavefronts)
+    pupils = prop.backward_polychromatic(imgs)
+
+    for wf, img, pupil in zip(wavefronts, imgs, pupils):
+        assert np.allclose(img.electric_field, prop.forward(wf).electric_field)
+        assert np.allclose(pupil.electric_field, prop.backward(img).electric_field)
+
+    # Non-separated grids should fall back to separate propagations.
+    focal_grid = make_uniform_grid([16, 16], 8).as_('polar').as_('cartesian')
+    focal_grid = CartesianGrid(UnstructuredCoords(focal_grid.coords))
+    prop = FraunhoferPropagator(pupil_grid, focal_grid)
+
+    wavefronts = [Wavefront(aperture, wl) for wl in wavelengths]
+    imgs = prop.forward_polychromatic(wavefronts)
+
+    for wf, img in zip(wavefronts, imgs):
+        assert np.allclose(img.electric_field, prop.forward(wf).electric_field)
+
 def single_propagation_test(propagator, number_of_pixels, wavelength, a, b, relative_distance, error_threshold):
     wavenumber = 2 * np.pi / wavelength
 
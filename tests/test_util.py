@@ -139,3 +139,47 @@ def test_emccd_noise():
     noise = make_emccd_noise(photo_electron_flux * np.ones((num_trials, num_runs)), read_noise, emgain)
 
     assert abs(np.std(np.mean(noise, axis=0) / emgain - photo_electron_flux) - sigma) / sigma < 1e-2
+
+def test_spectral_noise_batch():
+    grid = make_pupil_grid(32, 1)
+    psd = power_spectral_density_von_karman(0.1, 10)
+
+    for factory in [SpectralNoiseFactoryFFT(psd, grid, 2), SpectralNoiseFactoryMultiscale(psd, grid, 2)]:
+        rng = np.random.default_rng(1)
+        reference = np.array([factory.make_random(rng)() for i in range(10)])
+
+        try:
+            # Force evaluation in multiple chunks.
+            Configuration().spectral_noise.batch_memory = 0.5
+
+            screens = factory.make_random_batch(10, seed=1)
+            assert screens.shape == (10, grid.size)
+            assert screens.grid is grid
+            assert np.allclose(screens, reference)
+
+            screens = list(factory.make_random_batch(10, seed=1, as_generator=True))
+            assert len(screens) == 10
+            assert np.allclose(screens, reference)
+        finally:
+            Configuration().reset()
+
+def test_spectral_noise_pair():
+    grid = make_pupil_grid(32, 1)
+    psd = power_spectral_density_von_karman(0.1, 10)
+
+    for factory in [SpectralNoiseFactoryFFT(psd, grid, 2), SpectralNoiseFactoryMultiscale(psd, grid, 2)]:
+        noise = factory.make_random(1)
+
+        screen_1, screen_2 = noise.evaluate_pair()
+        assert np.allclose(screen_1, noise())
+        assert np.allclose(screen_2, noise.complementary()())
+        assert not np.allclose(screen_1, screen_2)
+
+        # Both parts should have the same statistics and be uncorrelated.
+        screens = factory.make_random_batch(1000, seed=1, use_imaginary_part=True)
+        var_1 = np.var(screens[0::2])
+        var_2 = np.var(screens[1::2])
+        assert abs(var_1 / var_2 - 1) < 0.1
+
+        correlation = np.mean(screens[0::2] * screens[1::2]) / np.sqrt(var_1 * var_2)
+        assert abs(correlation) < 0.05